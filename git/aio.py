@@ -0,0 +1,482 @@
+# aio.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+"""Module with an asyncio front-end to the git command.
+
+:note: It requires python 3.7 or newer, which is why it is not imported by the git package, and
+    not installed for older interpreters"""
+import asyncio
+import logging
+import os
+import sys
+
+from subprocess import (
+    PIPE,
+    DEVNULL
+)
+
+from .cmd import (
+    Git,
+    CommandEvent,
+    _calling_api,
+    _emit_event,
+    _input_size
+)
+from .exc import (
+    GitCommandError,
+    GitCommandNotFound
+)
+from .compat import safe_decode
+
+log = logging.getLogger('git.aio')
+log.addHandler(logging.NullHandler())
+
+__all__ = ('AsyncGit', 'AsyncProcess', 'AsyncCatFileContentStream')
+
+
+class AsyncProcess(object):
+
+    """Wraps an asyncio.subprocess.Process and kills it once this instance goes out of scope,
+    similar to ``Git.AutoInterrupt``.
+    Besides all attributes are wired through to the contained process object.
+
+    The wait method was overridden to perform automatic status code checking
+    and possibly raise."""
+    __slots__ = ("proc", "args")
+
+    def __init__(self, proc, args):
+        self.proc = proc
+        self.args = args
+
+    def __del__(self):
+        proc = self.proc
+        self.proc = None
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.kill()
+        except (OSError, RuntimeError):
+            pass  # already dead, or its event loop is closed
+        # END handle errors
+
+    def __getattr__(self, attr):
+        return getattr(self.proc, attr)
+
+    async def _iter_lines(self, stream):
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            yield line
+        # END for each line
+
+    def iter_stdout(self):
+        """:return: asynchronous iterator yielding lines from stdout as bytes, including the newline
+        :note: if you don't read stderr concurrently, git might block once it wrote lots of data to it"""
+        return self._iter_lines(self.proc.stdout)
+
+    def iter_stderr(self):
+        """:return: asynchronous iterator yielding lines from stderr as bytes, including the newline"""
+        return self._iter_lines(self.proc.stderr)
+
+    async def wait(self, stderr=b''):
+        """Wait for the process and return its status code.
+
+        :param stderr: Previously read value of stderr, in case stderr is already consumed.
+        :raise GitCommandError: if the return status is not 0"""
+        status = await self.proc.wait()
+        if status != 0:
+            errstr = stderr or b''
+            if self.proc.stderr is not None:
+                errstr += await self.proc.stderr.read()
+            log.debug('AsyncProcess wait stderr: %r' % (errstr,))
+            raise GitCommandError(self.args, status, errstr)
+        # END status handling
+        return status
+# END async process
+
+
+class AsyncCatFileContentStream(object):
+
+    """Asynchronous counterpart of ``Git.CatFileContentStream``.
+    It reads the sized contents of an object from a persistent cat-file process, which is only
+    available to others once the stream was read to the end. Streams which are discarded before that
+    terminate their process."""
+
+    __slots__ = ('_stream', '_nbr', '_size', '_release')
+
+    def __init__(self, size, stream, release):
+        self._stream = stream
+        self._size = size
+        self._nbr = 0           # num bytes read
+        self._release = release
+
+    async def _finish_if_depleted(self):
+        if self._size - self._nbr == 0 and self._release is not None:
+            await self._stream.readexactly(1)    # final newline
+            release = self._release
+            self._release = None
+            release()
+        # END handle depletion
+
+    async def read(self, size=-1):
+        bytes_left = self._size - self._nbr
+        if size > -1:
+            size = min(bytes_left, size)
+        else:
+            size = bytes_left
+        # END clamp size
+        data = await self._stream.readexactly(size)
+        self._nbr += len(data)
+        await self._finish_if_depleted()
+        return data
+
+    def __del__(self):
+        release = self._release
+        self._release = None
+        if release is not None:
+            release(discard=True)
+        # END handle incomplete read
+# END async content stream
+
+
+class _AsyncPersistentCommand(object):
+
+    """A persistent cat-file process, guarded by a lock as only one request may be handled at a time.
+    It is bound to the event loop it was created in, and recreated when used from another loop."""
+    __slots__ = ('_kwargs', '_proc', '_busy_proc', '_lock', '_loop', '_exiting')
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._proc = None
+        self._busy_proc = None  # process of the current request, which is terminated once released if cleared
+        self._lock = None
+        self._loop = None
+        self._exiting = list()  # tasks waiting for terminated processes
+
+    async def acquire(self, agit):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._terminate(self._proc)
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._proc = None
+            self._exiting = list()
+        # END handle new loop
+        lock = self._lock
+        await lock.acquire()
+        try:
+            if self._proc is None or self._proc.returncode is not None:
+                self._proc = await agit.cat_file(istream=PIPE, as_process=True, **self._kwargs)
+            # END spawn process
+        except BaseException:
+            lock.release()
+            raise
+        # END handle spawn failure
+        self._busy_proc = self._proc
+        return self._proc, lock
+
+    def _terminate(self, proc):
+        """Kill the given process, and schedule waiting for it in its event loop to reap it"""
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.kill()
+            self._exiting.append(self._loop.create_task(proc.proc.wait()))
+        except (OSError, RuntimeError):
+            pass  # already dead, or its event loop is closed
+        # END handle errors
+
+    def release(self, lock, discard=False):
+        proc = self._busy_proc
+        self._busy_proc = None
+        if discard or proc is not self._proc:
+            if proc is self._proc:
+                self._proc = None
+            self._terminate(proc)
+        # END handle discarded and cleared processes
+        lock.release()
+
+    def clear(self):
+        """Terminate our process, or once it was released if it is in use"""
+        proc = self._proc
+        self._proc = None
+        if proc is not self._busy_proc:
+            self._terminate(proc)
+        # END handle idle process
+
+    async def close(self):
+        proc = self._proc
+        self._proc = None
+        if (proc is not None and proc.returncode is None and not self._lock.locked()
+                and self._loop is asyncio.get_running_loop()):
+            # cat-file quits once its input is closed
+            proc.stdin.close()
+            await proc.wait()
+        # END handle running process
+        if self._exiting and self._loop is asyncio.get_running_loop():
+            exiting = self._exiting
+            self._exiting = list()
+            await asyncio.gather(*exiting)
+        # END wait for terminated processes
+# END persistent command
+
+
+class AsyncGit(object):
+
+    """Runs git commands as asyncio subprocesses. It uses the same argument transformation as
+    ``Git``, as well as its environment, git options and configuration::
+
+     agit = AsyncGit(repo.git)
+     sha = await agit.rev_parse('HEAD')             # calls 'git rev-parse HEAD'
+     proc = await agit.log(as_process=True)
+     async for line in proc.iter_stdout():
+         ...
+
+    Persistent cat-file processes are shared by all coroutines of an instance, each of which
+    is used for one request at a time."""
+    __slots__ = ('_git', '_cat_file_header', '_cat_file_all')
+
+    def __init__(self, git=None):
+        """:param git: Git instance to take the working directory, environment and configuration from.
+            Alternatively the working directory, which defaults to os.getcwd()"""
+        if not isinstance(git, Git):
+            git = Git(git)
+        self._git = git
+        self._cat_file_header = _AsyncPersistentCommand(batch_check=True)
+        self._cat_file_all = _AsyncPersistentCommand(batch=True)
+
+    def __getattr__(self, name):
+        """:return: Callable returning a coroutine which runs the git command of the given name,
+            see ``Git._call_process``"""
+        if name[0] == '_':
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call_process(name, *args, **kwargs)
+
+    @property
+    def git(self):
+        """:return: Git instance we take our configuration from"""
+        return self._git
+
+    @property
+    def working_dir(self):
+        """:return: Git directory we are working on"""
+        return self._git.working_dir
+
+    def _call_process(self, method, *args, **kwargs):
+        """As ``Git._call_process``, but returns a coroutine
+
+        :return: coroutine returning the same as ``execute``"""
+        args, _kwargs = self._git._prepare_call_args(args, kwargs)
+        return self.execute(self._git._make_call(method, args), **_kwargs)
+
+    async def execute(self, command,
+                      istream=None,
+                      with_keep_cwd=False,
+                      with_extended_output=False,
+                      with_exceptions=True,
+                      as_process=False,
+                      stdout_as_string=True,
+                      kill_after_timeout=None,
+                      with_stdout=True,
+                      **subprocess_kwargs
+                      ):
+        """Asynchronous version of ``Git.execute``, whose documentation applies unless noted otherwise.
+
+        :param istream:
+            Standard input filehandle passed to the subprocess, or bytes to write to its standard input.
+        :param as_process:
+            If True, an ``AsyncProcess`` is returned to read the streams from on demand.
+        :param subprocess_kwargs:
+            Keyword arguments passed to asyncio.create_subprocess_exec. ``output_stream`` and
+            ``universal_newlines`` are not supported.
+        :return: the same as ``Git.execute``
+        :raise GitCommandError:"""
+        git = self._git
+        if git.GIT_PYTHON_TRACE and (git.GIT_PYTHON_TRACE != 'full' or as_process):
+            log.info(' '.join(command))
+
+        # Allow the user to have the command executed in their working dir.
+        if with_keep_cwd or git.working_dir is None:
+            cwd = os.getcwd()
+        else:
+            cwd = git.working_dir
+
+        hooks = git.instrumentation_hooks
+        event = None
+        if hooks:
+            event = CommandEvent(as_process and 'process' or 'execute', command, _calling_api())
+            event.bytes_in = len(istream) if isinstance(istream, bytes) else _input_size(istream)
+        # END prepare instrumentation
+
+        input_data = None
+        if isinstance(istream, bytes):
+            input_data = istream
+            istream = PIPE
+        # END handle input data
+
+        if sys.platform == 'win32':
+            subprocess_kwargs.setdefault('creationflags', git.CREATE_NO_WINDOW)
+        try:
+            proc = await asyncio.create_subprocess_exec(*command,
+                                                        env=git._process_environment(),
+                                                        cwd=cwd,
+                                                        stdin=istream,
+                                                        stderr=PIPE,
+                                                        stdout=PIPE if with_stdout else DEVNULL,
+                                                        **subprocess_kwargs)
+        except FileNotFoundError as err:
+            raise GitCommandNotFound(str(err))
+
+        if as_process:
+            if event is not None:
+                event._finished(None)
+                _emit_event(hooks, event)
+            # END handle instrumentation
+            return AsyncProcess(proc, command)
+
+        try:
+            if kill_after_timeout:
+                stdout_value, stderr_value = await asyncio.wait_for(proc.communicate(input_data),
+                                                                    kill_after_timeout)
+            else:
+                stdout_value, stderr_value = await proc.communicate(input_data)
+            # END handle timeout
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            stdout_value = b''
+            stderr_value = ('Timeout: the command "%s" did not complete in %d '
+                            'secs.' % (" ".join(command), kill_after_timeout)).encode('ascii')
+        except BaseException:
+            # most likely we were cancelled - don't leave the process behind
+            if proc.returncode is None:
+                proc.kill()
+            raise
+        # END handle communication
+        status = proc.returncode
+        stdout_value = stdout_value or b''
+        stderr_value = stderr_value or b''
+        if event is not None:
+            event.bytes_out = len(stdout_value)
+            event.bytes_err = len(stderr_value)
+            event._finished(status)
+            _emit_event(hooks, event)
+        # END handle instrumentation
+
+        # strip trailing "\n"
+        if stdout_value.endswith(b"\n"):
+            stdout_value = stdout_value[:-1]
+        if stderr_value.endswith(b"\n"):
+            stderr_value = stderr_value[:-1]
+
+        if git.GIT_PYTHON_TRACE == 'full':
+            cmdstr = " ".join(command)
+            if stderr_value:
+                log.info("%s -> %d; stdout: '%s'; stderr: '%s'",
+                         cmdstr, status, safe_decode(stdout_value), safe_decode(stderr_value))
+            elif stdout_value:
+                log.info("%s -> %d; stdout: '%s'", cmdstr, status, safe_decode(stdout_value))
+            else:
+                log.info("%s -> %d", cmdstr, status)
+        # END handle debug printing
+
+        if with_exceptions and status != 0:
+            if with_extended_output:
+                raise GitCommandError(command, status, stderr_value, stdout_value)
+            else:
+                raise GitCommandError(command, status, stderr_value)
+
+        if stdout_as_string:
+            stdout_value = safe_decode(stdout_value)
+
+        # Allow access to the command's status code
+        if with_extended_output:
+            return (status, stdout_value, safe_decode(stderr_value))
+        else:
+            return stdout_value
+
+    async def _request_object_header(self, persistent_cmd, ref):
+        """:return: (cmd, lock, (hexsha, type_string, size_as_int), event). The lock is released if the
+            request failed. event is the CommandEvent to finish once the reply was read entirely, or None"""
+        git = self._git
+        cmd, lock = await persistent_cmd.acquire(self)
+        event = git._begin_cat_file_event(cmd)
+        try:
+            request = git._prepare_ref(ref)
+            cmd.stdin.write(request)
+            await cmd.stdin.drain()
+            header_line = await cmd.stdout.readline()
+            if event is not None:
+                event.bytes_in += len(request)
+                event._received(len(header_line))
+            # END handle instrumentation
+            return cmd, lock, git._parse_object_header(header_line), event
+        except ValueError:
+            # the process is in a defined state, the error was reported by git
+            persistent_cmd.release(lock)
+            git._finish_cat_file_event(event, failed=True)
+            raise
+        except BaseException:
+            persistent_cmd.release(lock, discard=True)
+            git._finish_cat_file_event(event, failed=True)
+            raise
+        # END handle errors
+
+    async def get_object_header(self, ref):
+        """Asynchronous version of ``Git.get_object_header``
+
+        :return: (hexsha, type_string, size_as_int)"""
+        persistent_cmd = self._cat_file_header
+        cmd, lock, info, event = await self._request_object_header(persistent_cmd, ref)
+        persistent_cmd.release(lock)
+        self._git._finish_cat_file_event(event)
+        return info
+
+    async def get_object_data(self, ref):
+        """Asynchronous version of ``Git.get_object_data``
+
+        :return: (hexsha, type_string, size_as_int, data_string)"""
+        hexsha, typename, size, stream = await self.stream_object_data(ref)
+        data = await stream.read()
+        return (hexsha, typename, size, data)
+
+    async def stream_object_data(self, ref):
+        """Asynchronous version of ``Git.stream_object_data``
+
+        :return: (hexsha, type_string, size_as_int, stream), with stream being an ``AsyncCatFileContentStream``
+        :note: Other coroutines requesting object data will wait until the returned stream was read
+            to the end, which is why a coroutine must not request more data before that."""
+        persistent_cmd = self._cat_file_all
+        cmd, lock, (hexsha, typename, size), event = await self._request_object_header(persistent_cmd, ref)
+
+        def release(discard=False):
+            persistent_cmd.release(lock, discard)
+            if event is not None and not discard:
+                event.bytes_out += size + 1     # the contents and their terminating newline
+            self._git._finish_cat_file_event(event, failed=discard)
+        # end
+
+        stream = AsyncCatFileContentStream(size, cmd.stdout, release)
+        if size == 0:
+            await stream.read()
+        return (hexsha, typename, size, stream)
+
+    def clear_cache(self):
+        """Terminate persistent commands, those which are in use once they are released
+
+        :return: self"""
+        self._cat_file_header.clear()
+        self._cat_file_all.clear()
+        return self
+
+    async def close(self):
+        """Stop idle persistent commands and wait for them to finish. It should be called before
+        the event loop they were created in is closed.
+
+        :return: self"""
+        await self._cat_file_header.close()
+        await self._cat_file_all.close()
+        return self
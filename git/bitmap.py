@@ -0,0 +1,346 @@
+# bitmap.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+"""Module with a reader for the reachability bitmaps git writes next to pack files, when repacking with
+``git repack -b`` or ``repack.writeBitmaps``. See gitformat-pack(5) and the EWAH compression they use.
+
+Bitmaps are represented by python integers, with bit i being set if the i-th object of the pack,
+in order of the pack offsets, is part of the bitmap. They can be combined using ``|``, ``&`` and ``& ~``."""
+import os
+from binascii import (
+    a2b_hex,
+    b2a_hex
+)
+from stat import S_ISDIR
+from struct import unpack_from
+
+from gitdb.exc import (
+    ParseError,
+    UnsupportedOperation
+)
+
+from git.objects.fun import tree_entries_from_data
+from git.odict import OrderedDict
+from git.pack import (
+    PackFile,
+    _map_file
+)
+
+__all__ = ('PackBitmap', )
+
+# the bitmaps contain all objects reachable from their commit
+_BITMAP_OPT_FULL_DAG = 0x1
+# mode of submodule commits in trees, which are not part of the repository
+_GITLINK_MODE = 0o160000
+
+
+def _le_bytes_to_int(data):
+    """:return: non-negative integer from the given little-endian bytes"""
+    data = bytes(data[::-1])
+    return data and int(b2a_hex(data), 16) or 0
+
+
+def _int_to_le_bytes(value, nbytes):
+    """:return: bytearray of nbytes with the given non-negative integer in little-endian byte order"""
+    return bytearray(a2b_hex('%0*x' % (nbytes * 2, value))[::-1])
+
+
+def _ewah_end(mm, offset):
+    """:return: offset after the EWAH bitmap at the given offset"""
+    return offset + 12 + 8 * unpack_from('>I', mm, offset + 4)[0]
+
+
+def _read_ewah(mm, offset):
+    """:return: the EWAH bitmap at the given offset, as integer"""
+    i = offset + 8
+    end = _ewah_end(mm, offset) - 4
+    words = list()      # bytes of 64 bit words, least significant first, each in big-endian byte order
+    while i < end:
+        # a marker word is followed by its literal words, and denotes the amount of words of equal bits before
+        marker = unpack_from('>Q', mm, i)[0]
+        i += 8
+        nrunning = (marker >> 1) & 0xffffffff
+        if nrunning:
+            words.append((marker & 1 and b'\xff' or b'\0') * (8 * nrunning))
+        nliteral = marker >> 33
+        words.extend(mm[j:j + 8] for j in range(i, i + 8 * nliteral, 8))
+        i += 8 * nliteral
+    # END for each marker word
+    data = b''.join(reversed(words)).lstrip(b'\0')
+    return data and int(b2a_hex(data), 16) or 0
+
+
+def _iter_bits(data):
+    """:return: iterator yielding the positions of the set bits of the given little-endian bytearray, ascending"""
+    for i, c in enumerate(data):
+        if c:
+            for bit in range(8):
+                if c >> bit & 1:
+                    yield (i << 3) | bit
+            # END for each bit
+        # END handle set bits
+    # END for each byte
+
+
+# the amount of set bits of each byte value, as translation table
+_BYTE_POPCOUNTS = bytes(bytearray(bin(c).count('1') for c in range(256)))
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+else:
+    def _popcount(bitmap):
+        """:return: amount of set bits of the given non-negative int"""
+        if not bitmap:
+            return 0
+        hexdigits = '%x' % bitmap
+        if len(hexdigits) & 1:
+            hexdigits = '0' + hexdigits
+        return sum(bytearray(a2b_hex(hexdigits).translate(_BYTE_POPCOUNTS)))
+# END use native implementation
+
+
+class PackBitmap(object):
+
+    """Reads the reachability bitmaps of a pack, version 1, which store the objects reachable from
+    selected commits, and computes them for all other objects of the pack, whose ancestors are read from
+    an object database until commits with stored bitmaps are reached.
+
+    ``commits``, ``trees``, ``blobs`` and ``tags`` are the bitmaps of all objects of the respective type."""
+    __slots__ = ('pack', 'commits', 'trees', 'blobs', 'tags', '_path', '_map', '_entries', '_entry_offsets',
+                 '_xor_offsets', '_bitmaps', '_order', '_bits')
+
+    # amount of stored bitmaps to keep in memory once they were decompressed
+    max_cached_bitmaps = 64
+
+    def __init__(self, pack):
+        """:param pack: PackFile whose bitmap to read from the .bitmap file next to it
+        :raise ParseError: if the bitmap is invalid, or doesn't belong to the pack
+        :raise UnsupportedOperation: if the bitmap version is not supported"""
+        self.pack = pack
+        self._path = pack.path[:-len('.pack')] + '.bitmap'
+        self._map = _map_file(self._path)
+        self._bitmaps = OrderedDict()       # index of entry -> bitmap
+        self._order = self._bits = None     # see _positions()
+        try:
+            self._parse()
+        except BaseException:
+            self._map.close()
+            raise
+        # END handle invalid files
+
+    def _parse(self):
+        mm = self._map
+        if mm[:4] != b'BITM':
+            raise ParseError("%s is no bitmap file" % self._path)
+        version, flags, nentries = unpack_from('>HHI', mm, 4)
+        if version != 1 or not flags & _BITMAP_OPT_FULL_DAG:
+            raise UnsupportedOperation("Bitmap %s of version %i with flags %i is not supported"
+                                       % (self._path, version, flags))
+        pack_map = self.pack._map
+        if mm[12:32] != pack_map[len(pack_map) - 20:]:
+            raise ParseError("Bitmap %s doesn't belong to its pack" % self._path)
+        # END verify header
+
+        offset = 32
+        types = list()
+        for _ in range(4):
+            types.append(_read_ewah(mm, offset))
+            offset = _ewah_end(mm, offset)
+        # END for each type
+        self.commits, self.trees, self.blobs, self.tags = types
+
+        index = self.pack.index
+        self._entries = dict()          # binary sha of commit -> index of entry
+        self._entry_offsets = list()    # offset of the bitmap of each entry
+        self._xor_offsets = list()      # amount of entries before each entry whose bitmap to xor with, or 0
+        for i in range(nentries):
+            position, xor_offset = unpack_from('>IB', mm, offset)
+            self._entries[index.sha(position)] = i
+            self._entry_offsets.append(offset + 6)
+            self._xor_offsets.append(xor_offset)
+            offset = _ewah_end(mm, offset + 6)
+        # END for each entry
+
+    @classmethod
+    def from_objects_dir(cls, objects_dir):
+        """:return: PackBitmap of the pack in the object database in the given directory which has a bitmap,
+            or None if there is none which can be read"""
+        pack_dir = os.path.join(objects_dir, 'pack')
+        try:
+            names = sorted(os.listdir(pack_dir))
+        except OSError:
+            return None
+        # END handle missing pack directory
+        for name in names:
+            if not name.endswith('.bitmap'):
+                continue
+            pack = None
+            try:
+                pack = PackFile(os.path.join(pack_dir, name[:-len('.bitmap')] + '.pack'))
+                return cls(pack)
+            except (ParseError, UnsupportedOperation, IOError, OSError, ValueError):
+                if pack is not None:
+                    pack.close()
+            # END handle unreadable bitmaps
+        # END for each bitmap
+        return None
+
+    def __len__(self):
+        """:return: amount of commits with stored bitmaps"""
+        return len(self._entries)
+
+    def __contains__(self, binsha):
+        """:return: True if a bitmap is stored for the commit with the given binary sha"""
+        return binsha in self._entries
+
+    def close(self):
+        """Release the memory maps of the bitmap and its pack. The instance cannot be used anymore"""
+        self._map.close()
+        self.pack.close()
+
+    def _positions(self):
+        """:return: (order, bits), with order being the positions in the pack index of the objects in pack
+            order, and bits the position in pack order of the objects in index order"""
+        if self._order is None:
+            index = self.pack.index
+            offsets = index.offsets()
+            order = sorted(range(len(index)), key=offsets.__getitem__)
+            bits = [0] * len(order)
+            for bit, position in enumerate(order):
+                bits[position] = bit
+            # END for each object
+            self._order, self._bits = order, bits
+        # END compute positions
+        return self._order, self._bits
+
+    def bit(self, binsha):
+        """:return: position of the object with the given binary sha in the bitmaps, or None if it is not in the pack"""
+        position = self.pack.index.index(binsha)
+        if position < 0:
+            return None
+        return self._positions()[1][position]
+
+    def _cached_bitmap(self, i):
+        """:return: decompressed bitmap of the entry at index i, marked as most recently used, or None"""
+        bitmap = self._bitmaps.pop(i, None)
+        if bitmap is not None:
+            self._bitmaps[i] = bitmap
+        return bitmap
+
+    def _entry_bitmap(self, i):
+        chain = list()      # entries to decompress, each of which is stored relative to the next one
+        bitmap = self._cached_bitmap(i)
+        while bitmap is None:
+            chain.append(i)
+            if not self._xor_offsets[i]:
+                bitmap = 0
+                break
+            i -= self._xor_offsets[i]
+            bitmap = self._cached_bitmap(i)
+        # END find decompressed base
+        for i in reversed(chain):
+            bitmap ^= _read_ewah(self._map, self._entry_offsets[i])
+            self._bitmaps[i] = bitmap
+        # END for each entry to decompress
+        while len(self._bitmaps) > self.max_cached_bitmaps:
+            self._bitmaps.popitem(last=False)
+        return bitmap
+
+    def bitmap(self, binsha):
+        """:return: stored bitmap of the objects reachable from the commit with the given binary sha, or None"""
+        i = self._entries.get(binsha)
+        if i is None:
+            return None
+        return self._entry_bitmap(i)
+
+    def reachable(self, odb, include, exclude=()):
+        """:return: bitmap of the objects reachable from the objects with the binary shas in include, but not
+            from those in exclude, or None if not all of these objects are in our pack.
+        :param odb: object database to read objects from whose bitmaps are not stored"""
+        bitmap = self._reachable(odb, include)
+        if bitmap is None or not exclude:
+            return bitmap
+        excluded = self._reachable(odb, exclude)
+        if excluded is None:
+            return None
+        return bitmap & ~excluded
+
+    def _reachable(self, odb, binshas):
+        nbytes = (len(self.pack) + 7) // 8
+        # first find the commits which are not part of any stored bitmap, as we can't know their
+        # trees or parents otherwise
+        stored = 0
+        objects = list()        # (binsha, typename) of objects to add with their trees
+        commits = list()
+        seen = set()
+        for binsha in binshas:
+            typename = odb.info(binsha).type
+            while typename == b'tag':
+                objects.append((binsha, typename))
+                headers = odb.stream(binsha).read().split(b'\n', 2)
+                binsha, typename = a2b_hex(headers[0][7:47]), headers[1][5:]
+            # END peel tags
+            if typename == b'commit':
+                commits.append(binsha)
+            else:
+                objects.append((binsha, typename))
+        # END for each object
+        while commits:
+            binsha = commits.pop()
+            if binsha in seen:
+                continue
+            seen.add(binsha)
+            bitmap = self.bitmap(binsha)
+            if bitmap is not None:
+                stored |= bitmap
+                continue
+            objects.append((binsha, b'commit'))
+            for line in odb.stream(binsha).read().split(b'\n\n', 1)[0].split(b'\n')[1:]:
+                if not line.startswith(b'parent '):
+                    break
+                commits.append(a2b_hex(line[7:47]))
+            # END for each parent
+        # END for each commit
+
+        # then add the objects which were found, and what they reference, unless it is in a stored bitmap
+        data = _int_to_le_bytes(stored, nbytes)
+        while objects:
+            binsha, typename = objects.pop()
+            bit = self.bit(binsha)
+            if bit is None:
+                return None
+            if data[bit >> 3] >> (bit & 7) & 1:
+                continue
+            data[bit >> 3] |= 1 << (bit & 7)
+            if typename == b'commit':
+                objects.append((a2b_hex(odb.stream(binsha).read()[5:45]), b'tree'))
+            elif typename == b'tree':
+                for sha, mode, name in tree_entries_from_data(odb.stream(binsha).read()):
+                    if mode == _GITLINK_MODE:
+                        continue
+                    objects.append((sha, S_ISDIR(mode) and b'tree' or b'blob'))
+                # END for each tree entry
+            # END handle type
+        # END for each object
+        return _le_bytes_to_int(data)
+
+    def count(self, bitmap, typename=None):
+        """:return: amount of objects in the bitmap, of the given type only if typename is not None"""
+        if typename is not None:
+            bitmap &= getattr(self, typename.decode('ascii') + 's')
+        return _popcount(bitmap)
+
+    def iter_objects(self, bitmap):
+        """:return: iterator yielding (binsha, typename) of the objects in the bitmap, ordered by type and then
+            in pack order"""
+        order = self._positions()[0]
+        sha = self.pack.index.sha
+        nbytes = (len(order) + 7) // 8
+        for typename, type_bitmap in ((b'commit', self.commits), (b'tree', self.trees),
+                                      (b'blob', self.blobs), (b'tag', self.tags)):
+            for bit in _iter_bits(_int_to_le_bytes(bitmap & type_bitmap, nbytes)):
+                yield sha(order[bit]), typename
+            # END for each object
+        # END for each type
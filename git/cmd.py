@@ -11,10 +11,13 @@ import select
 import logging
 import threading
 import errno
-import mmap
+import time
+import stat
 
 from git.odict import OrderedDict
+from collections import deque
 from contextlib import contextmanager
+from functools import partial
 import signal
 from subprocess import (
     call,
@@ -37,7 +40,6 @@ from git.compat import (
     defenc,
     force_bytes,
     PY3,
-    bchr,
     # just to satisfy flake8 on py3
     unicode,
     safe_decode,
@@ -51,17 +53,98 @@ execute_kwargs = ('istream', 'with_keep_cwd', 'with_extended_output',
 log = logging.getLogger('git.cmd')
 log.addHandler(logging.NullHandler())
 
-__all__ = ('Git', )
+__all__ = ('Git', 'CallCache', 'CommandEvent', 'CommandTotals', 'CommandCounters')
 
 if sys.platform != 'win32':
     WindowsError = OSError
 
-if PY3:
-    _bchr = bchr
-else:
-    def _bchr(c):
-        return c
-# get custom byte character handling
+# The raw storage of os.environ, which can be compared cheaply to detect changes.
+# If it doesn't exist, environments for git processes are not cached.
+_os_environ_data_attr = PY3 and '_data' or 'data'
+
+_devnull = None
+
+# Clock used to measure durations, preferring a monotonic one
+_timer = getattr(time, 'perf_counter', time.time)
+
+# Serializes changes to the instrumentation hooks, which are swapped as a whole to be read without lock
+_hooks_lock = threading.Lock()
+
+
+def _get_devnull():
+    """:return: a file opened for writing to os.devnull, which is shared by all processes we spawn"""
+    global _devnull
+    if _devnull is None:
+        _devnull = open(os.devnull, 'wb')
+    return _devnull
+
+
+def _input_size(istream):
+    """:return: amount of bytes a process will read from the given standard input handle, if it is a
+        regular file, or None if it is unknown"""
+    try:
+        fd = istream.fileno()
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return max(0, st.st_size - os.lseek(fd, 0, os.SEEK_CUR))
+    except (AttributeError, OSError, ValueError):
+        return None
+    # END handle non-files
+
+
+def _wait_for_output(proc):
+    """Block until the given process wrote to stdout or stderr, or closed them"""
+    fds = [stream.fileno() for stream in (proc.stdout, proc.stderr) if stream is not None]
+    try:
+        if hasattr(select, 'poll'):
+            poll = select.poll()
+            for fd in fds:
+                poll.register(fd, select.POLLIN | select.POLLPRI)
+            poll.poll()
+        else:
+            select.select(fds, [], [])
+        # END handle select implementation
+    except (OSError, ValueError, select.error):
+        pass    # pipes are not selectable on windows - we just don't know when output arrived
+
+
+def _calling_api():
+    """:return: qualified name of the outermost function of the git package on the stack of the caller,
+        like 'git.repo.base.Repo.iter_commits', or None if there is none"""
+    outermost = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__') or ''
+        if ((module == 'git' or module.startswith('git.')) and not module.startswith('git.test')
+                and frame.f_code.co_name != '<lambda>'):
+            outermost = frame
+        frame = frame.f_back
+    # END for each frame
+    if outermost is None:
+        return None
+
+    code = outermost.f_code
+    qualname = getattr(code, 'co_qualname', None)
+    if qualname is None:
+        qualname = code.co_name
+        if code.co_argcount and code.co_varnames[0] in ('self', 'cls'):
+            owner = outermost.f_locals.get(code.co_varnames[0])
+            if owner is not None:
+                qualname = "%s.%s" % ((owner if isinstance(owner, type) else type(owner)).__name__, qualname)
+        # END handle methods
+    # END handle python versions without qualified names
+    return "%s.%s" % (outermost.f_globals['__name__'], qualname)
+
+
+def _emit_event(hooks, event):
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            log.exception("Instrumentation hook %r failed", hook)
+        # END don't let hooks break git commands
+    # END for each hook
 
 
 # ==============================================================================
@@ -70,84 +153,78 @@ else:
 # Documentation
 ## @{
 
-def handle_process_output(process, stdout_handler, stderr_handler, finalizer):
-    """Registers for notifications to lean that process output is ready to read, and dispatches lines to
-    the respective line handlers. We are able to handle carriage returns in case progress is sent by that
-    mean. For performance reasons, we only apply this to stderr.
+def handle_process_output(process, stdout_handler, stderr_handler, finalizer, decode_streams=True,
+                          separators=(b'\n', b'\r'), chunk_size=1024 * 64):
+    """Registers for notifications to lean that process output is ready to read, and dispatches records to
+    the respective handlers. By default, records are lines, separated by newlines or carriage returns to
+    handle progress sent by that means. Empty records are not dispatched.
     This function returns once the finalizer returns
     :return: result of finalizer
     :param process: subprocess.Popen instance
-    :param stdout_handler: f(stdout_line_string), or None
-    :param stderr_hanlder: f(stderr_line_string), or None
-    :param finalizer: f(proc) - wait for proc to finish"""
-    fdmap = {process.stdout.fileno(): (stdout_handler, [b'']),
-             process.stderr.fileno(): (stderr_handler, [b''])}
-
-    def _parse_lines_from_buffer(buf):
-        line = b''
-        bi = 0
-        lb = len(buf)
-        while bi < lb:
-            char = _bchr(buf[bi])
-            bi += 1
-
-            if char in (b'\r', b'\n') and line:
-                yield bi, line
-                line = b''
-            else:
-                line += char
-            # END process parsed line
-        # END while file is not done reading
-    # end
-
-    def _read_lines_from_fno(fno, last_buf_list):
-        buf = os.read(fno, mmap.PAGESIZE)
-        buf = last_buf_list[0] + buf
-
-        bi = 0
-        for bi, line in _parse_lines_from_buffer(buf):
-            yield line
-        # for each line to parse from the buffer
-
-        # keep remainder
-        last_buf_list[0] = buf[bi:]
-
-    def _dispatch_single_line(line, handler):
-        line = line.decode(defenc)
-        if line and handler:
-            handler(line)
-        # end dispatch helper
-    # end single line helper
-
-    def _dispatch_lines(fno, handler, buf_list):
-        lc = 0
-        for line in _read_lines_from_fno(fno, buf_list):
-            _dispatch_single_line(line, handler)
-            lc += 1
-        # for each line
-        return lc
-    # end
-
-    def _deplete_buffer(fno, handler, buf_list, wg=None):
-        lc = 0
-        while True:
-            line_count = _dispatch_lines(fno, handler, buf_list)
-            lc += line_count
-            if line_count == 0:
-                break
-        # end deplete buffer
-
-        if buf_list[0]:
-            _dispatch_single_line(buf_list[0], handler)
-            lc += 1
-        # end
+    :param stdout_handler: f(stdout_record), or None
+    :param stderr_handler: f(stderr_record), or None
+    :param finalizer: f(proc) - wait for proc to finish
+    :param decode_streams: if True, records are decoded and passed to the handlers as text, otherwise
+        handlers receive the records as bytes
+    :param separators: sequence of single bytes at which records are split, like b'\n', b'\r' or b'\0'.
+        The separators are not part of the dispatched records.
+    :param chunk_size: the maximum amount of bytes to read from the process at once"""
+    sep = separators[0]
+    other_separators = separators[1:]
+
+    def _dispatch_records(records, handler):
+        if handler is None:
+            return
+        for record in records:
+            if not record:
+                continue
+            if decode_streams:
+                record = record.decode(defenc)
+            handler(record)
+        # END for each record
+
+    def _read_records(fno, handler, pending):
+        """Read one chunk and dispatch all records completed by it. Incomplete records are kept in the
+        pending list of chunks.
+        :return: False if the stream is depleted"""
+        chunk = os.read(fno, chunk_size)
+        if not chunk:
+            return False
+        for other_sep in other_separators:
+            chunk = chunk.replace(other_sep, sep)
+        # END normalize separators
+
+        if chunk.find(sep) < 0:
+            # defer joining until the record is complete, to avoid copying long records once per chunk
+            pending.append(chunk)
+            return True
+        # END handle incomplete record
+
+        if pending:
+            pending.append(chunk)
+            chunk = b''.join(pending)
+            del pending[:]
+        # END handle previous chunks
+        records = chunk.split(sep)
+        remainder = records.pop()
+        if remainder:
+            pending.append(remainder)
+        _dispatch_records(records, handler)
+        return True
+
+    def _deplete_stream(fno, handler, pending, wg=None):
+        while _read_records(fno, handler, pending):
+            pass
+        _dispatch_records((b''.join(pending),), handler)
+        del pending[:]
 
         if wg:
             wg.done()
-
-        return lc
     # end
 
+    fdmap = {process.stdout.fileno(): (stdout_handler, list()),
+             process.stderr.fileno(): (stderr_handler, list())}
+
     if hasattr(select, 'poll'):
         # poll is preferred, as select is limited to file handles up to 1024 ... . This could otherwise be
         # an issue for us, as it matters how many handles our own process has
@@ -174,7 +251,7 @@ def handle_process_output(process, stdout_handler, stderr_handler, finalizer):
                 if result & CLOSED:
                     closed_streams.add(fd)
                 else:
-                    _dispatch_lines(fd, *fdmap[fd])
+                    _read_records(fd, *fdmap[fd])
                 # end handle closed stream
             # end for each poll-result tuple
 
@@ -184,8 +261,8 @@ def handle_process_output(process, stdout_handler, stderr_handler, finalizer):
         # end endless loop
 
         # Depelete all remaining buffers
-        for fno, (handler, buf_list) in fdmap.items():
-            _deplete_buffer(fno, handler, buf_list)
+        for fno, (handler, pending) in fdmap.items():
+            _deplete_stream(fno, handler, pending)
         # end for each file handle
 
         for fno in fdmap.keys():
@@ -197,9 +274,9 @@ def handle_process_output(process, stdout_handler, stderr_handler, finalizer):
         # Since the finalizer is expected to wait, we don't have to introduce our own wait primitive
         # NO: It's not enough unfortunately, and we will have to sync the threads
         wg = WaitGroup()
-        for fno, (handler, buf_list) in fdmap.items():
+        for fno, (handler, pending) in fdmap.items():
             wg.add(1)
-            t = threading.Thread(target=lambda: _deplete_buffer(fno, handler, buf_list, wg))
+            t = threading.Thread(target=_deplete_stream, args=(fno, handler, pending, wg))
             t.start()
         # end
         # NOTE: Just joining threads can possibly fail as there is a gap between .start() and when it's
@@ -228,6 +305,275 @@ def dict_to_slots_and__excluded_are_none(self, d, excluded=()):
 ## -- End Utilities -- @}
 
 
+class CallCache(object):
+
+    """A least-recently-used cache for the results of read-only git commands, to be installed
+    using ``Git.set_call_cache(...)``::
+
+     repo.git.set_call_cache(CallCache(repo.git_dir))
+     repo.git.rev_parse('HEAD')     # calls 'git rev-parse HEAD'
+     repo.git.rev_parse('HEAD')     # served from the cache
+
+    Entries are keyed by the command line, its environment and a fingerprint of the repository's
+    reference state and index, which is why they are not used anymore once a reference or the
+    index changes. Only commands in ``cacheable_commands`` which don't read from stdin or keep
+    their process alive are cached, and only if they succeeded.
+
+    ``hits`` and ``misses`` count the lookups of cacheable commands."""
+    __slots__ = ('_git_dir', '_max_entries', '_entries', '_lock', 'hits', 'misses')
+
+    # Commands whose output only depends on their arguments, the objects and the references
+    cacheable_commands = frozenset(('rev-parse', 'merge-base', 'name-rev', 'describe', 'ls-tree', 'cat-file'))
+
+    # Arguments which make a command depend on the working tree
+    uncacheable_args = frozenset(('--dirty', '--broken'))
+
+    # Files below the git directory which make up the fingerprint, in addition to the directories of all
+    # loose references
+    fingerprint_files = ('HEAD', 'ORIG_HEAD', 'FETCH_HEAD', 'MERGE_HEAD', 'packed-refs', 'index')
+
+    # execute() keyword arguments preventing results from being cached
+    _uncacheable_kwargs = ('istream', 'as_process', 'output_stream', 'with_keep_cwd')
+
+    def __init__(self, git_dir, max_entries=1024):
+        """:param git_dir: the .git directory of the repository, see ``Repo.git_dir``
+        :param max_entries: the maximum amount of results to keep"""
+        self._git_dir = git_dir
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size, st.st_ino)
+
+    def fingerprint(self):
+        """:return: hashable value which changes whenever a reference or the index changes.
+            Loose references are not looked at one by one: git writes them to a lock file which is renamed
+            into place, which changes the modification time of their directory"""
+        join = os.path.join
+        fingerprint = [self._stat(join(self._git_dir, name)) for name in self.fingerprint_files]
+        for root, dirs, files in os.walk(join(self._git_dir, 'refs')):
+            dirs.sort()
+            fingerprint.append((root, self._stat(root)))
+        # END for each ref directory
+        return tuple(fingerprint)
+
+    def is_cacheable(self, method, command, execute_kwargs):
+        """:return: True if the result of the given command may be cached
+        :param method: the dashed name of the git command, like 'rev-parse'"""
+        if method not in self.cacheable_commands:
+            return False
+        for kwarg in self._uncacheable_kwargs:
+            if execute_kwargs.get(kwarg):
+                return False
+        # END for each uncacheable kwarg
+        return not any(arg.split('=')[0] in self.uncacheable_args for arg in command)
+
+    def execute(self, git, method, command, execute_kwargs):
+        """Return the cached result of the given command, or run it with ``git.execute`` and cache it.
+
+        :param method: the dashed name of the git command, like 'rev-parse'
+        :return: the same as ``Git.execute``"""
+        if not self.is_cacheable(method, command, execute_kwargs):
+            return git.execute(command, **execute_kwargs)
+
+        key = (tuple(command),
+               tuple(sorted(execute_kwargs.items())),
+               tuple(sorted(git.environment().items())),
+               self.fingerprint())
+        with self._lock:
+            try:
+                result = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries[key] = result     # most recently used
+                return result
+            # END handle hit
+        # END lock
+
+        result = git.execute(command, **execute_kwargs)
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            # END evict least recently used
+        # END lock
+        return result
+
+    def clear(self):
+        """Drop all entries and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+        # END lock
+
+
+class CommandEvent(object):
+
+    """Describes a git command or a persistent cat-file request once it finished, and is passed to
+    the instrumentation hooks installed with ``Git.add_instrumentation_hook(...)``.
+
+    ``kind``
+        'execute' for commands run to completion by ``Git.execute``, 'process' for commands started
+        with ``as_process=True``, or 'cat-file' for requests handled by persistent cat-file processes.
+        Events of the 'process' kind are emitted once the process was spawned, which is why they don't
+        know about its output and status, and their ``wall_time`` only covers the spawning.
+    ``command``
+        the command line as list of strings. For 'cat-file' events, it is the one of the persistent process.
+    ``api``
+        qualified name of the outermost function or method of the git package which led to the command,
+        like 'git.repo.base.Repo.iter_commits', or None if it is unknown.
+    ``wall_time``, ``time_to_first_byte``
+        seconds until the command finished, and until its first output arrived. The latter is None if
+        it could not be measured.
+    ``bytes_in``, ``bytes_out``, ``bytes_err``
+        bytes written to its standard input, read from its standard output and from its standard error.
+        bytes_in is None if the input was a stream of unknown size.
+    ``status``
+        the exit status of the command. For 'cat-file' events, it is 0 if all requests succeeded and 1
+        otherwise.
+    ``requests``
+        amount of cat-file requests covered by the event, which may be more than one for the bulk methods
+        like ``Git.get_object_headers(...)``, or 0 for commands."""
+    __slots__ = ('kind', 'command', 'api', 'wall_time', 'time_to_first_byte',
+                 'bytes_in', 'bytes_out', 'bytes_err', 'status', 'requests', '_started')
+
+    def __init__(self, kind, command, api=None, requests=0):
+        self.kind = kind
+        self.command = command
+        self.api = api
+        self.wall_time = None
+        self.time_to_first_byte = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.bytes_err = 0
+        self.status = None
+        self.requests = requests
+        self._started = _timer()
+
+    def __repr__(self):
+        return "<git.CommandEvent %s %r from %s: status=%r, %.6f s>" % (self.kind, self.name, self.api,
+                                                                        self.status, self.wall_time or 0)
+
+    @property
+    def name(self):
+        """:return: name of the git subcommand, like 'rev-parse', or None if there is none"""
+        args = iter(self.command[1:])
+        for arg in args:
+            if arg in ('-c', '-C'):
+                next(args, None)            # skip the option's value
+            elif not arg.startswith('-'):
+                return arg
+        # END for each argument
+        return None
+
+    def _received(self, nbytes):
+        if self.time_to_first_byte is None:
+            self.time_to_first_byte = _timer() - self._started
+        self.bytes_out += nbytes
+
+    def _finished(self, status):
+        self.wall_time = _timer() - self._started
+        self.status = status
+
+
+class CommandTotals(object):
+
+    """Sums of the statistics of multiple ``CommandEvent`` instances"""
+    __slots__ = ('events', 'processes', 'requests', 'failures', 'wall_time', 'bytes_in', 'bytes_out', 'bytes_err')
+
+    def __init__(self):
+        self.events = 0
+        self.processes = 0      # spawned git processes
+        self.requests = 0       # cat-file requests
+        self.failures = 0       # events with a non-zero status
+        self.wall_time = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.bytes_err = 0
+
+    def __repr__(self):
+        return ("<git.CommandTotals events=%i, processes=%i, requests=%i, failures=%i, wall_time=%f>"
+                % (self.events, self.processes, self.requests, self.failures, self.wall_time))
+
+    def add(self, event):
+        """Add the statistics of the given ``CommandEvent``"""
+        self.events += 1
+        if event.kind == 'cat-file':
+            self.requests += event.requests
+        else:
+            self.processes += 1
+        # END handle kind
+        if event.status:
+            self.failures += 1
+        self.wall_time += event.wall_time or 0
+        self.bytes_in += event.bytes_in or 0
+        self.bytes_out += event.bytes_out
+        self.bytes_err += event.bytes_err
+
+
+class CommandCounters(object):
+
+    """An instrumentation hook aggregating the ``CommandEvent`` instances it receives. It is thread-safe,
+    and usually installed for the whole process using ``Git.add_instrumentation_hook(...)``, or for a
+    limited time using ``Git.measure_commands()``::
+
+     with Git.measure_commands() as counters:
+         list(repo.iter_commits('HEAD', max_count=10))
+     for api, totals in counters.most_common(3):
+         print(api, totals.processes, totals.wall_time)
+
+    ``totals`` is a ``CommandTotals`` instance over all events, ``by_api`` and ``by_command`` are
+    dictionaries mapping ``CommandEvent.api`` and ``CommandEvent.name`` to ``CommandTotals``"""
+    __slots__ = ('_lock', 'totals', 'by_api', 'by_command')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __call__(self, event):
+        with self._lock:
+            self.totals.add(event)
+            for key, table in ((event.api, self.by_api), (event.name, self.by_command)):
+                totals = table.get(key)
+                if totals is None:
+                    totals = table[key] = CommandTotals()
+                totals.add(event)
+            # END for each table
+        # END lock
+
+    def most_common(self, n=None, by='api', key='processes'):
+        """:return: list of up to n (name, CommandTotals) tuples, sorted by the given attribute of
+            CommandTotals in descending order
+        :param by: either 'api' or 'command', to choose the way the events are grouped
+        :param key: name of the attribute of ``CommandTotals`` to sort by, like 'wall_time'"""
+        with self._lock:
+            table = self.by_api if by == 'api' else self.by_command
+            items = sorted(table.items(), key=lambda item: getattr(item[1], key), reverse=True)
+        # END lock
+        return items[:n] if n is not None else items
+
+    def reset(self):
+        """Forget all previously received events"""
+        with self._lock:
+            self.totals = CommandTotals()
+            self.by_api = dict()
+            self.by_command = dict()
+        # END lock
+
+
 class Git(LazyMixin):
 
     """
@@ -243,28 +589,65 @@ class Git(LazyMixin):
         Set the GIT_PYTHON_TRACE environment variable print each invocation
         of the command to stdout.
         Set its value to 'full' to see details about the returned values.
+
+    ``Instrumentation``
+        Callables installed with ``Git.add_instrumentation_hook(...)`` receive a ``CommandEvent``
+        with timings and statistics of each command and persistent cat-file request.
+        ``Git.measure_commands()`` aggregates them while its context is active.
     """
-    __slots__ = ("_working_dir", "cat_file_all", "cat_file_header", "_version_info",
-                 "_git_options", "_environment")
+    __slots__ = ("_working_dir", "cat_file_all", "cat_file_header", "cat_file_command", "_version_info",
+                 "_git_options", "_environment", "_call_cache", "_process_env_cache")
                  
-    _excluded_ = ('cat_file_all', 'cat_file_header', '_version_info')
+    _excluded_ = ('cat_file_all', 'cat_file_header', 'cat_file_command', '_version_info', '_call_cache',
+                  '_process_env_cache')
     
     def __getstate__(self):
         return slots_to_dict(self, exclude=self._excluded_)
         
     def __setstate__(self, d):
         dict_to_slots_and__excluded_are_none(self, d, excluded=self._excluded_)
+        self._init_cat_file_pools()
         
     # CONFIGURATION
     # The size in bytes read from stdout when copying git's output to another stream
     max_chunk_size = 1024 * 64
 
+    # Maximum amount of persistent cat-file processes of each kind (header and contents) that
+    # may exist at the same time. Threads requesting a process while all of them are busy will
+    # block until one is returned.
+    cat_file_pool_size = 8
+
+    # Seconds after which idle persistent cat-file processes are terminated. If None, they
+    # are kept until clear_cache() is called.
+    cat_file_idle_timeout = None
+
+    # If True, header and content requests are multiplexed on the same 'cat-file --batch-command'
+    # processes, instead of using separate '--batch-check' and '--batch' processes. If None, it is
+    # used if git supports it, see cat_file_batch_command_version.
+    cat_file_batch_command = None
+
+    # The first git version providing 'cat-file --batch-command' with its flush command
+    cat_file_batch_command_version = (2, 36)
+
+    # Maximum amount of requests sent ahead to a persistent cat-file process by the bulk
+    # methods, like get_object_headers(), before waiting for their replies.
+    cat_file_batch_window = 256
+
+    # The amount of bytes of requests in flight is limited as well, to be sure we never block
+    # on a full stdin pipe while git blocks on the full stdout pipe we don't read yet.
+    # It is chosen to be below the smallest default pipe buffer size we know of.
+    _cat_file_batch_window_bytes = 4096
+
     git_exec_name = "git"           # default that should work on linux and windows
     git_exec_name_win = "git.cmd"   # alternate command name, windows only
 
     # Enables debugging of GitPython's git commands
     GIT_PYTHON_TRACE = os.environ.get("GIT_PYTHON_TRACE", False)
 
+    # Callables receiving a CommandEvent for each finished command, see add_instrumentation_hook().
+    # Commands are not measured at all unless there is at least one.
+    instrumentation_hooks = ()
+
     # value of Windows process creation flag taken from MSDN
     CREATE_NO_WINDOW = 0x08000000
     
@@ -365,19 +748,29 @@ class Git(LazyMixin):
         If not all data is read to the end of the objects's lifetime, we read the
         rest to assure the underlying stream continues to work"""
 
-        __slots__ = ('_stream', '_nbr', '_size')
+        __slots__ = ('_stream', '_nbr', '_size', '_release')
 
-        def __init__(self, size, stream):
+        def __init__(self, size, stream, release=None):
+            """:param release: if not None, f(discard=bool) is called once the stream is depleted, to signal
+                that the underlying stream may be used by others. discard is True if it is in an undefined state"""
             self._stream = stream
             self._size = size
             self._nbr = 0           # num bytes read
+            self._release = release
 
             # special case: if the object is empty, has null bytes, get the
             # final newline right away.
             if size == 0:
                 stream.read(1)
+                self._depleted()
             # END handle empty streams
 
+        def _depleted(self, discard=False):
+            release = self._release
+            self._release = None
+            if release is not None:
+                release(discard=discard)
+
         def read(self, size=-1):
             bytes_left = self._size - self._nbr
             if bytes_left == 0:
@@ -395,6 +788,7 @@ class Git(LazyMixin):
             # check for depletion, read our final byte to make the stream usable by others
             if self._size - self._nbr == 0:
                 self._stream.read(1)    # final newline
+                self._depleted()
             # END finish reading
             return data
 
@@ -416,6 +810,7 @@ class Git(LazyMixin):
             # handle final byte
             if self._size - self._nbr == 0:
                 self._stream.read(1)
+                self._depleted()
             # END finish reading
 
             return data
@@ -440,6 +835,11 @@ class Git(LazyMixin):
             # END readline loop
             return out
 
+        def _drain(self, chunk_size=1024 * 64):
+            """Read and discard all remaining data, which makes the underlying stream usable by others"""
+            while self.read(chunk_size):
+                pass
+
         def __iter__(self):
             return self
 
@@ -454,8 +854,109 @@ class Git(LazyMixin):
             if bytes_left:
                 # read and discard - seeking is impossible within a stream
                 # includes terminating newline
-                self._stream.read(bytes_left + 1)
+                try:
+                    self._stream.read(bytes_left + 1)
+                except (IOError, OSError, ValueError):
+                    self._depleted(discard=True)
+                    raise
+                self._nbr = self._size
             # END handle incomplete read
+            self._depleted()
+
+    class CatFilePool(object):
+
+        """A thread-safe pool of persistent ``git cat-file`` processes, all of which are
+        started with the same arguments.
+
+        Threads check out a process with ``acquire()``, use it for exactly one request-response
+        cycle and hand it back using ``release()``. Idle processes are reused, new ones are only
+        spawned if all existing ones are busy and the pool is not yet full, as configured by
+        ``Git.cat_file_pool_size``. Processes idling longer than ``Git.cat_file_idle_timeout``
+        are terminated the next time the pool is used.
+
+        :note: a thread which holds on to more not-depleted streams than the pool size will
+            block forever, as no process can be returned to the pool."""
+        __slots__ = ('_kwargs', '_cond', '_idle', '_busy', 'batch_command')
+
+        def __init__(self, **kwargs):
+            """:param kwargs: keyword arguments for the cat-file command, like batch=True"""
+            self._kwargs = kwargs
+            # if True, requests are commands like 'info <ref>' which are buffered until a flush command
+            self.batch_command = bool(kwargs.get('batch_command'))
+            self._cond = threading.Condition()
+            self._idle = list()     # list((proc, time_of_release), ...), most recently used last
+            self._busy = set()      # processes currently checked out
+
+        def __len__(self):
+            """:return: amount of processes currently owned by the pool"""
+            with self._cond:
+                return len(self._idle) + len(self._busy)
+
+        def _reap_idle(self, timeout):
+            if timeout is None or not self._idle:
+                return
+            deadline = time.time() - timeout
+            self._idle = [(proc, ts) for proc, ts in self._idle if ts >= deadline]
+
+        def acquire(self, git):
+            """:param git: Git instance to read the pool configuration from, and to spawn new processes with
+            :return: a running persistent process for exclusive use by the caller. It must be handed
+                back using ``release()`` once the request was handled."""
+            with self._cond:
+                while True:
+                    self._reap_idle(git.cat_file_idle_timeout)
+                    while self._idle:
+                        proc = self._idle.pop()[0]
+                        if proc.poll() is None:
+                            self._busy.add(proc)
+                            return proc
+                        # END skip dead processes
+                    # END for each idle process
+                    if len(self._busy) < max(1, git.cat_file_pool_size):
+                        break
+                    self._cond.wait()
+                # END wait for free slot
+                slot = object()
+                self._busy.add(slot)
+            # END lock
+
+            # spawn outside of the lock, it takes time and may fail
+            try:
+                proc = git._call_process('cat_file', istream=PIPE, as_process=True, **self._kwargs)
+            except BaseException:
+                self.release(slot, discard=True)
+                raise
+            # END handle spawn failure
+            with self._cond:
+                # if the pool was cleared in the meanwhile, the process will be discarded on release
+                if slot in self._busy:
+                    self._busy.remove(slot)
+                    self._busy.add(proc)
+                # END swap reservation
+            return proc
+
+        def release(self, proc, discard=False):
+            """Return a process previously obtained by ``acquire()`` to the pool.
+
+            :param discard: if True, the process is not reused and will be terminated, which should be done
+                whenever its communication state is unknown, i.e. after an IO error."""
+            with self._cond:
+                if proc in self._busy:
+                    self._busy.remove(proc)
+                    if not discard:
+                        self._idle.append((proc, time.time()))
+                    # END keep process
+                # END handle processes owned before clear()
+                self._cond.notify()
+            # END lock
+
+        def clear(self):
+            """Terminate all idle processes. Busy processes will be terminated once they are released."""
+            with self._cond:
+                self._idle = list()
+                self._busy = set()
+                self._cond.notify_all()
+            # END lock
 
     def __init__(self, working_dir=None):
         """Initialize this instance with:
@@ -472,9 +973,31 @@ class Git(LazyMixin):
         # Extra environment variables to pass to git commands
         self._environment = {}
 
+        # optional CallCache for the results of read-only commands
+        self._call_cache = None
+
+        # (os_environ_snapshot, environment_snapshot, process_environment), see _process_environment()
+        self._process_env_cache = None
+
         # cached command slots
-        self.cat_file_header = None
-        self.cat_file_all = None
+        self._init_cat_file_pools()
+
+    def _init_cat_file_pools(self):
+        self.cat_file_header = self.CatFilePool(batch_check=True)
+        self.cat_file_all = self.CatFilePool(batch=True)
+        self.cat_file_command = self.CatFilePool(batch_command=True, buffer=True)
+
+    def _cat_file_pool(self, contents):
+        """:return: CatFilePool to handle content requests if contents is True, or header requests otherwise.
+            The same pool serves both if 'cat-file --batch-command' is used, see ``cat_file_batch_command``"""
+        use_batch_command = self.cat_file_batch_command
+        if use_batch_command is None:
+            use_batch_command = self.version_info[:2] >= self.cat_file_batch_command_version
+        if use_batch_command:
+            return self.cat_file_command
+        if contents:
+            return self.cat_file_all
+        return self.cat_file_header
 
     def __getattr__(self, name):
         """A convenience method as it allows to call the command as if it was
@@ -498,6 +1021,50 @@ class Git(LazyMixin):
         """:return: Git directory we are working on"""
         return self._working_dir
 
+    @classmethod
+    def add_instrumentation_hook(cls, hook):
+        """Install a hook which is called with a ``CommandEvent`` once a command or persistent cat-file
+        request of any instance finished. It is called in the thread which ran the command, exceptions
+        it raises are logged and ignored.
+
+        :param hook: callable taking a ``CommandEvent``, like a ``CommandCounters`` instance
+        :return: hook"""
+        with _hooks_lock:
+            cls.instrumentation_hooks = cls.instrumentation_hooks + (hook,)
+        return hook
+
+    @classmethod
+    def remove_instrumentation_hook(cls, hook):
+        """Uninstall a hook previously installed with ``add_instrumentation_hook(...)``
+
+        :raise ValueError: if the hook is not installed"""
+        with _hooks_lock:
+            hooks = list(cls.instrumentation_hooks)
+            hooks.remove(hook)
+            cls.instrumentation_hooks = tuple(hooks)
+        # END lock
+
+    @classmethod
+    @contextmanager
+    def measure_commands(cls, counters=None):
+        """Context manager aggregating all commands and persistent cat-file requests while it is active::
+
+         with Git.measure_commands() as counters:
+             repo.head.commit.tree.traverse()
+         print(counters.totals.processes)
+
+        :param counters: ``CommandCounters`` instance to use, or None to create a new one
+        :return: the ``CommandCounters`` instance
+        :note: commands of other threads are measured as well"""
+        if counters is None:
+            counters = CommandCounters()
+        cls.add_instrumentation_hook(counters)
+        try:
+            yield counters
+        finally:
+            cls.remove_instrumentation_hook(counters)
+        # END uninstall hook
+
     @property
     def version_info(self):
         """
@@ -610,14 +1177,7 @@ class Git(LazyMixin):
             cwd = self._working_dir
 
         # Start the process
-        env = os.environ.copy()
-        # Attempt to force all output to plain ascii english, which is what some parsing code
-        # may expect.
-        # According to stackoverflow (http://goo.gl/l74GC8), we are setting LANGUAGE as well
-        # just to be sure.
-        env["LANGUAGE"] = "C"
-        env["LC_ALL"] = "C"
-        env.update(self._environment)
+        env = self._process_environment()
 
         if sys.platform == 'win32':
             cmd_not_found_exception = WindowsError
@@ -631,6 +1191,12 @@ class Git(LazyMixin):
         # end handle
 
         creationflags = self.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+        hooks = self.instrumentation_hooks
+        event = None
+        if hooks:
+            event = CommandEvent(as_process and 'process' or 'execute', command, _calling_api())
+            event.bytes_in = _input_size(istream)
+        # END prepare instrumentation
         try:
             proc = Popen(command,
                          env=env,
@@ -638,7 +1204,7 @@ class Git(LazyMixin):
                          bufsize=-1,
                          stdin=istream,
                          stderr=PIPE,
-                         stdout=PIPE if with_stdout else open(os.devnull, 'wb'),
+                         stdout=PIPE if with_stdout else _get_devnull(),
                          shell=self.USE_SHELL,
                          close_fds=(os.name == 'posix'),  # unsupported on windows
                          universal_newlines=universal_newlines,
@@ -649,6 +1215,10 @@ class Git(LazyMixin):
             raise GitCommandNotFound(str(err))
 
         if as_process:
+            if event is not None:
+                event._finished(None)
+                _emit_event(hooks, event)
+            # END handle instrumentation
             return self.AutoInterrupt(proc, command)
 
         def _kill_process(pid):
@@ -689,7 +1259,16 @@ class Git(LazyMixin):
             if output_stream is None:
                 if kill_after_timeout:
                     watchdog.start()
+                if event is not None and istream is not PIPE:
+                    _wait_for_output(proc)
+                    event._received(0)
+                # END measure time to first byte
                 stdout_value, stderr_value = proc.communicate()
+                stdout_value = stdout_value or b''
+                if event is not None:
+                    event.bytes_out = len(stdout_value)
+                    event.bytes_err = len(stderr_value)
+                # END count output
                 if kill_after_timeout:
                     watchdog.cancel()
                     if kill_check.isSet():
@@ -702,18 +1281,32 @@ class Git(LazyMixin):
                     stderr_value = stderr_value[:-1]
                 status = proc.returncode
             else:
-                stream_copy(proc.stdout, output_stream, self.max_chunk_size)
+                if event is not None and istream is not PIPE:
+                    _wait_for_output(proc)
+                    event._received(0)
+                # END measure time to first byte
+                nbytes = stream_copy(proc.stdout, output_stream, self.max_chunk_size)
                 stdout_value = output_stream
                 stderr_value = proc.stderr.read()
+                if event is not None:
+                    event.bytes_out = nbytes
+                    event.bytes_err = len(stderr_value)
+                # END count output
                 # strip trailing "\n"
                 if stderr_value.endswith(b"\n"):
                     stderr_value = stderr_value[:-1]
                 status = proc.wait()
             # END stdout handling
         finally:
-            proc.stdout.close()
+            if proc.stdout:
+                proc.stdout.close()
             proc.stderr.close()
 
+        if event is not None:
+            event._finished(status)
+            _emit_event(hooks, event)
+        # END handle instrumentation
+
         if self.GIT_PYTHON_TRACE == 'full':
             cmdstr = " ".join(command)
 
@@ -745,6 +1338,135 @@ class Git(LazyMixin):
         else:
             return stdout_value
 
+    def iter_records(self, method, *args, **kwargs):
+        """Run the given git command and stream the records of its standard output as they come in,
+        using a bounded amount of memory regardless of the size of the output.
+
+        ``Examples``::
+            for record in git.iter_records('ls_tree', 'HEAD', r=True, z=True, sep=b'\\0'):
+                mode, typename, hexsha_and_path = record.split(b' ', 2)
+
+        :param method: the git command, as in ``_call_process``
+        :param args: arguments for the git command, as in ``_call_process``
+        :param kwargs: keyword arguments for the git command and ``execute``, as in ``_call_process``,
+            except for ``as_process`` and ``output_stream``. Additionally:
+
+            * sep - bytes separating the records in the output, b'\\n' by default. It is not part of
+              the yielded records.
+        :return: generator yielding records as bytes. If it is abandoned before it is depleted, the git
+            process is terminated.
+        :raise GitCommandError: after the last record, if git exited with a non-zero status"""
+        sep = kwargs.pop('sep', b'\n')
+        with_exceptions = kwargs.pop('with_exceptions', True)
+        proc = self._call_process(method, *args, as_process=True, **kwargs)
+
+        # consume stderr concurrently, git would block once the pipe buffer is full otherwise
+        stderr_chunks = list()
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()))
+        stderr_reader.daemon = True
+        stderr_reader.start()
+
+        depleted = False
+        try:
+            fd = proc.stdout.fileno()
+            pending = list()    # chunks of the current, incomplete record
+            overlap = len(sep) - 1
+            tail = b''          # last bytes of the pending chunks, which may start a separator
+            while True:
+                chunk = os.read(fd, self.max_chunk_size)
+                if not chunk:
+                    break
+                if chunk.find(sep) < 0 and not (tail and (tail + chunk[:overlap]).find(sep) >= 0):
+                    pending.append(chunk)
+                    if overlap:
+                        tail = chunk[-overlap:] if len(chunk) >= overlap else (tail + chunk)[-overlap:]
+                    continue
+                # END handle incomplete record
+                if pending:
+                    pending.append(chunk)
+                    chunk = b''.join(pending)
+                    del pending[:]
+                # END handle previous chunks
+                records = chunk.split(sep)
+                remainder = records.pop()
+                tail = remainder[-overlap:] if overlap else b''
+                if remainder:
+                    pending.append(remainder)
+                for record in records:
+                    yield record
+                # END for each complete record
+            # END for each chunk
+            if pending:
+                yield b''.join(pending)
+            depleted = True
+        finally:
+            if not depleted and proc.poll() is None:
+                try:
+                    proc.kill()
+                except OSError:
+                    pass    # it finished in the meanwhile
+            # END terminate abandoned process
+            status = proc.proc.wait()
+            stderr_reader.join()
+        # END assure process is finalized
+
+        if with_exceptions and status != 0:
+            raise GitCommandError(proc.args, status, b''.join(stderr_chunks))
+        # END handle errors
+
+    def iter_lines(self, method, *args, **kwargs):
+        """As ``iter_records``, but yields the lines of the output as text, without line endings
+
+        ``Examples``::
+            for hexsha in git.iter_lines('rev_list', 'HEAD'):
+                ..."""
+        kwargs['sep'] = b'\n'
+        for line in self.iter_records(method, *args, **kwargs):
+            yield safe_decode(line)
+        # END for each line
+
+    def set_call_cache(self, cache):
+        """Set the cache for the results of read-only commands run through ``_call_process``.
+
+        :param cache: a ``CallCache`` instance, or None to disable caching
+        :return: the previous cache"""
+        prev_cache = self._call_cache
+        self._call_cache = cache
+        return prev_cache
+
+    @property
+    def call_cache(self):
+        """:return: the ``CallCache`` in use, or None"""
+        return self._call_cache
+
+    def _process_environment(self):
+        """:return: the environment for newly spawned git processes. It is computed once and reused
+            until os.environ or our own environment changes, hence it must not be modified."""
+        os_env = getattr(os.environ, _os_environ_data_attr, None)
+        cache = self._process_env_cache
+        if cache is not None and os_env is not None and cache[0] == os_env and cache[1] == self._environment:
+            return cache[2]
+        # END handle cache hit
+
+        env = os.environ.copy()
+        # Attempt to force all output to plain ascii english, which is what some parsing code
+        # may expect.
+        # According to stackoverflow (http://goo.gl/l74GC8), we are setting LANGUAGE as well
+        # just to be sure.
+        env["LANGUAGE"] = "C"
+        env["LC_ALL"] = "C"
+        env.update(self._environment)
+        if not PY3:
+            # like arguments, text values must be encoded before python 2 passes them on
+            for key, value in self._environment.items():
+                if isinstance(value, unicode):
+                    env[key] = value.encode(defenc)
+            # END for each value
+        # END encode environment
+        if os_env is not None:
+            self._process_env_cache = (dict(os_env), dict(self._environment), env)
+        return env
+
     def environment(self):
         return self._environment
 
@@ -861,30 +1583,14 @@ class Git(LazyMixin):
             split_single_char_options=True, **kwargs)
         return self
 
-    def _call_process(self, method, *args, **kwargs):
-        """Run the given git command with the specified arguments and return
-        the result as a String
-
-        :param method:
-            is the command. Contained "_" characters will be converted to dashes,
-            such as in 'ls_files' to call 'ls-files'.
-
-        :param args:
-            is the list of arguments. If None is included, it will be pruned.
-            This allows your commands to call git more conveniently as None
-            is realized as non-existent
-
-        :param kwargs:
-            is a dict of keyword arguments.
-            This function accepts the same optional keyword arguments
-            as execute().
+    def _prepare_call_args(self, args, kwargs):
+        """Separate the keyword arguments meant for ``execute`` from those to be transformed
+        into command line options, see ``_call_process``.
 
-        ``Examples``::
-            git.rev_list('master', max_count=10, header=True)
-
-        :return: Same as ``execute``"""
+        :return: tuple(list(subcommand_arguments), dict(execute_kwargs))"""
         # Handle optional arguments prior to calling transform_kwargs
         # otherwise these'll end up in args, which is bad.
+        kwargs = dict(kwargs)
         _kwargs = dict()
         for kwarg in execute_kwargs:
             try:
@@ -909,24 +1615,59 @@ class Git(LazyMixin):
             # end handle error
             args = ext_args[:index + 1] + opt_args + ext_args[index + 1:]
         # end handle kwargs
+        return args, _kwargs
 
-        def make_call():
-            call = [self.GIT_PYTHON_GIT_EXECUTABLE]
+    def _make_call(self, method, args):
+        """:return: the full command line to execute the given subcommand with its prepared arguments"""
+        call = [self.GIT_PYTHON_GIT_EXECUTABLE]
+
+        # add the git options, the reset to empty
+        # to avoid side_effects
+        call.extend(self._git_options)
+        self._git_options = ()
+
+        call.extend([dashify(method)])
+        call.extend(args)
+        return call
+
+    def _call_process(self, method, *args, **kwargs):
+        """Run the given git command with the specified arguments and return
+        the result as a String
 
-            # add the git options, the reset to empty
-            # to avoid side_effects
-            call.extend(self._git_options)
-            self._git_options = ()
+        :param method:
+            is the command. Contained "_" characters will be converted to dashes,
+            such as in 'ls_files' to call 'ls-files'.
+
+        :param args:
+            is the list of arguments. If None is included, it will be pruned.
+            This allows your commands to call git more conveniently as None
+            is realized as non-existent
 
-            call.extend([dashify(method)])
-            call.extend(args)
-            return call
+        :param kwargs:
+            is a dict of keyword arguments.
+            This function accepts the same optional keyword arguments
+            as execute().
+
+        ``Examples``::
+            git.rev_list('master', max_count=10, header=True)
+
+        :return: Same as ``execute``"""
+        args, _kwargs = self._prepare_call_args(args, kwargs)
+
+        def make_call():
+            return self._make_call(method, args)
         # END utility to recreate call after changes
 
+        def execute(command):
+            if self._call_cache is not None:
+                return self._call_cache.execute(self, dashify(method), command, _kwargs)
+            return self.execute(command, **_kwargs)
+        # END utility to use the call cache
+
         if sys.platform == 'win32':
             try:
                 try:
-                    return self.execute(make_call(), **_kwargs)
+                    return execute(make_call())
                 except WindowsError:
                     # did we switch to git.cmd already, or was it changed from default ? permanently fail
                     if self.GIT_PYTHON_GIT_EXECUTABLE != self.git_exec_name:
@@ -935,7 +1676,7 @@ class Git(LazyMixin):
                     type(self).GIT_PYTHON_GIT_EXECUTABLE = self.git_exec_name_win
 
                     try:
-                        return self.execute(make_call(), **_kwargs)
+                        return execute(make_call())
                     finally:
                         import warnings
                         msg = "WARNING: Automatically switched to use git.cmd as git executable"
@@ -950,7 +1691,7 @@ class Git(LazyMixin):
                 raise WindowsError("The system cannot find or execute the file at %r" % self.GIT_PYTHON_GIT_EXECUTABLE)
             # END provide better error message
         else:
-            return self.execute(make_call(), **_kwargs)
+            return execute(make_call())
         # END handle windows default installation
 
     def _parse_object_header(self, header_line):
@@ -988,38 +1729,159 @@ class Git(LazyMixin):
             refstr += "\n"
         return refstr.encode(defenc)
 
-    def _get_persistent_cmd(self, attr_name, cmd_name, *args, **kwargs):
-        cur_val = getattr(self, attr_name)
-        if cur_val is not None:
-            return cur_val
-
-        options = {"istream": PIPE, "as_process": True}
-        options.update(kwargs)
-
-        cmd = self._call_process(cmd_name, *args, **options)
-        setattr(self, attr_name, cmd)
-        return cmd
-
-    def __get_object_header(self, cmd, ref):
-        cmd.stdin.write(self._prepare_ref(ref))
+    def _prepare_request(self, pool, ref, contents):
+        """:return: bytes to send to a process of the given pool to request the header of the given ref,
+            or its contents as well if contents is True"""
+        request = self._prepare_ref(ref)
+        if pool.batch_command:
+            request = (contents and b'contents ' or b'info ') + request
+        return request
+
+    def _flush_requests(self, pool, cmd):
+        """Make sure all requests written to cmd, a process of the given pool, are handled by git"""
+        if pool.batch_command:
+            cmd.stdin.write(b'flush\n')
         cmd.stdin.flush()
-        return self._parse_object_header(cmd.stdout.readline())
+
+    def __get_object_header(self, pool, cmd, ref, contents, event=None):
+        request = self._prepare_request(pool, ref, contents)
+        cmd.stdin.write(request)
+        self._flush_requests(pool, cmd)
+        header_line = cmd.stdout.readline()
+        if event is not None:
+            event.bytes_in += len(request)
+            event._received(len(header_line))
+        # END handle instrumentation
+        return self._parse_object_header(header_line)
+
+    def _begin_cat_file_event(self, cmd, requests=1):
+        """:return: CommandEvent for requests to be sent to the given persistent command, or None if
+            there are no instrumentation hooks"""
+        if not self.instrumentation_hooks:
+            return None
+        return CommandEvent('cat-file', cmd.args, _calling_api(), requests)
+
+    def _finish_cat_file_event(self, event, failed=False):
+        if event is not None:
+            event._finished(failed and 1 or 0)
+            _emit_event(self.instrumentation_hooks, event)
+        # END handle instrumentation
+
+    def __request_object_header(self, pool, ref, contents):
+        """:return: (cmd, (hexsha, type_string, size_as_int), event), with cmd being checked out from the
+            given pool. It is returned to the pool if the request failed. event is the CommandEvent to finish
+            once the reply was read entirely, or None if there are no instrumentation hooks
+        :param contents: if True, the contents of the object are requested as well"""
+        cmd = pool.acquire(self)
+        event = self._begin_cat_file_event(cmd)
+        try:
+            return cmd, self.__get_object_header(pool, cmd, ref, contents, event), event
+        except ValueError:
+            # the process is in a defined state, the error was reported by git
+            pool.release(cmd)
+            self._finish_cat_file_event(event, failed=True)
+            raise
+        except BaseException:
+            pool.release(cmd, discard=True)
+            self._finish_cat_file_event(event, failed=True)
+            raise
+        # END handle errors
 
     def get_object_header(self, ref):
         """ Use this method to quickly examine the type and size of the object behind
         the given ref.
 
         :note: The method will only suffer from the costs of command invocation
-            once and reuses the command in subsequent calls.
+            once and reuses the command in subsequent calls. It is threadsafe, as each
+            thread will use a persistent command of its own, see ``Git.CatFilePool``.
 
         :return: (hexsha, type_string, size_as_int)"""
-        cmd = self._get_persistent_cmd("cat_file_header", "cat_file", batch_check=True)
-        return self.__get_object_header(cmd, ref)
+        pool = self._cat_file_pool(contents=False)
+        cmd, info, event = self.__request_object_header(pool, ref, contents=False)
+        pool.release(cmd)
+        self._finish_cat_file_event(event)
+        return info
+
+    def __iter_batch_requests(self, pool, refs, contents):
+        """Send the given refs to a persistent command checked out from the given pool, keeping
+        up to ``cat_file_batch_window`` requests in flight. If contents is True, the contents of
+        the objects are requested as well.
+
+        :return: generator yielding (cmd, ref, event) tuples in order of the given refs, each once the reply
+            for ref is the next one to be read from cmd.stdout. It must be read entirely before the
+            generator is advanced, and its size is to be reported using event._received() unless event is None.
+            The command is returned to the pool once all replies were read, or discarded if the
+            generator is abandoned early."""
+        window = max(1, self.cat_file_batch_window)
+        cmd = pool.acquire(self)
+        event = self._begin_cat_file_event(cmd, requests=0)
+        refs = iter(refs)
+        pending = deque()       # (ref, request_size)
+        pending_bytes = 0
+        lookahead = None        # prepared request that didn't fit into the window
+        exhausted = False
+        try:
+            while True:
+                # top up once at least half of the window was answered, to amortize the flushes
+                if not exhausted and len(pending) <= window // 2:
+                    while len(pending) < window:
+                        if lookahead is None:
+                            try:
+                                ref = next(refs)
+                            except StopIteration:
+                                exhausted = True
+                                break
+                            lookahead = (ref, self._prepare_request(pool, ref, contents))
+                        # END get next request
+                        ref, request = lookahead
+                        if pending and pending_bytes + len(request) > self._cat_file_batch_window_bytes:
+                            break
+                        cmd.stdin.write(request)
+                        pending.append((ref, len(request)))
+                        pending_bytes += len(request)
+                        lookahead = None
+                        if event is not None:
+                            event.requests += 1
+                            event.bytes_in += len(request)
+                        # END handle instrumentation
+                    # END fill window
+                    self._flush_requests(pool, cmd)
+                # END top up requests
+
+                if not pending:
+                    break
+                ref, request_size = pending.popleft()
+                pending_bytes -= request_size
+                yield cmd, ref, event
+            # END for each reply
+        except BaseException:
+            pool.release(cmd, discard=True)
+            self._finish_cat_file_event(event, failed=True)
+            raise
+        # END handle abandoned or failed pipelines
+        pool.release(cmd)
+        self._finish_cat_file_event(event)
+
+    def get_object_headers(self, refs):
+        """ As get_object_header, but examines any amount of refs at once.
+        Requests are sent ahead of reading their replies, hence git can work on them while we are
+        processing previous results. Use this method instead of multiple calls to get_object_header
+        to avoid one round-trip through the pipe per object.
+
+        :param refs: iterable of refs, like hexshas, which is consumed lazily
+        :return: generator yielding (hexsha, type_string, size_as_int) tuples in order of the given refs
+        :raise ValueError: once a ref could not be resolved, see ``get_object_header``"""
+        pool = self._cat_file_pool(contents=False)
+        for cmd, ref, event in self.__iter_batch_requests(pool, refs, contents=False):
+            header_line = cmd.stdout.readline()
+            if event is not None:
+                event._received(len(header_line))
+            yield self._parse_object_header(header_line)
+        # END for each reply
 
     def get_object_data(self, ref):
         """ As get_object_header, but returns object data as well
-        :return: (hexsha, type_string, size_as_int,data_string)
-        :note: not threadsafe"""
+        :return: (hexsha, type_string, size_as_int,data_string)"""
         hexsha, typename, size, stream = self.stream_object_data(ref)
         data = stream.read(size)
         del(stream)
@@ -1029,17 +1891,54 @@ class Git(LazyMixin):
         """ As get_object_header, but returns the data as a stream
 
         :return: (hexsha, type_string, size_as_int, stream)
-        :note: This method is not threadsafe, you need one independent Command instance per thread to be safe !"""
-        cmd = self._get_persistent_cmd("cat_file_all", "cat_file", batch=True)
-        hexsha, typename, size = self.__get_object_header(cmd, ref)
-        return (hexsha, typename, size, self.CatFileContentStream(size, cmd.stdout))
+        :note: The persistent command serving the stream is only available to others once the stream
+            was read entirely or deleted. This method is threadsafe, but a thread must not keep more
+            streams alive than there are commands in the pool, see ``Git.cat_file_pool_size``."""
+        pool = self._cat_file_pool(contents=True)
+        cmd, (hexsha, typename, size), event = self.__request_object_header(pool, ref, contents=True)
+        if event is None:
+            release = partial(pool.release, cmd)
+        else:
+            def release(discard=False):
+                pool.release(cmd, discard=discard)
+                if not discard:
+                    event.bytes_out += size + 1     # the contents and their terminating newline
+                self._finish_cat_file_event(event, failed=discard)
+            # END release with instrumentation
+        # END handle instrumentation
+        return (hexsha, typename, size, self.CatFileContentStream(size, cmd.stdout, release))
+
+    def iter_object_data(self, refs):
+        """ As stream_object_data, but streams the data of any amount of objects at once.
+        Requests are sent ahead of reading their replies, which is why git can prepare the next objects
+        while we are reading previous ones. Use this method instead of multiple calls to
+        stream_object_data to avoid one round-trip through the pipe per object.
+
+        :param refs: iterable of refs, like hexshas, which is consumed lazily
+        :return: generator yielding (hexsha, type_string, size_as_int, stream) tuples in order of
+            the given refs.
+        :note: Each stream is only valid until the next tuple is requested, data which wasn't read
+            by then is skipped.
+        :raise ValueError: once a ref could not be resolved, see ``get_object_header``"""
+        pool = self._cat_file_pool(contents=True)
+        for cmd, ref, event in self.__iter_batch_requests(pool, refs, contents=True):
+            header_line = cmd.stdout.readline()
+            hexsha, typename, size = self._parse_object_header(header_line)
+            if event is not None:
+                event._received(len(header_line) + size + 1)
+            stream = self.CatFileContentStream(size, cmd.stdout)
+            yield (hexsha, typename, size, stream)
+            # the next reply may only be read once this one was consumed entirely
+            stream._drain()
+        # END for each reply
 
     def clear_cache(self):
         """Clear all kinds of internal caches to release resources.
 
-        Currently persistent commands will be interrupted.
+        Currently persistent commands will be interrupted, those which are in use once they are released.
 
         :return: self"""
-        self.cat_file_all = None
-        self.cat_file_header = None
+        self.cat_file_all.clear()
+        self.cat_file_header.clear()
+        self.cat_file_command.clear()
         return self
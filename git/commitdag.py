@@ -0,0 +1,323 @@
+# commitdag.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+"""Module with an in-memory graph of a selected part of the history, to answer many questions about
+the relations of its commits without running git once per question"""
+import heapq
+from array import array
+from binascii import a2b_hex
+
+from git.compat import string_types
+from git.objects.commit import Commit
+
+__all__ = ('CommitDAG', )
+
+# flags used while finding merge bases
+_LEFT = 0x1
+_RIGHT = 0x2
+_BOTH = _LEFT | _RIGHT
+_STALE = 0x4
+
+
+class CommitDAG(object):
+
+    """The commits reachable from some revisions, with their parents and commit times, kept in arrays.
+
+    Commits are identified by dense integer ids, which are assigned in topological order: the id of a commit
+    is smaller than the ids of all its ancestors. Parents are stored in compressed sparse row form, the parents
+    of the commit with id i being ``parents[parent_starts[i]:parent_starts[i + 1]]``. Parents which were
+    excluded from the selection are not part of the graph.
+
+    Methods taking commits accept ``Commit`` instances, binary shas and hexadecimal shas. They raise a
+    KeyError if a commit isn't part of the graph.
+
+    :note: the graph is read once, commits added to the repository later are not part of it"""
+    __slots__ = ('repo', '_shas', '_ids', '_parent_starts', '_parents', '_times', '_generations')
+
+    def __init__(self, repo, shas, parent_starts, parents, times):
+        """:param shas: bytes with the binary shas of all commits, ordered by id
+        :param parent_starts: array with the index of the first parent of each commit in parents, and the
+            amount of parents as last item
+        :param parents: array with the ids of the parents of all commits, ordered by the id of their child
+        :param times: array with the commit time of each commit"""
+        self.repo = repo
+        self._shas = shas
+        self._ids = dict((shas[i:i + 20], i // 20) for i in range(0, len(shas), 20))
+        self._parent_starts = parent_starts
+        self._parents = parents
+        self._times = times
+
+        # the generation of a commit is larger than the ones of all its ancestors, which come after it
+        generations = array('i', [1]) * len(times)
+        for i in range(len(times) - 1, -1, -1):
+            for parent in parents[parent_starts[i]:parent_starts[i + 1]]:
+                if generations[parent] >= generations[i]:
+                    generations[i] = generations[parent] + 1
+            # END for each parent
+        # END for each commit
+        self._generations = generations
+
+    @classmethod
+    def from_rev_list(cls, repo, revs, **kwargs):
+        """:return: CommitDAG of the commits listed by a single ``git rev-list`` of the given revisions
+        :param revs: list of revision specifiers, which may exclude commits like 'a..b' or '^a'
+        :param kwargs: additional arguments to be passed to git rev-list"""
+        hexshas = list()
+        parent_hexshas = list()
+        times = array('l')
+        for line in repo.git.iter_records('rev_list', '--topo-order', '--parents', '--timestamp', *revs, **kwargs):
+            tokens = line.split()
+            times.append(int(tokens[0]))
+            hexshas.append(tokens[1])
+            parent_hexshas.append(tokens[2:])
+        # END for each commit
+
+        shas = a2b_hex(b''.join(hexshas))
+        del hexshas
+        ids = dict((shas[i:i + 20], i // 20) for i in range(0, len(shas), 20))
+        parent_starts = array('i', [0])
+        parents = array('i')
+        for commit_parent_hexshas in parent_hexshas:
+            for hexsha in commit_parent_hexshas:
+                parent = ids.get(a2b_hex(hexsha))
+                if parent is not None:
+                    parents.append(parent)
+            # END for each parent
+            parent_starts.append(len(parents))
+        # END for each commit
+        return cls(repo, shas, parent_starts, parents, times)
+
+    def __len__(self):
+        return len(self._times)
+
+    def __contains__(self, commit):
+        try:
+            self.id(commit)
+        except KeyError:
+            return False
+        return True
+
+    def id(self, commit):
+        """:return: id of the given commit
+        :raise KeyError: if it isn't part of the graph"""
+        if isinstance(commit, Commit):
+            commit = commit.binsha
+        elif isinstance(commit, string_types) and len(commit) == 40:
+            commit = a2b_hex(commit)
+        # END convert commit
+        return self._ids[commit]
+
+    def sha(self, i):
+        """:return: binary sha of the commit with the given id"""
+        return self._shas[i * 20:i * 20 + 20]
+
+    def commit(self, i):
+        """:return: Commit with the given id"""
+        return Commit(self.repo, self.sha(i))
+
+    def parent_ids(self, i):
+        """:return: array with the ids of the parents of the commit with the given id, in order"""
+        return self._parents[self._parent_starts[i]:self._parent_starts[i + 1]]
+
+    def commit_time(self, i):
+        """:return: commit time of the commit with the given id, in seconds since epoch"""
+        return self._times[i]
+
+    def generation(self, i):
+        """:return: generation number of the commit with the given id, which is 1 for commits without parents
+            in the graph, and one more than the largest generation of its parents otherwise"""
+        return self._generations[i]
+
+    def is_ancestor(self, ancestor, commit):
+        """:return: True if ancestor is the given commit or one of its ancestors"""
+        target = self.id(ancestor)
+        start = self.id(commit)
+        if target == start:
+            return True
+        min_generation = self._generations[target]
+        if target < start or min_generation >= self._generations[start]:
+            return False
+        # END quick answers
+
+        parents = self._parents
+        parent_starts = self._parent_starts
+        generations = self._generations
+        seen = set((start, ))
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            for parent in parents[parent_starts[i]:parent_starts[i + 1]]:
+                if parent == target:
+                    return True
+                if parent in seen or parent > target or generations[parent] <= min_generation:
+                    continue
+                seen.add(parent)
+                stack.append(parent)
+            # END for each parent
+        # END for each commit
+        return False
+
+    def _walk(self, starts, done, on_commit):
+        """Walk the ancestors of the given commits in topological order, passing their flags on to their
+        parents. This guarantees that a commit's flags are final once it is visited, and allows to answer
+        questions about many commits at once. It stops once all queued commits have all of the done flags.
+
+        :param starts: iterable of (id, flags) tuples of the commits to start at
+        :param done: flags of commits whose ancestors don't need to be visited anymore
+        :param on_commit: called with (id, flags) of each visited commit, returning the flags to pass on
+            to its parents"""
+        parents = self._parents
+        parent_starts = self._parent_starts
+        flags = dict()
+        for i, flag in starts:
+            flags[i] = flags.get(i, 0) | flag
+        # END for each commit to start at
+        queue = list(flags)
+        heapq.heapify(queue)
+        queued = set(queue)
+        nactive = sum(1 for i in queue if flags[i] & done != done)
+        while nactive:
+            i = heapq.heappop(queue)
+            queued.remove(i)
+            f = flags[i]
+            if f & done != done:
+                nactive -= 1
+            f = on_commit(i, f)
+            for parent in parents[parent_starts[i]:parent_starts[i + 1]]:
+                prev = flags.get(parent, 0)
+                new = prev | f
+                if new == prev:
+                    continue
+                flags[parent] = new
+                if parent not in queued:
+                    queued.add(parent)
+                    heapq.heappush(queue, parent)
+                    nactive += new & done != done
+                elif new & done == done and prev & done != done:
+                    nactive -= 1
+                # END update amount of active commits
+            # END for each parent
+        # END for each commit
+
+    def merge_base(self, *commits, **kwargs):
+        """Find the best common ancestors of the given commits, like ``git merge-base``, which are those
+        not being an ancestor of another common ancestor. With more than two commits, the common ancestors
+        of the first one and any of the others are found.
+
+        :param commits: at least two commits
+        :param kwargs: pass all=True to obtain all best common ancestors, instead of only one
+        :return: list of Commit objects, ordered by descending commit time. If all=True was not specified,
+            it contains at most one Commit, and it is empty if there is no common ancestor
+        :raise ValueError: if less than two commits are given"""
+        if len(commits) < 2:
+            raise ValueError("Please specify at least two commits, got only %i" % len(commits))
+        ids = [self.id(commit) for commit in commits]
+        bases = list()
+
+        def on_commit(i, f):
+            if f & _BOTH == _BOTH and not f & _STALE:
+                bases.append(i)
+                f |= _STALE
+            return f
+
+        self._walk([(ids[0], _LEFT)] + [(i, _RIGHT) for i in ids[1:]], _STALE, on_commit)
+        bases.sort(key=lambda i: (-self._times[i], i))
+        if not kwargs.get('all'):
+            del bases[1:]
+        return [self.commit(i) for i in bases]
+
+    def ahead_behind(self, base, commit):
+        """:return: (ahead, behind) tuple with the amount of commits reachable from commit but not from base,
+            and the amount of commits reachable from base but not from commit, like
+            ``git rev-list --left-right --count base...commit`` with swapped results"""
+        return self.ahead_behind_many(base, (commit, ))[0]
+
+    def ahead_behind_many(self, base, commits):
+        """As ``ahead_behind()``, but for many commits compared against the same base, which are all answered
+        by a single walk. It ends once the remaining commits are reachable from all of them.
+
+        :return: list of (ahead, behind) tuples, one for each of the given commits"""
+        # the base gets the lowest flag, each commit one of the higher ones
+        starts = [(self.id(base), 1)]
+        starts.extend((self.id(commit), 2 << k) for k, commit in enumerate(commits))
+        counts = dict()     # flags -> amount of commits with exactly these flags
+
+        def on_commit(i, f):
+            counts[f] = counts.get(f, 0) + 1
+            return f
+
+        self._walk(starts, (2 << len(commits)) - 1, on_commit)
+        results = list()
+        for k in range(len(commits)):
+            flag = 2 << k
+            ahead = sum(n for f, n in counts.items() if f & flag and not f & 1)
+            behind = sum(n for f, n in counts.items() if f & 1 and not f & flag)
+            results.append((ahead, behind))
+        # END for each commit
+        return results
+
+    def containing(self, commit, commits):
+        """:return: list of those of the given commits which are the given commit or one of its descendants,
+            in order. They are found by a single walk, which only visits commits that are newer than the given
+            one in topological order, and whose generation is larger.
+        :param commit: commit to find the descendants of
+        :param commits: commits to check"""
+        target = self.id(commit)
+        min_generation = self._generations[target]
+        parents = self._parents
+        parent_starts = self._parent_starts
+        generations = self._generations
+        flags = dict()
+        for k, i in enumerate(self.id(c) for c in commits):
+            if i == target or i < target and generations[i] > min_generation:
+                flags[i] = flags.get(i, 0) | 1 << k
+        # END for each commit to start at
+        queue = list(flags)
+        heapq.heapify(queue)
+        while queue and queue[0] < target:
+            i = heapq.heappop(queue)
+            f = flags[i]
+            for parent in parents[parent_starts[i]:parent_starts[i + 1]]:
+                if parent > target or parent != target and generations[parent] <= min_generation:
+                    continue
+                prev = flags.get(parent)
+                if prev is None:
+                    flags[parent] = f
+                    heapq.heappush(queue, parent)
+                else:
+                    flags[parent] = prev | f
+            # END for each parent
+        # END for each commit
+        f = flags.get(target, 0)
+        return [c for k, c in enumerate(commits) if f >> k & 1]
+
+    def topo_order(self):
+        """:return: list of all commits in topological order, which shows no parents before all of its children,
+            like ``git rev-list --topo-order``"""
+        return [self.commit(i) for i in range(len(self))]
+
+    def date_order(self):
+        """:return: list of all commits ordered by descending commit time, but showing no parents before all of
+            its children, like ``git rev-list --date-order``"""
+        parents = self._parents
+        parent_starts = self._parent_starts
+        times = self._times
+        nchildren = array('i', [0]) * len(self)
+        for parent in parents:
+            nchildren[parent] += 1
+        # END count children
+        queue = [(-times[i], i) for i in range(len(self)) if not nchildren[i]]
+        heapq.heapify(queue)
+        order = list()
+        while queue:
+            i = heapq.heappop(queue)[1]
+            order.append(self.commit(i))
+            for parent in parents[parent_starts[i]:parent_starts[i + 1]]:
+                nchildren[parent] -= 1
+                if not nchildren[parent]:
+                    heapq.heappush(queue, (-times[parent], parent))
+            # END for each parent
+        # END for each commit
+        return order
@@ -0,0 +1,281 @@
+# commitgraph.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+"""Module with a reader for git's commit-graph files, which store the parents, root tree, commit time
+and generation number of commits, so that walking them doesn't require reading and parsing the commits.
+They are written by ``git commit-graph write`` and ``git gc``, see gitformat-commit-graph(5)"""
+import heapq
+import os
+from bisect import bisect_right
+from struct import unpack_from
+
+from gitdb.exc import (
+    ParseError,
+    UnsupportedOperation
+)
+
+from git.compat import byte_ord
+from git.pack import _map_file
+
+__all__ = ('CommitGraph', )
+
+# parent positions with this value denote missing parents
+_PARENT_NONE = 0x70000000
+# the second parent position is an index into the list of extra edges if this bit is set, which
+# also marks the last entry of that list
+_PARENT_EXTRA = 0x80000000
+# size of the record of each commit: tree, two parent positions, generation and commit time
+_DATA_SIZE = 36
+
+
+class _CommitGraphFile(object):
+
+    """A single commit-graph file, possibly one layer of a chain"""
+    __slots__ = ('path', 'nbase', '_map', '_fanout', '_oid_base', '_data_base', '_edge_base')
+
+    def __init__(self, path, nbase):
+        """:param nbase: amount of commits in the layers below this one"""
+        self.path = path
+        self.nbase = nbase
+        self._map = _map_file(path)
+        try:
+            self._parse()
+        except BaseException:
+            self.close()
+            raise
+        # END handle invalid files
+
+    def _parse(self):
+        mm = self._map
+        if len(mm) < 8 or mm[:4] != b'CGPH':
+            raise ParseError("%s is no commit-graph file" % self.path)
+        version, hash_version, nchunks = byte_ord(mm[4]), byte_ord(mm[5]), byte_ord(mm[6])
+        if version != 1 or hash_version != 1:
+            raise UnsupportedOperation("Commit-graph %s of version %i with hash version %i is not supported"
+                                       % (self.path, version, hash_version))
+        # END check version
+
+        chunks = dict()
+        for i in range(nchunks):
+            chunk_id, offset = unpack_from('>4sQ', mm, 8 + 12 * i)
+            chunks[chunk_id] = offset
+        # END for each chunk
+        for chunk_id in (b'OIDF', b'OIDL', b'CDAT'):
+            if chunk_id not in chunks:
+                raise ParseError("Commit-graph %s lacks the required chunk %s" % (self.path, chunk_id))
+        # END check chunks
+        self._fanout = unpack_from('>256I', mm, chunks[b'OIDF'])
+        self._oid_base = chunks[b'OIDL']
+        self._data_base = chunks[b'CDAT']
+        self._edge_base = chunks.get(b'EDGE')
+        if self._data_base + _DATA_SIZE * len(self) > len(mm):
+            raise ParseError("Commit-graph %s is truncated" % self.path)
+
+    def __len__(self):
+        return self._fanout[255]
+
+    def close(self):
+        self._map.close()
+
+    def sha(self, i):
+        position = self._oid_base + 20 * i
+        return self._map[position:position + 20]
+
+    def index(self, binsha):
+        """:return: index of the given binary sha in this file, or -1"""
+        first = byte_ord(binsha[0])
+        lo = first and self._fanout[first - 1] or 0
+        hi = self._fanout[first]
+        mm = self._map
+        base = self._oid_base
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = base + 20 * mid
+            mid_sha = mm[position:position + 20]
+            if mid_sha < binsha:
+                lo = mid + 1
+            elif mid_sha > binsha:
+                hi = mid
+            else:
+                return mid
+        # END binary search
+        return -1
+
+    def data(self, i):
+        """:return: (tree_binsha, parent_positions, commit_time, generation) of the i-th commit"""
+        mm = self._map
+        position = self._data_base + _DATA_SIZE * i
+        parent1, parent2, generation, time_low = unpack_from('>IIII', mm, position + 20)
+        if parent1 == _PARENT_NONE:
+            parents = ()
+        elif parent2 == _PARENT_NONE:
+            parents = (parent1, )
+        elif not parent2 & _PARENT_EXTRA:
+            parents = (parent1, parent2)
+        else:
+            if self._edge_base is None:
+                raise ParseError("Commit-graph %s lacks the extra edges of an octopus merge" % self.path)
+            parents = [parent1]
+            edge = self._edge_base + 4 * (parent2 & ~_PARENT_EXTRA)
+            while True:
+                parent = unpack_from('>I', mm, edge)[0]
+                parents.append(parent & ~_PARENT_EXTRA)
+                if parent & _PARENT_EXTRA:
+                    break
+                edge += 4
+            # END for each extra edge
+            parents = tuple(parents)
+        # END handle parents
+        return (mm[position:position + 20], parents, ((generation & 3) << 32) | time_low, generation >> 2)
+
+
+class CommitGraph(object):
+
+    """Reads a commit-graph file, or a chain of them, using memory maps.
+
+    Commits are addressed by their position, which is unique across all files of a chain.
+    The generation number of a commit is larger than the ones of all its ancestors, which is
+    why no commit of a smaller or equal generation has to be visited to find out whether a commit
+    is an ancestor of another one. It is 0 for all commits if the writer didn't compute it.
+
+    :note: the files are only read once, commits added to the repository later are not found"""
+    __slots__ = ('_files', '_starts')
+
+    def __init__(self, paths):
+        """:param paths: paths to a single commit-graph file, or to the files of a chain, base first
+        :raise ParseError: if one of the files is invalid
+        :raise UnsupportedOperation: if the version of one of the files is not supported"""
+        self._files = list()
+        self._starts = list()
+        nbase = 0
+        try:
+            for path in paths:
+                graph_file = _CommitGraphFile(path, nbase)
+                self._files.append(graph_file)
+                self._starts.append(nbase)
+                nbase += len(graph_file)
+            # END for each file
+        except BaseException:
+            self.close()
+            raise
+        # END handle invalid files
+
+    @classmethod
+    def from_objects_dir(cls, objects_dir):
+        """:return: CommitGraph of the object database in the given directory, or None if it has no
+            commit-graph which can be read. Like git, a single commit-graph file is preferred over a chain"""
+        info_dir = os.path.join(objects_dir, 'info')
+        paths = [os.path.join(info_dir, 'commit-graph')]
+        if not os.path.isfile(paths[0]):
+            graphs_dir = os.path.join(info_dir, 'commit-graphs')
+            try:
+                with open(os.path.join(graphs_dir, 'commit-graph-chain'), 'r') as fp:
+                    hashes = [line.strip() for line in fp if line.strip()]
+                # END close file
+            except (IOError, OSError):
+                return None
+            # END handle missing chain
+            paths = [os.path.join(graphs_dir, 'graph-%s.graph' % hexsha) for hexsha in hashes]
+        # END handle chain
+        try:
+            return cls(paths)
+        except (ParseError, UnsupportedOperation, IOError, OSError, ValueError):
+            return None
+        # END handle unreadable graphs
+
+    def __len__(self):
+        return self._starts and self._starts[-1] + len(self._files[-1]) or 0
+
+    def close(self):
+        """Release the memory maps. The instance cannot be used anymore"""
+        for graph_file in self._files:
+            graph_file.close()
+        # END for each file
+
+    @property
+    def paths(self):
+        """:return: paths of the files we read, base first"""
+        return [graph_file.path for graph_file in self._files]
+
+    def position(self, binsha):
+        """:return: position of the commit with the given binary sha, or None if it is not in the graph"""
+        for graph_file in self._files:
+            i = graph_file.index(binsha)
+            if i >= 0:
+                return graph_file.nbase + i
+        # END for each file
+        return None
+
+    def _locate(self, position):
+        graph_file = self._files[bisect_right(self._starts, position) - 1]
+        return graph_file, position - graph_file.nbase
+
+    def sha(self, position):
+        """:return: binary sha of the commit at the given position"""
+        graph_file, i = self._locate(position)
+        return graph_file.sha(i)
+
+    def commit_data(self, position):
+        """:return: (tree_binsha, parent_positions, commit_time, generation) of the commit at the given position"""
+        graph_file, i = self._locate(position)
+        return graph_file.data(i)
+
+    def parents(self, position):
+        """:return: tuple of the positions of the parents of the commit at the given position, in order"""
+        return self.commit_data(position)[1]
+
+    def generation(self, position):
+        """:return: generation number of the commit at the given position, or 0 if it is unknown"""
+        return self.commit_data(position)[3]
+
+    def is_ancestor(self, ancestor_binsha, binsha):
+        """:return: True if the commit with ancestor_binsha is the commit with binsha or one of its ancestors,
+            or None if one of them is not in the graph"""
+        ancestor = self.position(ancestor_binsha)
+        start = self.position(binsha)
+        if ancestor is None or start is None:
+            return None
+        min_generation = self.generation(ancestor)
+        seen = set((start, ))
+        stack = [start]
+        while stack:
+            position = stack.pop()
+            if position == ancestor:
+                return True
+            tree, parents, commit_time, generation = self.commit_data(position)
+            if min_generation and generation and generation <= min_generation:
+                continue
+            for parent in parents:
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+            # END for each parent
+        # END for each commit
+        return False
+
+    def iter_positions(self, binsha):
+        """:return: iterator yielding the positions of the commit with the given binary sha and its ancestors
+            in the order of ``git rev-list``, which is by descending commit time. None if it is not in the graph"""
+        start = self.position(binsha)
+        if start is None:
+            return None
+        return self._iter_by_date(start)
+
+    def _iter_by_date(self, start):
+        # commits of the same time are visited in the order they were queued, like git does
+        queue = [(-self.commit_data(start)[2], 0, start)]
+        seen = set((start, ))
+        count = 1
+        while queue:
+            position = heapq.heappop(queue)[2]
+            yield position
+            for parent in self.parents(position):
+                if parent in seen:
+                    continue
+                seen.add(parent)
+                heapq.heappush(queue, (-self.commit_data(parent)[2], count, parent))
+                count += 1
+            # END for each parent
+        # END for each commit
@@ -1,5 +1,19 @@
 """Module with our own gitdb implementation - it uses the git command"""
+import os
+from collections import deque
+from contextlib import contextmanager
+import hashlib
+from itertools import islice
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import threading
+import weakref
+import zlib
+from binascii import b2a_hex
+from io import BytesIO
+
 from gitdb.base import (
+    IStream,
     OInfo,
     OStream
 )
@@ -9,18 +23,49 @@ from gitdb.util import (
 )
 from gitdb.db import GitDB
 from gitdb.db import LooseObjectDB
+from gitdb.typ import str_tree_type
 
+from .compat import defenc
 from .exc import (
     GitCommandError,
-    BadObject
+    BadObject,
+    ParseError,
+    UnsupportedOperation
+)
+from .odict import OrderedDict
+from .pack import (
+    PackFile,
+    PackWriter,
+    DeltaBaseCache
 )
 
 
-__all__ = ('GitCmdObjectDB', 'GitDB')
+__all__ = ('GitCmdObjectDB', 'GitNativeObjectDB', 'AlternatesObjectDB', 'CachingObjectDB', 'GitDB')
 
 # class GitCmdObjectDB(CompoundDB, ObjectDBW):
 
 
+def _deflate_object(istream, loose, level):
+    """Read the whole stream of the given IStream, and hash and compress its object
+    :param loose: if True, the header is compressed along with the data, as in loose objects. Otherwise
+        only the data is compressed, as in packs
+    :return: (binsha, compressed_data)
+    :raise ValueError: if the stream doesn't provide istream.size bytes"""
+    data = istream.read()
+    if len(data) != istream.size:
+        raise ValueError("Stream provided %i bytes instead of %i" % (len(data), istream.size))
+    typename = istream.type
+    if not isinstance(typename, bytes):
+        typename = typename.encode('ascii')
+    header = typename + b' ' + str(istream.size).encode('ascii') + b'\0'
+    sha = hashlib.sha1(header)
+    sha.update(data)
+    compressor = zlib.compressobj(level)
+    compressed = loose and compressor.compress(header) or b''
+    compressed += compressor.compress(data) + compressor.flush()
+    return sha.digest(), compressed
+
+
 class GitCmdObjectDB(LooseObjectDB):
 
     """A database representing the default git object store, which includes loose
@@ -31,20 +76,190 @@ class GitCmdObjectDB(LooseObjectDB):
         have packs and the other implementations
     """
 
+    # amount of threads store_many() hashes and compresses objects with, or None to use one per CPU
+    store_threads = None
+
+    # objects larger than this are not read into memory at once by store_many(), but streamed by the
+    # calling thread
+    max_parallel_store_size = 4 * 1024 * 1024
+
     def __init__(self, root_path, git):
         """Initialize this instance with the root and a git command"""
         super(GitCmdObjectDB, self).__init__(root_path)
         self._git = git
+        self._pack_writer = None
 
     def info(self, sha):
+        if self._pack_writer is not None and sha in self._pack_writer:
+            typename, size = self._pack_writer.info(sha)
+            return OInfo(sha, typename, size)
+        # END handle pending objects
         hexsha, typename, size = self._git.get_object_header(bin_to_hex(sha))
         return OInfo(hex_to_bin(hexsha), typename, size)
 
+    def info_many(self, shas):
+        """:return: generator yielding OInfo instances for all given binary shas, in order.
+            It is considerably faster than calling info() for each sha.
+        :param shas: iterable of binary shas"""
+        if self._pack_writer is not None:
+            for sha in shas:
+                yield self.info(sha)
+            # END for each sha
+            return
+        # END handle pending objects
+        for hexsha, typename, size in self._git.get_object_headers(bin_to_hex(sha) for sha in shas):
+            yield OInfo(hex_to_bin(hexsha), typename, size)
+        # END for each header
+
     def stream(self, sha):
         """For now, all lookup is done by git itself"""
+        if self._pack_writer is not None and sha in self._pack_writer:
+            typename, data = self._pack_writer.read(sha)
+            return OStream(sha, typename, len(data), BytesIO(data))
+        # END handle pending objects
         hexsha, typename, size, stream = self._git.stream_object_data(bin_to_hex(sha))
         return OStream(hex_to_bin(hexsha), typename, size, stream)
 
+    def stream_many(self, shas):
+        """:return: generator yielding OStream instances for all given binary shas, in order.
+            It is considerably faster than calling stream() for each sha.
+        :param shas: iterable of binary shas
+        :note: each stream is only valid until the next one is requested"""
+        if self._pack_writer is not None:
+            for sha in shas:
+                yield self.stream(sha)
+            # END for each sha
+            return
+        # END handle pending objects
+        for hexsha, typename, size, stream in self._git.iter_object_data(bin_to_hex(sha) for sha in shas):
+            yield OStream(hex_to_bin(hexsha), typename, size, stream)
+        # END for each stream
+
+    def has_object(self, sha):
+        if self._pack_writer is not None and sha in self._pack_writer:
+            return True
+        return super(GitCmdObjectDB, self).has_object(sha)
+
+    def store(self, istream):
+        """Store the given stream as loose object, or in the pack being written by ``pack_writer()``
+        :return: the given istream, with its binsha set"""
+        if self._pack_writer is None:
+            return super(GitCmdObjectDB, self).store(istream)
+        if istream.binsha is not None:
+            # the stream is a compressed loose object, as copied by gitdb's MemoryDB
+            data = zlib.decompress(istream.read())
+            header_end = data.index(b'\0')
+            typename, size = data[:header_end].split(b' ')
+            self._pack_writer.write(typename, int(size), BytesIO(memoryview(data)[header_end + 1:]))
+            return istream
+        # END handle copies of loose objects
+        istream.binsha = self._pack_writer.write(istream.type, istream.size, istream.stream)
+        return istream
+
+    def store_many(self, istreams):
+        """Store the given streams like ``store()``, hashing and compressing their objects in a pool of threads,
+        which is considerably faster when storing many objects, as zlib and hashlib don't hold python's
+        global interpreter lock while they work. Objects are written in the calling thread.
+
+        Streams are only read once the objects before them are about to be written, so that at most two
+        per thread are in memory. Objects larger than ``max_parallel_store_size`` are streamed by ``store()``.
+
+        :param istreams: iterable of IStream instances, it is consumed lazily
+        :return: generator yielding the given istreams with their binsha set, in order, once they were stored
+        :raise ValueError: if a stream doesn't provide the given amount of bytes"""
+        nthreads = self.store_threads
+        if nthreads is None:
+            try:
+                nthreads = multiprocessing.cpu_count()
+            except NotImplementedError:
+                nthreads = 1
+            # END handle unknown amount of CPUs
+        # END default amount of threads
+        if nthreads < 2:
+            for istream in istreams:
+                yield self.store(istream)
+            # END for each stream
+            return
+        # END handle serial storage
+
+        pool = ThreadPool(nthreads)
+        try:
+            pending = deque()       # (istream, loose, result or None if it is stored by store())
+            istreams = iter(istreams)
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < 2 * nthreads:
+                    try:
+                        istream = next(istreams)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    # END handle end of input
+                    result = None
+                    loose = self._pack_writer is None
+                    if istream.binsha is None and istream.size <= self.max_parallel_store_size:
+                        args = (istream, loose, PackWriter.compression_level)
+                        result = pool.apply_async(_deflate_object, args)
+                    # END handle parallel compression
+                    pending.append((istream, loose, result))
+                # END fill window
+                if not pending:
+                    break
+                istream, loose, result = pending.popleft()
+                if result is None:
+                    yield self.store(istream)
+                    continue
+                # END handle streamed objects
+
+                binsha, data = result.get()
+                if loose:
+                    # store() moves compressed loose objects into the pack, if one was started meanwhile
+                    self.store(IStream(istream.type, istream.size, BytesIO(data), binsha))
+                elif self._pack_writer is not None:
+                    self._pack_writer.write_compressed(binsha, istream.type, istream.size, data)
+                else:
+                    self.store(IStream(istream.type, istream.size, BytesIO(zlib.decompress(data))))
+                # END write object
+                istream.binsha = binsha
+                yield istream
+            # END for each stream
+        finally:
+            pool.terminate()
+            pool.join()
+        # END shut down threads
+
+    @contextmanager
+    def pack_writer(self):
+        """Context manager making ``store()`` write objects into a single new pack, instead of one loose file
+        per object, which is a lot faster and doesn't strain the file system when storing many objects::
+
+         with repo.odb.pack_writer():
+             repo.index.add(paths)
+             repo.index.commit("import")
+
+        The pack and its index are written once the context is left, without error, and its objects are
+        available to everyone right away. They can be read using this database before. Nested contexts
+        write into the pack of the outermost one.
+
+        :return: the ``PackWriter`` in use
+        :note: only objects stored by this instance go into the pack, and references changed within the
+            context point to objects other processes can't read before it is left"""
+        if self._pack_writer is not None:
+            yield self._pack_writer
+            return
+        # END handle nested contexts
+        writer = PackWriter(self.db_path('pack'))
+        self._pack_writer = writer
+        try:
+            yield writer
+        except BaseException:
+            self._pack_writer = None
+            writer.abort()
+            raise
+        # END handle errors
+        self._pack_writer = None
+        writer.finish()
+
     # { Interface
 
     def partial_to_complete_sha_hex(self, partial_hexsha):
@@ -61,3 +276,572 @@ class GitCmdObjectDB(LooseObjectDB):
         # END handle exceptions
 
     #} END interface
+
+
+class GitNativeObjectDB(GitCmdObjectDB):
+
+    """A database reading the pack files and loose objects of the default git object store directly,
+    using memory maps, and resolving deltas in-process. This avoids a round-trip through a pipe to
+    git for each object, which makes random access considerably faster.
+
+    The git command is used like in ``GitCmdObjectDB`` for everything else, as well as for objects
+    which cannot be read natively:
+
+    * objects in alternate object stores, or those which are not available locally at all
+    * deltas whose base object is not in the same pack
+    * objects larger than ``max_native_size``, which git streams with bounded memory
+    * packs or pack indices of unknown versions, and corrupt objects
+
+    Packs added by git are picked up once an object couldn't be found, see ``update_cache()``.
+    The bases of deltas are kept in the ``DeltaBaseCache`` available as ``delta_base_cache``, whose
+    counters tell how deep the delta chains are and how often bases didn't have to be read again.
+
+    :note: like ``GitDB``, it doesn't honor replacement objects in refs/replace"""
+
+    # Objects larger than this amount of bytes are streamed by git instead of being read into memory.
+    # Only the size of objects which are no deltas can be checked before reading them.
+    max_native_size = 64 * 1024 * 1024
+
+    # Amount of bytes the bases of deltas may take in memory, like git's core.deltaBaseCacheLimit
+    max_delta_base_bytes = 96 * 1024 * 1024
+
+    def __init__(self, root_path, git):
+        """Initialize this instance with the root and a git command"""
+        super(GitNativeObjectDB, self).__init__(root_path, git)
+        self._packs = tuple()               # PackFile instances, most recently modified first
+        self._packs_mtime = None            # modification time of the pack directory when it was read
+        self._packs_lock = threading.Lock()
+        self.delta_base_cache = DeltaBaseCache(self.max_delta_base_bytes)
+        self.update_cache()
+
+    def update_cache(self, force=False):
+        """Read the list of packs again if the pack directory changed.
+
+        :param force: if True, the list is read even if the directory seems unchanged
+        :return: True if the list of packs was read"""
+        pack_dir = self.db_path('pack')
+        try:
+            mtime = os.stat(pack_dir).st_mtime
+        except OSError:
+            mtime = None
+        # END handle missing pack directory
+        if not force and mtime == self._packs_mtime:
+            return False
+
+        with self._packs_lock:
+            existing = dict((pack.path, pack) for pack in self._packs)
+            packs = list()
+            for name in (mtime is not None and os.listdir(pack_dir) or ()):
+                path = os.path.join(pack_dir, name)
+                if not name.endswith('.pack') or not os.path.isfile(path[:-len('.pack')] + '.idx'):
+                    continue
+                pack = existing.get(path)
+                try:
+                    if pack is None:
+                        pack = PackFile(path, base_cache=self.delta_base_cache)
+                    packs.append((os.path.getmtime(path), pack))
+                except (UnsupportedOperation, ParseError, OSError, ValueError):
+                    continue    # git will read its objects, or it was just removed
+                # END handle unreadable packs
+            # END for each pack
+            # like git, we look into the newest packs first, assuming they are used most
+            packs.sort(key=lambda item: item[0], reverse=True)
+            # packs which disappeared are not closed, as other threads might still read from them
+            self._packs = tuple(pack for mtime_, pack in packs)
+            self._packs_mtime = mtime
+        # END lock
+        return True
+
+    def _find(self, sha):
+        """:return: (pack, offset) of the object with the given binary sha, or None if it is not in a pack"""
+        for pack in self._packs:
+            offset = pack.index.offset(sha)
+            if offset is not None:
+                return pack, offset
+        # END for each pack
+        return None
+
+    def _loose_path(self, sha):
+        return self.db_path(self.object_path(b2a_hex(sha).decode('ascii')))
+
+    def _read_loose(self, sha, header_only):
+        """:return: (type_string, size, data) of the loose object with the given binary sha, or None if
+            it doesn't exist. data is None if header_only is True"""
+        try:
+            with open(self._loose_path(sha), 'rb') as fp:
+                # the header is compressed into the first few bytes
+                data = header_only and fp.read(512) or fp.read()
+            # END close file
+        except (IOError, OSError):
+            return None
+        # END handle missing object
+
+        decompressor = zlib.decompressobj()
+        header = decompressor.decompress(data, 64)
+        end = header.find(b'\0')
+        if end < 0:
+            raise ParseError("Invalid header of loose object %s" % b2a_hex(sha))
+        typename, size = header[:end].split(b' ')
+        size = int(size)
+        if header_only:
+            return typename, size, None
+        if size > self.max_native_size:
+            raise UnsupportedOperation("Object %s is too large to be read at once" % b2a_hex(sha))
+        data = header[end + 1:] + decompressor.decompress(decompressor.unconsumed_tail)
+        if len(data) != size:
+            raise ParseError("Loose object %s should have %i bytes, got %i" % (b2a_hex(sha), size, len(data)))
+        return typename, size, data
+
+    def _read(self, sha, header_only):
+        """:return: (type_string, size, data) of the object with the given binary sha, or None if git has to
+            read it. data is None if header_only is True"""
+        for retry in (False, True):
+            found = self._find(sha)
+            try:
+                if found is not None:
+                    pack, offset = found
+                    if header_only:
+                        return pack.info_at(offset) + (None,)
+                    typename, data = pack.data_at(offset, self.max_native_size)
+                    return typename, len(data), data
+                # END handle packed object
+                loose = self._read_loose(sha, header_only)
+                if loose is not None:
+                    return loose
+            except (UnsupportedOperation, ParseError, zlib.error):
+                return None
+            # END handle objects we can't read
+            if retry or not self.update_cache():
+                break
+        # END try again if there are new packs
+        return None
+
+    def has_object(self, sha):
+        if self._find(sha) is not None or os.path.isfile(self._loose_path(sha)):
+            return True
+        try:
+            super(GitNativeObjectDB, self).info(sha)
+        except ValueError:
+            return False
+        # END ask git
+        return True
+
+    def info(self, sha):
+        result = self._read(sha, header_only=True)
+        if result is None:
+            return super(GitNativeObjectDB, self).info(sha)
+        return OInfo(sha, result[0], result[1])
+
+    def info_many(self, shas):
+        """:return: generator yielding OInfo instances for all given binary shas, in order
+        :param shas: iterable of binary shas"""
+        for sha in shas:
+            yield self.info(sha)
+        # END for each sha
+
+    def stream(self, sha):
+        result = self._read(sha, header_only=False)
+        if result is None:
+            return super(GitNativeObjectDB, self).stream(sha)
+        typename, size, data = result
+        return OStream(sha, typename, size, BytesIO(data))
+
+    def stream_many(self, shas):
+        """:return: generator yielding OStream instances for all given binary shas, in order
+        :param shas: iterable of binary shas"""
+        for sha in shas:
+            yield self.stream(sha)
+        # END for each sha
+
+
+def _alternate_dirs(objects_dir):
+    """:return: list of the absolute paths of the alternate object directories of the given one, including
+        their alternates, in the order git searches them"""
+    dirs = list()
+    seen = set((os.path.realpath(objects_dir), ))
+
+    def add(objects_dir, depth):
+        # like git, we don't follow alternates deeper than this
+        if depth > 5:
+            return
+        try:
+            with open(os.path.join(objects_dir, 'info', 'alternates'), 'rb') as fp:
+                lines = fp.read().decode(defenc).splitlines()
+            # END close file
+        except (IOError, OSError):
+            return
+        # END handle missing file
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path = os.path.realpath(os.path.join(objects_dir, line))
+            if path in seen or not os.path.isdir(path):
+                continue
+            seen.add(path)
+            dirs.append(path)
+            add(path, depth + 1)
+        # END for each line
+    # END recursive reader
+
+    add(objects_dir, 0)
+    return dirs
+
+
+class AlternatesObjectDB(GitNativeObjectDB):
+
+    """A ``GitNativeObjectDB`` which also reads the object stores listed in ``objects/info/alternates``,
+    and their alternates, in-process, instead of leaving their objects to git.
+
+    The store which provided an object is remembered for the last ``max_cached_locations`` objects,
+    and stores are searched in the order of the amount of objects they provided, which is why repositories
+    whose objects are mostly in an alternate, like forks sharing the objects of a common repository, look
+    into the alternate first.
+
+    Alternate stores are shared by all instances in the process using them, along with their pack maps and
+    delta base caches. Changes to the alternates file are picked up like new packs, see ``update_cache()``.
+    Objects are still only stored in the local object directory"""
+
+    # amount of objects whose store is remembered
+    max_cached_locations = 16384
+
+    # realpath of alternate object directory -> GitNativeObjectDB shared by all instances
+    _shared_stores = weakref.WeakValueDictionary()
+    _shared_stores_lock = threading.Lock()
+
+    def __init__(self, root_path, git):
+        """Initialize this instance with the root and a git command"""
+        self._alternates_mtime = None       # modification time of the alternates file when it was read
+        self._stores = (self, )             # object stores, in search order, see stores
+        self._store_hits = dict()           # store -> amount of objects it provided
+        self._locations = _ByteBudgetLRU(self.max_cached_locations)     # binsha -> store
+        self._stores_lock = threading.Lock()
+        super(AlternatesObjectDB, self).__init__(root_path, git)
+
+    @property
+    def stores(self):
+        """:return: tuple of this database, reading the local objects, and the databases of all alternates,
+            in the order they are searched in"""
+        return self._stores
+
+    @classmethod
+    def _shared_store(cls, objects_dir):
+        with cls._shared_stores_lock:
+            store = cls._shared_stores.get(objects_dir)
+            if store is None:
+                # git isn't used by stores of alternates, as we ask our own git for objects they can't read
+                store = GitNativeObjectDB(objects_dir, None)
+                cls._shared_stores[objects_dir] = store
+            # END create store
+        # END lock
+        return store
+
+    def update_cache(self, force=False):
+        """Read the list of packs, and the list of alternates, again if they changed
+        :param force: if True, the lists are read even if they seem unchanged
+        :return: True if one of the lists was read"""
+        updated = super(AlternatesObjectDB, self).update_cache(force)
+        try:
+            mtime = os.stat(self.db_path(os.path.join('info', 'alternates'))).st_mtime
+        except OSError:
+            mtime = None
+        # END handle missing alternates
+        if not force and mtime == self._alternates_mtime:
+            return updated
+
+        stores = [self] + [self._shared_store(path) for path in _alternate_dirs(self.root_path())]
+        with self._stores_lock:
+            self._store_hits = dict((store, self._store_hits.get(store, 0)) for store in stores)
+            self._stores = tuple(sorted(stores, key=self._store_hits.__getitem__, reverse=True))
+            self._locations.clear()
+            self._alternates_mtime = mtime
+        # END lock
+        return True
+
+    def _read_store(self, store, sha, header_only):
+        if store is self:
+            return super(AlternatesObjectDB, self)._read(sha, header_only)
+        return store._read(sha, header_only)
+
+    def _read(self, sha, header_only):
+        with self._stores_lock:
+            location = self._locations.get(sha)
+        # END lock
+        if location is not None:
+            result = self._read_store(location, sha, header_only)
+            if result is not None:
+                return result
+        # END try remembered store
+
+        for store in self._stores:
+            if store is location:
+                continue
+            result = self._read_store(store, sha, header_only)
+            if result is None:
+                continue
+            with self._stores_lock:
+                self._locations.put(sha, store, 1)
+                hits = self._store_hits
+                if store in hits:
+                    hits[store] += 1
+                    # keep the stores sorted, the order of those with equal hits doesn't change
+                    stores = self._stores
+                    i = stores.index(store)
+                    if i and hits[store] > hits[stores[i - 1]]:
+                        self._stores = tuple(sorted(stores, key=hits.__getitem__, reverse=True))
+                # END count hit
+            # END lock
+            return result
+        # END for each store
+        return None
+
+    def has_object(self, sha):
+        for store in self._stores:
+            if store is not self and (store._find(sha) is not None or os.path.isfile(store._loose_path(sha))):
+                return True
+        # END for each alternate
+        return super(AlternatesObjectDB, self).has_object(sha)
+
+
+class _ByteBudgetLRU(object):
+
+    """A least-recently-used mapping whose entries are evicted once their total cost in bytes exceeds a budget.
+    It is not thread-safe"""
+    __slots__ = ('max_bytes', 'nbytes', '_entries')
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()     # key -> (value, cost)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """:return: value stored for key, marked as most recently used, or None"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._entries[key] = entry
+        return entry[0]
+
+    def put(self, key, value, cost):
+        if cost > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.nbytes -= previous[1]
+        self._entries[key] = (value, cost)
+        self.nbytes += cost
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self._entries.popitem(last=False)[1][1]
+        # END evict least recently used
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+class CachingObjectDB(object):
+
+    """Wraps another object database and keeps the results of ``info()`` as well as the data of small
+    objects in memory, evicting the least recently used ones once they exceed a budget in bytes.
+    Trees have a separate budget, as they are read over and over again when traversing commits.
+    It can be used like any other database type::
+
+     repo = Repo(path, odbt=CachingObjectDB)
+     repo = Repo(path, odbt=CachingObjectDB.wrapping(GitNativeObjectDB, max_tree_bytes=256 * 1024 ** 2))
+
+    All other attributes, like ``store()``, are those of the wrapped database, which is available as ``odb``.
+
+    ``info_hits``, ``info_misses``, ``stream_hits`` and ``stream_misses`` count the lookups of
+    ``info()`` and ``stream()`` and their bulk versions. It is thread-safe if the wrapped database is."""
+
+    # CONFIGURATION
+    # The type of database to wrap
+    db_type = GitCmdObjectDB
+
+    # Budget for the data of objects other than trees
+    max_bytes = 32 * 1024 * 1024
+
+    # Budget for the data of trees
+    max_tree_bytes = 64 * 1024 * 1024
+
+    # Budget for object information, with each entry costing _info_cost bytes
+    max_info_bytes = 4 * 1024 * 1024
+    _info_cost = 128
+
+    # Only the data of objects up to this size is kept
+    max_object_size = 512 * 1024
+
+    # Amount of shas looked up in the cache at once by the bulk methods, before fetching the missing ones
+    bulk_window = 1024
+
+    def __init__(self, root_path, git=None):
+        """Initialize this instance with the root of the object database, and the git command if the
+        wrapped database type requires it"""
+        if issubclass(self.db_type, GitCmdObjectDB):
+            self.odb = self.db_type(root_path, git)
+        else:
+            self.odb = self.db_type(root_path)
+        # END create wrapped database
+        self._lock = threading.Lock()
+        self._infos = _ByteBudgetLRU(self.max_info_bytes)
+        self._data = _ByteBudgetLRU(self.max_bytes)
+        self._trees = _ByteBudgetLRU(self.max_tree_bytes)
+        self.info_hits = self.info_misses = 0
+        self.stream_hits = self.stream_misses = 0
+
+    @classmethod
+    def wrapping(cls, db_type, **kwargs):
+        """:return: subclass of this type wrapping databases of the given type, to be passed to ``Repo``
+        :param kwargs: configuration to override, like max_bytes or max_tree_bytes"""
+        for name in kwargs:
+            if not hasattr(cls, name):
+                raise ValueError("Unknown configuration: %s" % name)
+        # END verify configuration
+        kwargs['db_type'] = db_type
+        return type('%s(%s)' % (cls.__name__, db_type.__name__), (cls,), kwargs)
+
+    def __getattr__(self, attr):
+        if attr == 'odb':
+            raise AttributeError(attr)
+        return getattr(self.odb, attr)
+
+    def _cached_info(self, sha):
+        """:return: OInfo of the given sha from the cache, or None. It must be called with the lock held"""
+        info = self._infos.get(sha)
+        if info is None:
+            data = self._data.get(sha) or self._trees.get(sha)
+            if data is not None:
+                info = OInfo(sha, data[0], len(data[1]))
+        # END check object data
+        return info
+
+    def _cache_info(self, info):
+        with self._lock:
+            self._infos.put(info.binsha, OInfo(info.binsha, info.type, info.size), self._info_cost)
+        # END lock
+
+    def _cached_stream(self, sha):
+        """:return: OStream of the given sha from the cache, or None"""
+        with self._lock:
+            entry = self._trees.get(sha) or self._data.get(sha)
+            if entry is None:
+                self.stream_misses += 1
+                return None
+            self.stream_hits += 1
+        # END lock
+        typename, data = entry
+        return OStream(sha, typename, len(data), BytesIO(data))
+
+    def _cache_stream(self, ostream):
+        """Cache the data of the given stream if it is small enough
+        :return: stream to return instead of the given one"""
+        if ostream.size > self.max_object_size:
+            self._cache_info(ostream)
+            return ostream
+        # END ignore large objects
+        data = ostream.read()
+        with self._lock:
+            lru = self._data
+            if ostream.type == str_tree_type:
+                lru = self._trees
+            lru.put(ostream.binsha, (ostream.type, data), len(data))
+        # END lock
+        return OStream(ostream.binsha, ostream.type, ostream.size, BytesIO(data))
+
+    def has_object(self, sha):
+        with self._lock:
+            if self._cached_info(sha) is not None:
+                return True
+        # END lock
+        return self.odb.has_object(sha)
+
+    def info(self, sha):
+        with self._lock:
+            info = self._cached_info(sha)
+            if info is not None:
+                self.info_hits += 1
+                return info
+            self.info_misses += 1
+        # END lock
+        info = self.odb.info(sha)
+        self._cache_info(info)
+        return info
+
+    def _bulk(self, shas, lookup, fetch_many, fetch):
+        """Yield the results of lookup(sha) for all shas, and those of fetch_many(shas) in order for the shas
+        for which lookup returned None. fetch(sha) is used if fetch_many is None. The shas are handled in
+        windows of ``bulk_window``, to keep memory bounded and yield the first results early"""
+        shas = iter(shas)
+        while True:
+            results = [(sha, lookup(sha)) for sha in islice(shas, self.bulk_window)]
+            if not results:
+                break
+            missing = [sha for sha, result in results if result is None]
+            fetched = iter(fetch_many(missing) if fetch_many is not None else (fetch(sha) for sha in missing))
+            for sha, result in results:
+                yield result if result is not None else next(fetched)
+            # END for each result
+            # let the bulk fetch finish, it may hold on to resources until then
+            for _ in fetched:
+                pass
+        # END for each window
+
+    def info_many(self, shas):
+        """:return: generator yielding OInfo instances for all given binary shas, in order. Objects
+            which are not cached are obtained in bulk if the wrapped database supports it"""
+        def lookup(sha):
+            with self._lock:
+                info = self._cached_info(sha)
+                if info is None:
+                    self.info_misses += 1
+                else:
+                    self.info_hits += 1
+                # END count lookup
+            # END lock
+            return info
+        # end
+
+        def fetch_many(shas):
+            for info in self.odb.info_many(shas):
+                self._cache_info(info)
+                yield info
+            # END for each info
+        # end
+
+        return self._bulk(shas, lookup, hasattr(self.odb, 'info_many') and fetch_many or None, self.info)
+
+    def stream(self, sha):
+        ostream = self._cached_stream(sha)
+        if ostream is None:
+            ostream = self._cache_stream(self.odb.stream(sha))
+        return ostream
+
+    def stream_many(self, shas):
+        """:return: generator yielding OStream instances for all given binary shas, in order. Objects
+            which are not cached are obtained in bulk if the wrapped database supports it
+        :note: each stream is only valid until the next one is requested"""
+        def fetch_many(shas):
+            for ostream in self.odb.stream_many(shas):
+                yield self._cache_stream(ostream)
+            # END for each stream
+        # end
+
+        def fetch(sha):
+            return self._cache_stream(self.odb.stream(sha))
+        # end
+
+        return self._bulk(shas, self._cached_stream, hasattr(self.odb, 'stream_many') and fetch_many or None,
+                          fetch)
+
+    def clear_cache(self):
+        """Drop all cached objects and reset the statistics"""
+        with self._lock:
+            self._infos.clear()
+            self._data.clear()
+            self._trees.clear()
+            self.info_hits = self.info_misses = 0
+            self.stream_hits = self.stream_misses = 0
+        # END lock
@@ -587,20 +587,51 @@ class IndexFile(LazyMixin, diff.Diffable, Serializable):
     def _store_path(self, filepath, fprogress):
         """Store file at filepath in the database and return the base index entry
         Needs the git_working_dir decorator active ! This must be assured in the calling code"""
-        st = os.lstat(filepath)     # handles non-symlinks as well
-        stream = None
-        if S_ISLNK(st.st_mode):
-            # in PY3, readlink is string, but we need bytes. In PY2, it's just OS encoded bytes, we assume UTF-8
-            stream = BytesIO(force_bytes(os.readlink(filepath), encoding=defenc))
+        return self._store_paths((filepath, ), fprogress)[0]
+
+    def _store_paths(self, filepaths, fprogress):
+        """Store the files at the given paths in the database and return their base index entries, in order.
+        Databases supporting it hash and compress the files in parallel, while only a few of them are open
+        at the same time.
+        Needs the git_working_dir decorator active ! This must be assured in the calling code"""
+        stats = list()
+
+        def istreams():
+            for filepath in filepaths:
+                st = os.lstat(filepath)     # handles non-symlinks as well
+                if S_ISLNK(st.st_mode):
+                    # in PY3, readlink is string, but we need bytes. In PY2, it's just OS encoded bytes, we assume UTF-8
+                    stream = BytesIO(force_bytes(os.readlink(filepath), encoding=defenc))
+                else:
+                    stream = open(filepath, 'rb')
+                # END handle stream
+                stats.append((filepath, st))
+                fprogress(filepath, False, filepath)
+                yield IStream(Blob.type, st.st_size, stream)
+            # END for each filepath
+        # end istream generator
+
+        odb = self.repo.odb
+        if hasattr(odb, 'store_many'):
+            stored = odb.store_many(istreams())
         else:
-            stream = open(filepath, 'rb')
-        # END handle stream
-        fprogress(filepath, False, filepath)
-        istream = self.repo.odb.store(IStream(Blob.type, st.st_size, stream))
-        fprogress(filepath, True, filepath)
-        stream.close()
-        return BaseIndexEntry((stat_mode_to_index_mode(st.st_mode),
-                               istream.binsha, 0, to_native_path_linux(filepath)))
+            stored = (odb.store(istream) for istream in istreams())
+        # END handle databases without bulk storage
+
+        entries = list()
+        try:
+            for istream in stored:
+                filepath, st = stats[len(entries)]
+                istream.stream.close()
+                fprogress(filepath, True, filepath)
+                entries.append(BaseIndexEntry((stat_mode_to_index_mode(st.st_mode),
+                                               istream.binsha, 0, to_native_path_linux(filepath))))
+            # END for each stored file
+        finally:
+            # the streams of files which couldn't be stored are closed by the garbage collector
+            stored.close()
+        # END handle errors
+        return entries
 
     @unbare_repo
     @git_working_dir
@@ -627,9 +658,7 @@ class IndexFile(LazyMixin, diff.Diffable, Serializable):
 
         # HANDLE PATHS
         assert len(entries_added) == 0
-        for filepath in self._iter_expand_paths(paths):
-            entries_added.append(self._store_path(filepath, fprogress))
-        # END for each filepath
+        entries_added.extend(self._store_paths(self._iter_expand_paths(paths), fprogress))
         # END path handling
         return entries_added
 
@@ -758,9 +787,9 @@ class IndexFile(LazyMixin, diff.Diffable, Serializable):
             if null_entries_indices:
                 @git_working_dir
                 def handle_null_entries(self):
-                    for ei in null_entries_indices:
+                    new_entries = self._store_paths([entries[ei].path for ei in null_entries_indices], fprogress)
+                    for ei, new_entry in zip(null_entries_indices, new_entries):
                         null_entry = entries[ei]
-                        new_entry = self._store_path(null_entry.path, fprogress)
 
                         # update null entry
                         entries[ei] = BaseIndexEntry(
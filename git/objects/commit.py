@@ -5,7 +5,10 @@
 # the BSD License: http://www.opensource.org/licenses/bsd-license.php
 
 from gitdb import IStream
-from gitdb.util import hex_to_bin
+from gitdb.util import (
+    bin_to_hex,
+    hex_to_bin
+)
 from git.util import (
     Actor,
     Iterable,
@@ -23,8 +26,12 @@ from .util import (
     altz_to_utctz_str,
     parse_actor_and_date,
     from_timestamp,
+    utctz_to_altz,
+)
+from git.compat import (
+    defenc,
+    text_type
 )
-from git.compat import text_type
 
 from time import (
     time,
@@ -40,7 +47,7 @@ import logging
 log = logging.getLogger('git.objects.commit')
 log.addHandler(logging.NullHandler())
 
-__all__ = ('Commit', )
+__all__ = ('Commit', 'CommitRecord', 'ActorTable')
 
 
 class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
@@ -66,9 +73,18 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
     __slots__ = ("tree",
                  "author", "authored_date", "author_tz_offset",
                  "committer", "committed_date", "committer_tz_offset",
-                 "message", "parents", "encoding", "gpgsig")
+                 "message", "parents", "encoding", "gpgsig", "_stats", "_raw")
     _id_attribute_ = "hexsha"
 
+    # attributes which are decoded from the raw data read by _deserialize() once they are accessed
+    _raw_attributes = frozenset(("parents", "author", "authored_date", "author_tz_offset", "committer",
+                                 "committed_date", "committer_tz_offset", "message"))
+
+    # format of git rev-list output parsed by iter_items(prefetch=True), each field ends with a null byte
+    _prefetch_format = "%T%x00%P%x00author %an <%ae> %ad%x00committer %cn <%ce> %cd%x00%e%x00%B%x00"
+    # amount of bytes to read from git rev-list at once when prefetching
+    _prefetch_chunk_size = 64 * 1024
+
     def __init__(self, repo, binsha, tree=None, author=None, authored_date=None, author_tz_offset=None,
                  committer=None, committed_date=None, committer_tz_offset=None,
                  message=None, parents=None, encoding=None, gpgsig=None):
@@ -138,7 +154,17 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
         return commit.parents
 
     def _set_cache_(self, attr):
-        if attr in Commit.__slots__:
+        if attr in ('parents', 'tree', 'committed_date') and self._set_from_commit_graph():
+            self._drop_raw_if_decoded()
+            return
+        if attr == '_stats':
+            self._stats = self._compute_stats()
+            return
+        if attr in self._raw_attributes:
+            # decode only what is needed from the raw data of our last deserialization
+            self._set_from_raw(attr, self._raw)
+            self._drop_raw_if_decoded()
+        elif attr in Commit.__slots__:
             # read the data in a chunk, its faster - then provide a file wrapper
             binsha, typename, self.size, stream = self.repo.odb.stream(self.binsha)
             self._deserialize(BytesIO(stream.read()))
@@ -146,6 +172,64 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
             super(Commit, self)._set_cache_(attr)
         # END handle attrs
 
+    def _decode(self, data):
+        try:
+            return data.decode(self.encoding, 'replace')
+        except LookupError:
+            log.error("Unknown encoding %s of commit %s, using %s", self.encoding, self.hexsha, self.default_encoding)
+            return data.decode(self.default_encoding, 'replace')
+        # END handle unknown encodings
+
+    def _set_from_raw(self, attr, raw):
+        parents, author_line, committer_line, message = raw
+        if attr == 'parents':
+            self.parents = tuple(type(self)(self.repo, hex_to_bin(parent)) for parent in parents)
+        elif attr == 'message':
+            self.message = self._decode(message)
+        elif attr.startswith('author'):
+            self._set_unset(('author', 'authored_date', 'author_tz_offset'),
+                            parse_actor_and_date(self._decode(author_line)))
+        else:
+            self._set_unset(('committer', 'committed_date', 'committer_tz_offset'),
+                            parse_actor_and_date(self._decode(committer_line)))
+        # END handle attribute
+
+    def _set_unset(self, attrs, values):
+        """Set the given attributes to the given values, unless they hold a value already"""
+        for attr, value in zip(attrs, values):
+            if not self._is_set(attr):
+                setattr(self, attr, value)
+        # END for each attribute
+
+    def _is_set(self, attr):
+        """:return: True if the given slot holds a value, which is checked without computing it lazily"""
+        try:
+            getattr(Commit, attr).__get__(self, Commit)
+        except AttributeError:
+            return False
+        return True
+
+    def _drop_raw_if_decoded(self):
+        """Release the raw data of our last deserialization once all attributes were decoded from it"""
+        if self._is_set('_raw') and all(self._is_set(attr) for attr in self._raw_attributes):
+            del self._raw
+        # END drop raw data
+
+    def _set_from_commit_graph(self):
+        """Set our parents, tree and committed_date from the commit-graph of our repository
+        :return: True if we are in the commit-graph"""
+        graph = getattr(self.repo, 'commit_graph', None)
+        if graph is None:
+            return False
+        position = graph.position(self.binsha)
+        if position is None:
+            return False
+        tree, parents, commit_time, generation = graph.commit_data(position)
+        self.tree = Tree(self.repo, tree, Tree.tree_id << 12, '')
+        self.parents = tuple(type(self)(self.repo, graph.sha(parent)) for parent in parents)
+        self.committed_date = commit_time
+        return True
+
     @property
     def authored_datetime(self):
         return from_timestamp(self.authored_date, self.author_tz_offset)
@@ -169,9 +253,13 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
         :param kwargs:
             Additional options to be passed to git-rev-list. They must not alter
             the ouput style of the command, or parsing will yield incorrect results
-        :return: int defining the number of reachable commits"""
+        :return: int defining the number of reachable commits
+        :note: without paths and kwargs, it uses ``Repo.count_commits()``, which doesn't need git if the
+            repository has a reachability bitmap"""
         # yes, it makes a difference whether empty paths are given or not in our case
         # as the empty paths version will ignore merge commits for some reason.
+        if not paths and not kwargs:
+            return self.repo.count_commits(self)
         if paths:
             return len(self.repo.git.rev_list(self.hexsha, '--', paths, **kwargs).splitlines())
         else:
@@ -186,7 +274,7 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
         return self.repo.git.name_rev(self)
 
     @classmethod
-    def iter_items(cls, repo, rev, paths='', **kwargs):
+    def iter_items(cls, repo, rev, paths='', prefetch=False, with_stats=False, **kwargs):
         """Find all commits matching the given criteria.
 
         :param repo: is the Repo
@@ -194,13 +282,20 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
         :param paths:
             is an optinal path or list of paths, if set only Commits that include the path
             or paths will be considered
+        :param prefetch:
+            if True, git rev-list provides the tree, parents, author, committer, encoding and
+            message of each commit along with its sha, so that reading them doesn't require
+            another request to the object database per commit
+        :param with_stats:
+            if True, git log is used instead of git rev-list, to compute the ``stats`` of all
+            commits in the same process
         :param kwargs:
             optional keyword arguments to git rev-list where
             ``max_count`` is the maximum number of commits to fetch
             ``skip`` is the number of commits to skip
             ``since`` all commits since i.e. '1970-01-01'
         :return: iterator yielding Commit items"""
-        if 'pretty' in kwargs:
+        if 'pretty' in kwargs or (prefetch and 'format' in kwargs):
             raise ValueError("--pretty cannot be used as parsing expects single sha's only")
         # END handle pretty
 
@@ -211,6 +306,14 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
             args.extend((paths, ))
         # END if paths
 
+        if with_stats:
+            return cls._iter_with_stats(repo, rev, args, prefetch, kwargs)
+        if prefetch:
+            # names and messages are converted to UTF-8 by git, whatever encoding the commit uses
+            proc = repo.git.rev_list(rev, args, as_process=True, format=cls._prefetch_format, date='raw',
+                                     encoding='UTF-8', **kwargs)
+            return cls._iter_from_prefetch_stream(repo, proc)
+        # END handle prefetching
         proc = repo.git.rev_list(rev, args, as_process=True, **kwargs)
         return cls._iter_from_process_or_stream(repo, proc)
 
@@ -221,28 +324,50 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
             Optional path or list of paths limiting the Commits to those that
             contain at least one of the paths
         :param kwargs: All arguments allowed by git-rev-list
-        :return: Iterator yielding Commit objects which are parents of self """
+        :return: Iterator yielding Commit objects which are parents of self
+        :note: without paths and other arguments than skip and max_count, the commits are walked
+            using the commit-graph of the repository if we are in it"""
         # skip ourselves
         skip = kwargs.get("skip", 1)
         if skip == 0:   # skip ourselves
             skip = 1
         kwargs['skip'] = skip
 
+        graph = self.repo.commit_graph
+        if graph is not None and not paths and set(kwargs) <= set(('skip', 'max_count')):
+            positions = graph.iter_positions(self.binsha)
+            if positions is not None:
+                return self._iter_from_commit_graph(graph, positions, int(skip), int(kwargs.get('max_count', -1)))
+        # END use commit graph
         return self.iter_items(self.repo, self, paths, **kwargs)
 
+    def _iter_from_commit_graph(self, graph, positions, skip, max_count):
+        """:return: iterator yielding the Commit objects at the given positions of the commit-graph,
+            with the semantics of skip and max_count of git-rev-list"""
+        for position in positions:
+            if max_count == 0:
+                break
+            if skip > 0:
+                skip -= 1
+                continue
+            max_count -= 1
+            yield type(self)(self.repo, graph.sha(position))
+        # END for each position
+
     @property
     def stats(self):
         """Create a git stat from changes between this commit and its first parent
         or from all changes done if this is the very first commit.
 
-        :return: git.Stats"""
+        :return: git.Stats
+        :note: commits of ``Repo.iter_commits(with_stats=True)`` come with their stats"""
+        return self._stats
+
+    def _compute_stats(self):
         if not self.parents:
+            # the first line is the sha of the commit
             text = self.repo.git.diff_tree(self.hexsha, '--', numstat=True, root=True)
-            text2 = ""
-            for line in text.splitlines()[1:]:
-                (insertions, deletions, filename) = line.split("\t")
-                text2 += "%s\t%s\t%s\n" % (insertions, deletions, filename)
-            text = text2
+            text = '\n'.join(text.splitlines()[1:])
         else:
             text = self.repo.git.diff(self.parents[0].hexsha, self.hexsha, '--', numstat=True)
         return Stats._list_from_string(self.repo, text)
@@ -278,6 +403,123 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
         if hasattr(proc_or_stream, 'wait'):
             finalize_process(proc_or_stream)
 
+    @classmethod
+    def _iter_from_prefetch_stream(cls, repo, proc_or_stream):
+        """Parse Commit objects from the output of git rev-list using ``_prefetch_format``
+
+        :param proc_or_stream: git-rev-list process instance, or a stream of its output
+        :return: iterator yielding Commit objects with all information but their gpgsig set"""
+        stream = proc_or_stream
+        if not hasattr(stream, 'read'):
+            stream = proc_or_stream.stdout
+
+        nfields = cls._prefetch_format.count('%x00')
+        fields = list()
+        for part in cls._iter_null_terminated(stream):
+            fields.append(part)
+            if len(fields) == nfields:
+                # rev-list puts a line with the sha before each commit, and a newline after it
+                commit_line, fields[0] = fields[0].lstrip(b'\n').split(b'\n')
+                yield cls._from_prefetched_fields(repo, hex_to_bin(commit_line.split()[1]), fields)
+                fields = list()
+            # END handle complete commit
+        # END for each field
+        if hasattr(proc_or_stream, 'wait'):
+            finalize_process(proc_or_stream)
+
+    @classmethod
+    def _iter_with_stats(cls, repo, rev, args, prefetch, kwargs):
+        """:return: iterator yielding Commit objects with their stats set, from a single git log"""
+        # each commit starts with a null byte and its sha and parents, optionally followed by the prefetched
+        # fields, and ends with its numstat lines, which are shown like git diff shows them
+        log_format = '%x00%H%x00%P%x00'
+        if prefetch:
+            log_format += cls._prefetch_format
+            kwargs = dict(kwargs, date='raw', encoding='UTF-8')
+        # END handle prefetching
+        # showing diffs of merges changes which merges are simplified away when walking the history of paths,
+        # which is why their stats are computed once they are needed in that case
+        merge_stats = len(args) == 1
+        if merge_stats:
+            if repo.git.version_info[:2] >= (2, 31):
+                kwargs['diff_merges'] = 'first-parent'
+            else:
+                # merges are shown once per parent, the first one comes first
+                kwargs['m'] = True
+            # END show diffs of merges to their first parent only
+        # END handle merges
+        # like the stats of single commits, those of commits found by their paths include all files
+        proc = repo.git.log(rev, args, as_process=True, format=log_format, numstat=True, full_diff=True,
+                            no_color=True, **kwargs)
+
+        nfields = 3 + (prefetch and cls._prefetch_format.count('%x00') or 0)
+        fields = list()
+        previous_binsha = None
+        # the stats of the last commit end at the end of the stream
+        for part in cls._iter_null_terminated(proc.stdout, final=True):
+            fields.append(part)
+            # the first field is empty, as the output starts with a null byte
+            if len(fields) <= nfields:
+                continue
+            binsha = hex_to_bin(fields[1])
+            if binsha != previous_binsha:
+                if prefetch:
+                    commit = cls._from_prefetched_fields(repo, binsha, fields[3:-1])
+                else:
+                    commit = cls(repo, binsha)
+                # END handle prefetching
+                if merge_stats or len(fields[2].split()) < 2:
+                    commit._stats = Stats._list_from_string(repo, fields[-1].strip(b'\n').decode(defenc))
+                # END handle merges
+                previous_binsha = binsha
+                yield commit
+            # END skip diffs to other parents
+            fields = [b'']
+        # END for each field
+        finalize_process(proc)
+
+    @staticmethod
+    def _iter_null_terminated(stream, final=False):
+        """:return: iterator yielding all null-terminated fields read from the stream
+        :param final: if True, the data after the last null byte is yielded as well"""
+        pending = list()    # chunks of the current, incomplete field
+        while True:
+            chunk = stream.read(Commit._prefetch_chunk_size)
+            if not chunk:
+                break
+            if b'\0' not in chunk:
+                pending.append(chunk)
+                continue
+            # END handle incomplete field
+            if pending:
+                pending.append(chunk)
+                chunk = b''.join(pending)
+                del pending[:]
+            # END join incomplete field
+            parts = chunk.split(b'\0')
+            pending.append(parts.pop())
+            for part in parts:
+                yield part
+            # END for each field
+        # END for each chunk
+        if final:
+            yield b''.join(pending)
+
+    @classmethod
+    def _from_prefetched_fields(cls, repo, binsha, fields):
+        """:return: Commit with the given binary sha from the fields git printed for it using ``_prefetch_format``"""
+        tree, parents, author, committer, encoding, message = fields
+        encoding = encoding.decode('ascii') or cls.default_encoding
+        author, authored_date, author_tz_offset = parse_actor_and_date(author.decode('utf-8', 'replace'))
+        committer, committed_date, committer_tz_offset = parse_actor_and_date(committer.decode('utf-8', 'replace'))
+        return cls(repo, binsha,
+                   tree=Tree(repo, hex_to_bin(tree), Tree.tree_id << 12, ''),
+                   author=author, authored_date=authored_date, author_tz_offset=author_tz_offset,
+                   committer=committer, committed_date=committed_date, committer_tz_offset=committer_tz_offset,
+                   message=message.decode('utf-8', 'replace'),
+                   parents=tuple(cls(repo, hex_to_bin(parent)) for parent in parents.split()),
+                   encoding=encoding)
+
     @classmethod
     def create_from_tree(cls, repo, tree, message, parent_commits=None, head=False, author=None, committer=None,
                          author_date=None, commit_date=None):
@@ -445,89 +687,205 @@ class Commit(base.Object, Iterable, Diffable, Traversable, Serializable):
         return self
 
     def _deserialize(self, stream):
-        """:param from_rev_list: if true, the stream format is coming from the rev-list command
-        Otherwise it is assumed to be a plain data stream from our object"""
-        readline = stream.readline
-        self.tree = Tree(self.repo, hex_to_bin(readline().split()[1]), Tree.tree_id << 12, '')
+        """Read our raw data from the stream. The tree, encoding and gpgsig are set right away, the
+        parents, author, committer and message are only decoded once they are accessed, unless they are set already"""
+        data = stream.read()
+        end = data.find(b'\n\n')
+        if end < 0:
+            headers, message = data.rstrip(b'\n'), b''
+        else:
+            headers, message = data[:end], data[end + 2:]
+        # END handle commits without message
+
+        parents = list()
+        author_line = committer_line = b''
+        encoding = self.default_encoding
+        gpgsig = None
+        lines = headers.split(b'\n')
+        nlines = len(lines)
+        i = 0
+        while i < nlines:
+            line = lines[i]
+            i += 1
+            key, sep, value = line.partition(b' ')
+            if key == b'tree':
+                self.tree = Tree(self.repo, hex_to_bin(value), Tree.tree_id << 12, '')
+            elif key == b'parent':
+                parents.append(value)
+            elif key == b'author':
+                author_line = line
+            elif key == b'committer':
+                committer_line = line
+            elif key == b'encoding':
+                encoding = value.decode('ascii')
+            elif key == b'gpgsig':
+                sig = [value]
+                # the following lines of the signature start with a space
+                while i < nlines and lines[i][:1] == b' ':
+                    sig.append(lines[i][1:])
+                    i += 1
+                # END for each signature line
+                gpgsig = b'\n'.join(sig).rstrip(b'\n').decode('ascii')
+            # END handle header, mergetags and unknown ones are skipped
+        # END for each header line
+
+        self.encoding = encoding
+        self.gpgsig = gpgsig
+        # attributes set before, like the ones given to our constructor or obtained by prefetching, are kept,
+        # the others are decoded from the raw data once they are accessed
+        self._raw = (parents, author_line, committer_line, message)
+        self._drop_raw_if_decoded()
+        return self
 
-        self.parents = list()
-        next_line = None
-        while True:
-            parent_line = readline()
-            if not parent_line.startswith(b'parent'):
-                next_line = parent_line
-                break
-            # END abort reading parents
-            self.parents.append(type(self)(self.repo, hex_to_bin(parent_line.split()[-1].decode('ascii'))))
-        # END for each parent line
-        self.parents = tuple(self.parents)
-
-        # we don't know actual author encoding before we have parsed it, so keep the lines around
-        author_line = next_line
-        committer_line = readline()
-
-        # we might run into one or more mergetag blocks, skip those for now
-        next_line = readline()
-        while next_line.startswith(b'mergetag '):
-            next_line = readline()
-            while next_line.startswith(b' '):
-                next_line = readline()
-        # end skip mergetags
-
-        # now we can have the encoding line, or an empty line followed by the optional
-        # message.
-        self.encoding = self.default_encoding
-        self.gpgsig = None
-
-        # read headers
-        enc = next_line
-        buf = enc.strip()
-        while buf:
-            if buf[0:10] == b"encoding ":
-                self.encoding = buf[buf.find(' ') + 1:].decode('ascii')
-            elif buf[0:7] == b"gpgsig ":
-                sig = buf[buf.find(b' ') + 1:] + b"\n"
-                is_next_header = False
-                while True:
-                    sigbuf = readline()
-                    if not sigbuf:
-                        break
-                    if sigbuf[0:1] != b" ":
-                        buf = sigbuf.strip()
-                        is_next_header = True
-                        break
-                    sig += sigbuf[1:]
-                # end read all signature
-                self.gpgsig = sig.rstrip(b"\n").decode('ascii')
-                if is_next_header:
-                    continue
-            buf = readline().strip()
-        # decode the authors name
+    #} END serializable implementation
 
-        try:
-            self.author, self.authored_date, self.author_tz_offset = \
-                parse_actor_and_date(author_line.decode(self.encoding, 'replace'))
-        except UnicodeDecodeError:
-            log.error("Failed to decode author line '%s' using encoding %s", author_line, self.encoding,
-                      exc_info=True)
 
-        try:
-            self.committer, self.committed_date, self.committer_tz_offset = \
-                parse_actor_and_date(committer_line.decode(self.encoding, 'replace'))
-        except UnicodeDecodeError:
-            log.error("Failed to decode committer line '%s' using encoding %s", committer_line, self.encoding,
-                      exc_info=True)
-        # END handle author's encoding
-
-        # a stream from our data simply gives us the plain message
-        # The end of our message stream is marked with a newline that we strip
-        self.message = stream.read()
-        try:
-            self.message = self.message.decode(self.encoding, 'replace')
-        except UnicodeDecodeError:
-            log.error("Failed to decode message '%s' using encoding %s", self.message, self.encoding, exc_info=True)
-        # END exception handling
+class ActorTable(object):
 
-        return self
+    """Interns actors, so that each distinct name and email is kept in memory only once, and
+    can be referred to by a small integer id"""
+    __slots__ = ('_ids', '_actors')
 
-    #} END serializable implementation
+    def __init__(self):
+        self._ids = dict()          # (name, email) -> id
+        self._actors = list()       # Actor for each id
+
+    def __len__(self):
+        return len(self._actors)
+
+    def id(self, name, email):
+        """:return: id of the actor with the given name and email, which is added if it is not known yet"""
+        key = (name, email)
+        actor_id = self._ids.get(key)
+        if actor_id is None:
+            actor_id = self._ids[key] = len(self._actors)
+            self._actors.append(Actor(name, email))
+        # END intern actor
+        return actor_id
+
+    def actor(self, actor_id):
+        """:return: Actor with the given id"""
+        return self._actors[actor_id]
+
+
+class CommitRecord(object):
+
+    """A compact, read-only representation of a commit for analysing large amounts of them.
+
+    It only keeps the binary shas of the commit, its tree and its parents, the ids of its author and committer
+    in an ``ActorTable`` shared by many records, and the dates and timezone offsets, which are the same as
+    the ones of ``Commit``. The message is read from the object database whenever it is accessed.
+    Use ``to_commit()`` to obtain a ``Commit`` with all this information set."""
+    __slots__ = ('repo', 'actors', 'binsha', 'tree_binsha', 'parent_binshas',
+                 'author_id', 'authored_date', 'author_tz_offset',
+                 'committer_id', 'committed_date', 'committer_tz_offset')
+
+    # format of git rev-list output parsed by iter_items(), each field ends with a null byte
+    _format = "%T%x00%P%x00%an%x00%ae%x00%ad%x00%cn%x00%ce%x00%cd%x00"
+
+    def __init__(self, repo, actors, binsha, tree_binsha, parent_binshas, author_id, authored_date, author_tz_offset,
+                 committer_id, committed_date, committer_tz_offset):
+        self.repo = repo
+        self.actors = actors
+        self.binsha = binsha
+        self.tree_binsha = tree_binsha
+        self.parent_binshas = parent_binshas
+        self.author_id = author_id
+        self.authored_date = authored_date
+        self.author_tz_offset = author_tz_offset
+        self.committer_id = committer_id
+        self.committed_date = committed_date
+        self.committer_tz_offset = committer_tz_offset
+
+    @classmethod
+    def iter_items(cls, repo, rev, paths='', actors=None, **kwargs):
+        """Find all commits matching the given criteria, like ``Commit.iter_items()``, using a single git rev-list
+
+        :param actors: ActorTable to intern authors and committers in, or None to use a new one
+        :return: iterator yielding CommitRecord instances"""
+        if 'pretty' in kwargs or 'format' in kwargs:
+            raise ValueError("--pretty cannot be used as parsing expects single sha's only")
+        # END handle pretty
+        if actors is None:
+            actors = ActorTable()
+        # END create actor table
+        args = ['--']
+        if paths:
+            args.extend((paths, ))
+        # END if paths
+
+        proc = repo.git.rev_list(rev, args, as_process=True, format=cls._format, date='raw', encoding='UTF-8',
+                                 **kwargs)
+        nfields = cls._format.count('%x00')
+        fields = list()
+        for part in Commit._iter_null_terminated(proc.stdout):
+            fields.append(part)
+            if len(fields) < nfields:
+                continue
+            # rev-list puts a line with the sha before each commit, and a newline after it
+            commit_line, tree = fields[0].lstrip(b'\n').split(b'\n')
+            parents, author_name, author_email, authored, committer_name, committer_email, committed = fields[1:]
+            authored_date, author_tz = authored.split()
+            committed_date, committer_tz = committed.split()
+            yield cls(repo, actors, hex_to_bin(commit_line.split()[1]), hex_to_bin(tree),
+                      tuple(hex_to_bin(parent) for parent in parents.split()),
+                      actors.id(author_name.decode('utf-8', 'replace'), author_email.decode('utf-8', 'replace')),
+                      int(authored_date), utctz_to_altz(author_tz.decode('ascii')),
+                      actors.id(committer_name.decode('utf-8', 'replace'),
+                                committer_email.decode('utf-8', 'replace')),
+                      int(committed_date), utctz_to_altz(committer_tz.decode('ascii')))
+            fields = list()
+        # END for each field
+        finalize_process(proc)
+
+    def __eq__(self, other):
+        return self.binsha == getattr(other, 'binsha', None)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.binsha)
+
+    def __repr__(self):
+        return '<git.CommitRecord "%s">' % self.hexsha
+
+    @property
+    def hexsha(self):
+        """:return: 40 byte hex version of our 20 byte binary sha"""
+        return bin_to_hex(self.binsha).decode('ascii')
+
+    @property
+    def author(self):
+        """:return: Actor who authored the commit"""
+        return self.actors.actor(self.author_id)
+
+    @property
+    def committer(self):
+        """:return: Actor who committed the commit"""
+        return self.actors.actor(self.committer_id)
+
+    @property
+    def message(self):
+        """:return: the commit message, read from the object database and decoded using the commit's encoding"""
+        headers, sep, message = self.repo.odb.stream(self.binsha).read().partition(b'\n\n')
+        encoding = Commit.default_encoding
+        for line in headers.split(b'\n'):
+            if line.startswith(b'encoding '):
+                encoding = line[len(b'encoding '):].decode('ascii')
+            # END handle encoding header
+        # END for each header line
+        try:
+            return message.decode(encoding, 'replace')
+        except LookupError:
+            return message.decode(Commit.default_encoding, 'replace')
+        # END handle unknown encodings
+
+    def to_commit(self):
+        """:return: Commit with all information of this record. Its message, encoding and gpgsig are read
+            once one of them is accessed, which keeps the information of this record"""
+        return Commit(self.repo, self.binsha, tree=Tree(self.repo, self.tree_binsha, Tree.tree_id << 12, ''),
+                      author=self.author, authored_date=self.authored_date, author_tz_offset=self.author_tz_offset,
+                      committer=self.committer, committed_date=self.committed_date,
+                      committer_tz_offset=self.committer_tz_offset,
+                      parents=tuple(Commit(self.repo, binsha) for binsha in self.parent_binshas))
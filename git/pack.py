@@ -0,0 +1,776 @@
+# pack.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+"""Module with a reader for pack files and their indices, working on memory maps.
+It is used by ``git.db.GitNativeObjectDB``"""
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+from binascii import b2a_hex
+from struct import (
+    error as StructError,
+    pack,
+    unpack_from
+)
+
+from gitdb.exc import (
+    ParseError,
+    UnsupportedOperation
+)
+from gitdb.fun import (
+    OFS_DELTA,
+    REF_DELTA,
+    type_id_to_type_map,
+    type_to_type_id_map
+)
+
+from git.compat import (
+    PY3,
+    byte_ord
+)
+from git.odict import OrderedDict
+
+__all__ = ('PackIndex', 'PackFile', 'PackWriter', 'DeltaBaseCache', 'apply_delta', 'inflate')
+
+
+def _map_file(path):
+    """:return: read-only memory map of the file at the given path"""
+    with open(path, 'rb') as fp:
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _delta_header_size(data, i):
+    """:return: (size, next_index) of the size encoded at index i of the given delta
+    :raise ParseError: if the delta ends before the size"""
+    size = 0
+    shift = 0
+    while True:
+        if i >= len(data):
+            raise ParseError("Delta header ends after %i bytes" % i)
+        c = byte_ord(data[i])
+        i += 1
+        size |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+            return size, i
+    # END for each byte
+
+
+def _at_eof(decompressor):
+    """:return: True if the given zlib decompressor reached the end of its stream"""
+    if PY3:
+        return decompressor.eof
+    # python 2 has no eof attribute, but input following the end of the stream is kept
+    return bool(decompressor.unused_data)
+
+
+def inflate(view, offset, size, end=None):
+    """:return: the given amount of bytes decompressed from the zlib stream starting at offset of view
+    :param view: memoryview, or buffer in python 2, of the compressed data
+    :param end: index in view at which the compressed data ends at the latest, or None for len(view)"""
+    if size == 0:
+        return b''
+    if end is None:
+        end = len(view)
+    decompressor = zlib.decompressobj()
+    # compressed data is rarely larger than its output, even if it cannot be compressed
+    chunk_size = size + (size >> 10) + 64
+    chunks = list()
+    nbytes = 0
+    while True:
+        chunk_end = min(offset + chunk_size, end)
+        if chunk_end <= offset:
+            raise ParseError("Compressed stream at offset %i ends after %i of %i bytes" % (offset, nbytes, size))
+        chunk = decompressor.decompress(view[offset:chunk_end], size - nbytes)
+        nbytes += len(chunk)
+        if nbytes == size and not chunks:
+            return chunk
+        chunks.append(chunk)
+        if nbytes == size:
+            return b''.join(chunks)
+        if _at_eof(decompressor):
+            raise ParseError("Compressed stream at offset %i decompressed to %i of %i bytes"
+                             % (offset, nbytes, size))
+        # all input was consumed, as the output limit wasn't reached
+        offset = chunk_end
+    # END for each chunk
+
+
+def apply_delta(base, delta):
+    """:return: bytearray with the target data created by applying the given delta to the base data
+    :param base: bytes-like base data
+    :param delta: bytes of a git delta, as stored in pack files
+    :raise ParseError: if the delta doesn't fit the base"""
+    base_size, i = _delta_header_size(delta, 0)
+    target_size, i = _delta_header_size(delta, i)
+    if not PY3:
+        delta = bytearray(delta)
+    if base_size != len(base):
+        raise ParseError("Delta base should have %i bytes, got %i" % (base_size, len(base)))
+
+    try:
+        target = _apply_delta_opcodes(base, delta, i)
+    except IndexError:
+        raise ParseError("Delta ends within an opcode")
+    if len(target) != target_size:
+        raise ParseError("Delta should produce %i bytes, got %i" % (target_size, len(target)))
+    return target
+
+
+def _apply_delta_opcodes(base, delta, i):
+    """:return: bytearray with the target data created by the opcodes of the delta, starting at index i"""
+    target = bytearray()
+    end = len(delta)
+    while i < end:
+        c = delta[i]
+        i += 1
+        if c & 0x80:
+            # copy from base, with the present bytes of offset and size indicated by the bits of c
+            offset = 0
+            if c & 0x01:
+                offset = delta[i]
+                i += 1
+            if c & 0x02:
+                offset |= delta[i] << 8
+                i += 1
+            if c & 0x04:
+                offset |= delta[i] << 16
+                i += 1
+            if c & 0x08:
+                offset |= delta[i] << 24
+                i += 1
+            size = 0
+            if c & 0x10:
+                size = delta[i]
+                i += 1
+            if c & 0x20:
+                size |= delta[i] << 8
+                i += 1
+            if c & 0x40:
+                size |= delta[i] << 16
+                i += 1
+            if size == 0:
+                size = 0x10000
+            target += base[offset:offset + size]
+        elif c:
+            # insert the next c bytes of the delta
+            target += delta[i:i + c]
+            i += c
+        else:
+            raise ParseError("Invalid delta opcode 0")
+        # END handle opcode
+    # END for each opcode
+    return target
+
+
+class DeltaBaseCache(object):
+
+    """Keeps the objects which deltas were applied to in memory, keyed by the path of their pack and their
+    offset in it, so that objects of the same delta chain don't need to inflate their common bases again.
+    The least recently used objects are evicted once their total size exceeds ``max_bytes``.
+    It can be shared by the ``PackFile`` instances of multiple packs, and is thread-safe.
+
+    ``hits`` and ``misses`` count the lookups of bases, ``chains`` the deltified objects which were
+    read, ``depth`` the deltas applied to read them and ``max_depth`` the most deltas applied to read one"""
+    __slots__ = ('max_bytes', 'nbytes', 'hits', 'misses', 'chains', 'depth', 'max_depth', '_entries', '_lock')
+
+    def __init__(self, max_bytes):
+        """:param max_bytes: amount of bytes the data of all cached objects may take"""
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()       # (pack_path, offset) -> (type_id, data)
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reset_counters(self):
+        """Set all counters to 0"""
+        self.hits = self.misses = 0
+        self.chains = self.depth = self.max_depth = 0
+
+    def get(self, pack_path, offset):
+        """:return: (type_id, data) of the object at the given offset of the pack, or None"""
+        key = (pack_path, offset)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+        # END lock
+        return entry
+
+    def put(self, pack_path, offset, type_id, data):
+        """Keep the data of the object at the given offset of the pack, unless it is larger than the budget"""
+        if len(data) > self.max_bytes:
+            return
+        key = (pack_path, offset)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous[1])
+            self._entries[key] = (type_id, data)
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= len(self._entries.popitem(last=False)[1][1])
+            # END evict least recently used
+        # END lock
+
+    def _record_chain(self, depth):
+        with self._lock:
+            self.chains += 1
+            self.depth += depth
+            self.max_depth = max(self.max_depth, depth)
+        # END lock
+
+    def clear(self):
+        """Remove all objects, keeping the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+        # END lock
+
+
+class PackIndex(object):
+
+    """Maps binary shas to offsets in a pack file by reading its index file, version 1 or 2"""
+    __slots__ = ('_path', '_map', '_version', '_fanout', '_sha_base', '_offset_base', '_large_offset_base')
+
+    def __init__(self, path):
+        """:param path: path to the .idx file
+        :raise UnsupportedOperation: if the index version is not supported
+        :raise ParseError: if the index is truncated"""
+        self._path = path
+        self._map = _map_file(path)
+        try:
+            self._read_header()
+        except StructError:
+            self.close()
+            raise ParseError("Pack index %s is truncated" % path)
+        # END handle truncated index
+
+    def _read_header(self):
+        if self._map[:4] == b'\377tOc':
+            self._version = unpack_from('>I', self._map, 4)[0]
+            if self._version != 2:
+                self.close()
+                raise UnsupportedOperation("Pack index version %i of %s is not supported"
+                                           % (self._version, self._path))
+            fanout_base = 8
+        else:
+            self._version = 1
+            fanout_base = 0
+        # END handle version
+        self._fanout = unpack_from('>256I', self._map, fanout_base)
+        nobjects = self._fanout[255]
+        if self._version == 2:
+            self._sha_base = fanout_base + 1024
+            self._offset_base = self._sha_base + 24 * nobjects       # skipping shas and crcs
+            self._large_offset_base = self._offset_base + 4 * nobjects
+        else:
+            # entries are (offset, sha) pairs
+            self._sha_base = fanout_base + 1024 + 4
+            self._offset_base = self._large_offset_base = None
+        # END handle version layout
+        # all entries and both trailing checksums must be there, large offsets are checked when they are read
+        entries_end = self._offset_base + 4 * nobjects if self._version == 2 else fanout_base + 1024 + 24 * nobjects
+        if len(self._map) < entries_end + 40:
+            self.close()
+            raise ParseError("Pack index %s is truncated" % self._path)
+
+    def __len__(self):
+        return self._fanout[255]
+
+    @property
+    def path(self):
+        """:return: path to the index file"""
+        return self._path
+
+    @property
+    def version(self):
+        """:return: version of the index file format"""
+        return self._version
+
+    def close(self):
+        """Release the memory map. The instance cannot be used anymore"""
+        self._map.close()
+
+    def _sha_position(self, i):
+        if self._version == 2:
+            return self._sha_base + 20 * i
+        return self._sha_base + 24 * i
+
+    def sha(self, i):
+        """:return: binary sha of the i-th object, in order of the shas"""
+        position = self._sha_position(i)
+        return self._map[position:position + 20]
+
+    def index(self, binsha):
+        """:return: position of the given binary sha in the sorted list of shas, or -1 if it doesn't exist"""
+        first = byte_ord(binsha[0])
+        lo = first and self._fanout[first - 1] or 0
+        hi = self._fanout[first]
+        mm = self._map
+        sha_position = self._sha_position
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = sha_position(mid)
+            mid_sha = mm[position:position + 20]
+            if mid_sha < binsha:
+                lo = mid + 1
+            elif mid_sha > binsha:
+                hi = mid
+            else:
+                return mid
+        # END binary search
+        return -1
+
+    def offset_at(self, i):
+        """:return: offset in the pack of the i-th object"""
+        if self._version == 1:
+            return unpack_from('>I', self._map, self._sha_base + 24 * i - 4)[0]
+        offset = unpack_from('>I', self._map, self._offset_base + 4 * i)[0]
+        if offset & 0x80000000:
+            try:
+                offset = unpack_from('>Q', self._map, self._large_offset_base + 8 * (offset & 0x7fffffff))[0]
+            except StructError:
+                raise ParseError("Large offset %i of %s is missing" % (offset & 0x7fffffff, self._path))
+        # END handle large offsets
+        return offset
+
+    def offsets(self):
+        """:return: list of the offsets in the pack of all objects, in order of their shas"""
+        if self._version == 1:
+            return [self.offset_at(i) for i in range(len(self))]
+        offsets = list(unpack_from('>%iI' % len(self), self._map, self._offset_base))
+        for i, offset in enumerate(offsets):
+            if offset & 0x80000000:
+                offsets[i] = self.offset_at(i)
+        # END for each large offset
+        return offsets
+
+    def offset(self, binsha):
+        """:return: offset in the pack of the object with the given binary sha, or None if it doesn't exist"""
+        i = self.index(binsha)
+        if i < 0:
+            return None
+        return self.offset_at(i)
+
+
+class PackFile(object):
+
+    """Reads objects from a pack file of version 2 or 3, resolving their deltas.
+    Objects are addressed by their offset, which can be obtained from the ``PackIndex`` available
+    as ``index``. The bases of deltas are kept in the ``DeltaBaseCache`` available as ``base_cache``,
+    if it is not None."""
+    __slots__ = ('_path', '_map', '_view', '_end', 'index', 'base_cache')
+
+    def __init__(self, path, index=None, base_cache=None):
+        """:param path: path to the .pack file
+        :param index: PackIndex of the pack, or None to read it from the .idx file next to the pack
+        :param base_cache: DeltaBaseCache to keep the bases of deltas in, or None
+        :raise UnsupportedOperation: if the pack or its index version is not supported
+        :raise ParseError: if the pack or its index is truncated"""
+        if index is None:
+            index = PackIndex(path[:-len('.pack')] + '.idx')
+        self.index = index
+        self.base_cache = base_cache
+        self._path = path
+        self._map = _map_file(path)
+        if PY3:
+            self._view = memoryview(self._map)
+        else:
+            # memory maps have no new-style buffer interface in python 2, slices of buffers are copies
+            self._view = buffer(self._map)      # noqa
+        # END create view
+        self._end = len(self._map) - 20     # the trailing checksum
+        if self._end < 12:
+            self.close()
+            raise ParseError("Pack %s is truncated" % path)
+        # END check size
+        version = unpack_from('>I', self._map, 4)[0] if self._map[:4] == b'PACK' else None
+        if version not in (2, 3):
+            self.close()
+            raise UnsupportedOperation("Pack %s with version %r is not supported" % (path, version))
+        # END check version
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def path(self):
+        """:return: path to the pack file"""
+        return self._path
+
+    def close(self):
+        """Release the memory maps of the pack and its index. The instance cannot be used anymore"""
+        if PY3:
+            self._view.release()
+        self._map.close()
+        self.index.close()
+
+    def _entry(self, offset):
+        """:return: (type_id, size, data_offset, base), with base being the offset of the base for OFS
+            deltas, the binary sha of the base for REF deltas, or None
+        :raise ParseError: if the entry is invalid or truncated"""
+        try:
+            return self._read_entry(offset)
+        except IndexError:
+            raise ParseError("Entry at offset %i of %s is truncated" % (offset, self._path))
+        # END handle truncated entries
+
+    def _read_entry(self, offset):
+        if not 12 <= offset < self._end:
+            raise ParseError("Invalid offset %i in %s" % (offset, self._path))
+        mm = self._map
+        c = byte_ord(mm[offset])
+        type_id = (c >> 4) & 7
+        size = c & 15
+        shift = 4
+        i = offset + 1
+        while c & 0x80:
+            c = byte_ord(mm[i])
+            i += 1
+            size |= (c & 0x7f) << shift
+            shift += 7
+        # END for each size byte
+
+        base = None
+        if type_id == OFS_DELTA:
+            c = byte_ord(mm[i])
+            i += 1
+            distance = c & 0x7f
+            while c & 0x80:
+                c = byte_ord(mm[i])
+                i += 1
+                distance = ((distance + 1) << 7) | (c & 0x7f)
+            # END for each distance byte
+            base = offset - distance
+        elif type_id == REF_DELTA:
+            base = mm[i:i + 20]
+            i += 20
+            if i > self._end:
+                raise ParseError("Entry at offset %i of %s is truncated" % (offset, self._path))
+        elif not 1 <= type_id <= 4:
+            raise ParseError("Invalid object type %i at offset %i of %s" % (type_id, offset, self._path))
+        # END handle type
+        return type_id, size, i, base
+
+    def _base_offset(self, type_id, base):
+        """:return: offset of the base of the delta with the given type and base in this pack"""
+        if type_id == OFS_DELTA:
+            return base
+        offset = self.index.offset(base)
+        if offset is None:
+            raise UnsupportedOperation("Delta base %s is not in pack %s" % (base, self._path))
+        return offset
+
+    def inflate(self, data_offset, size):
+        """:return: bytes of the given size decompressed from the data starting at data_offset"""
+        return inflate(self._view, data_offset, size, self._end)
+
+    def info_at(self, offset):
+        """:return: (type_string, size) of the object at the given offset
+        :raise UnsupportedOperation: if the object is a delta whose base is not in this pack"""
+        type_id, size, data_offset, base = self._entry(offset)
+        if type_id < OFS_DELTA:
+            return type_id_to_type_map[type_id], size
+
+        # the object size is stored in the delta, its type is the one of the base object
+        # both sizes take up to 10 bytes, but their compressed form might follow a large block header
+        decompressor = zlib.decompressobj()
+        header = b''
+        while len(header) < 20 and not _at_eof(decompressor) and data_offset < self._end:
+            chunk_end = min(data_offset + 256, self._end)
+            header += decompressor.decompress(self._view[data_offset:chunk_end], 20 - len(header))
+            data_offset = chunk_end
+        # END for each chunk
+        size = _delta_header_size(header, _delta_header_size(header, 0)[1])[0]
+        while type_id >= OFS_DELTA:
+            type_id, _, _, base = self._entry(self._base_offset(type_id, base))
+        # END for each delta
+        return type_id_to_type_map[type_id], size
+
+    def data_at(self, offset, max_size=None):
+        """:return: (type_string, data) of the object at the given offset, with data being bytes-like
+        :param max_size: if not None, objects which are no deltas and larger than the given amount of bytes
+            are not read
+        :raise UnsupportedOperation: if the object is a delta whose base is not in this pack, or too large"""
+        cache = self.base_cache
+        deltas = list()     # (offset, data_offset, size) of deltas to apply, the last one first
+        type_id, size, data_offset, base = self._entry(offset)
+        if max_size is not None and type_id < OFS_DELTA and size > max_size:
+            raise UnsupportedOperation("Object at offset %i of %s is too large to be read at once"
+                                       % (offset, self._path))
+        if cache is not None and type_id >= OFS_DELTA:
+            # it might have been the base of another delta
+            entry = cache.get(self._path, offset)
+            if entry is not None:
+                return type_id_to_type_map[entry[0]], entry[1]
+        # END check cache
+        data = None
+        while type_id >= OFS_DELTA:
+            deltas.append((offset, data_offset, size))
+            offset = self._base_offset(type_id, base)
+            if cache is not None:
+                entry = cache.get(self._path, offset)
+                if entry is not None:
+                    type_id, data = entry
+                    break
+            # END check cached bases
+            type_id, size, data_offset, base = self._entry(offset)
+        # END for each delta
+
+        if data is None:
+            data = self.inflate(data_offset, size)
+            if cache is not None and deltas:
+                cache.put(self._path, offset, type_id, data)
+        # END read base
+        for i in range(len(deltas) - 1, -1, -1):
+            offset, data_offset, size = deltas[i]
+            data = apply_delta(data, self.inflate(data_offset, size))
+            if cache is not None and i:
+                # deltas may be applied to it again, but the result must not be modified
+                data = bytes(data)
+                cache.put(self._path, offset, type_id, data)
+            # END cache intermediate base
+        # END for each delta
+        if cache is not None and deltas:
+            cache._record_chain(len(deltas))
+        return type_id_to_type_map[type_id], data
+
+
+def _entry_header(type_id, size):
+    """:return: bytes encoding the type and size of a pack entry"""
+    c = (type_id << 4) | (size & 15)
+    size >>= 4
+    header = bytearray()
+    while size:
+        header.append(c | 0x80)
+        c = size & 0x7f
+        size >>= 7
+    # END for each size byte
+    header.append(c)
+    return bytes(header)
+
+
+class PackWriter(object):
+
+    """Writes objects into a new pack file, without deltas, and creates its index once it is finished.
+    Objects can be read back before that. Each object is only written once::
+
+     writer = PackWriter(pack_dir)
+     binsha = writer.write(b'blob', len(data), BytesIO(data))
+     pack_path = writer.finish()
+
+    Pack and index are written to temporary files in the pack directory, and only renamed to
+    their final name by ``finish()``, which is why readers never see incomplete packs.
+
+    Objects may be written and read by multiple threads at once. Objects up to ``chunk_size`` bytes are
+    hashed before they are compressed, so that duplicates are not compressed at all, and are compressed
+    without holding the writer's lock."""
+    __slots__ = ('_pack_dir', '_fp', '_tmp_path', '_offset', '_entries', '_lock')
+
+    # zlib compression level, the same as gitdb uses for loose objects
+    compression_level = zlib.Z_BEST_SPEED
+
+    # amount of bytes to read from streams at once
+    chunk_size = 512 * 1024
+
+    def __init__(self, pack_dir):
+        """:param pack_dir: directory to write the pack and its index to"""
+        self._pack_dir = pack_dir
+        fd, self._tmp_path = tempfile.mkstemp(prefix='tmp_pack_', dir=pack_dir)
+        self._fp = os.fdopen(fd, 'w+b')
+        # the amount of objects is written once it is known
+        self._fp.write(b'PACK' + pack('>II', 2, 0))
+        self._offset = 12
+        self._entries = dict()      # binsha -> (offset, crc32, typename, size, data_offset, end_offset)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, binsha):
+        return binsha in self._entries
+
+    def write(self, typename, size, stream):
+        """Compress the object with the given type and size, whose data is read from the stream, into the pack
+        :return: binary sha of the object
+        :raise ValueError: if the stream doesn't provide the given amount of bytes"""
+        if not isinstance(typename, bytes):
+            typename = typename.encode('ascii')
+        sha = hashlib.sha1(typename + b' ' + str(size).encode('ascii') + b'\0')
+        if size <= self.chunk_size:
+            data = stream.read(size + 1)
+            if len(data) != size:
+                raise ValueError("Stream provided %i bytes instead of %i" % (len(data), size))
+            sha.update(data)
+            binsha = sha.digest()
+            if binsha in self._entries:
+                return binsha
+            return self.write_compressed(binsha, typename, size, zlib.compress(data, self.compression_level))
+        # END handle small objects
+
+        with self._lock:
+            return self._write_stream(typename, size, stream, sha)
+        # END lock
+
+    def _write_stream(self, typename, size, stream, sha):
+        """Compress the object into the pack while it is read from the stream, which is slow enough
+        to only be done for large objects, while holding the lock"""
+        header = _entry_header(type_to_type_id_map[typename], size)
+        compressor = zlib.compressobj(self.compression_level)
+        fp = self._fp
+        offset = self._offset
+        fp.write(header)
+        crc = zlib.crc32(header)
+        nbytes = 0
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+            nbytes += len(chunk)
+            sha.update(chunk)
+            compressed = compressor.compress(chunk)
+            fp.write(compressed)
+            crc = zlib.crc32(compressed, crc)
+        # END for each chunk
+        compressed = compressor.flush()
+        fp.write(compressed)
+        crc = zlib.crc32(compressed, crc)
+
+        binsha = sha.digest()
+        if nbytes != size or binsha in self._entries:
+            fp.seek(offset)
+            fp.truncate()
+            if nbytes != size:
+                raise ValueError("Stream provided %i bytes instead of %i" % (nbytes, size))
+            return binsha
+        # END handle invalid streams and duplicate objects
+        self._offset = fp.tell()
+        self._entries[binsha] = (offset, crc & 0xffffffff, typename, size, offset + len(header), self._offset)
+        return binsha
+
+    def write_compressed(self, binsha, typename, size, data):
+        """Write an object which was already hashed and compressed into the pack, unless it is in it already
+        :param binsha: binary sha of the object
+        :param data: the object's data, without header, compressed with zlib
+        :return: binsha"""
+        if not isinstance(typename, bytes):
+            typename = typename.encode('ascii')
+        header = _entry_header(type_to_type_id_map[typename], size)
+        crc = zlib.crc32(data, zlib.crc32(header))
+        with self._lock:
+            if binsha in self._entries:
+                return binsha
+            offset = self._offset
+            self._fp.write(header)
+            self._fp.write(data)
+            self._offset = offset + len(header) + len(data)
+            self._entries[binsha] = (offset, crc & 0xffffffff, typename, size, offset + len(header), self._offset)
+        # END lock
+        return binsha
+
+    def info(self, binsha):
+        """:return: (type_string, size) of the object with the given binary sha, or None if it wasn't written"""
+        entry = self._entries.get(binsha)
+        if entry is None:
+            return None
+        return entry[2], entry[3]
+
+    def read(self, binsha):
+        """:return: (type_string, data) of the object with the given binary sha, or None if it wasn't written"""
+        entry = self._entries.get(binsha)
+        if entry is None:
+            return None
+        offset, crc, typename, size, data_offset, end_offset = entry
+        fp = self._fp
+        with self._lock:
+            fp.flush()
+            fp.seek(data_offset)
+            data = fp.read(end_offset - data_offset)
+            fp.seek(self._offset)
+        # END lock
+        return typename, zlib.decompress(data)
+
+    def abort(self):
+        """Remove the pack written so far. The instance cannot be used anymore"""
+        with self._lock:
+            self._fp.close()
+            os.remove(self._tmp_path)
+            self._entries.clear()
+        # END lock
+
+    def finish(self):
+        """Complete the pack and write its index, version 2. The instance cannot be used anymore
+        :return: path to the new pack file, or None if no object was written"""
+        if not self._entries:
+            self.abort()
+            return None
+        with self._lock:
+            fp = self._fp
+            fp.seek(8)
+            fp.write(pack('>I', len(self._entries)))
+            fp.flush()
+
+            # the pack checksum covers all of its contents
+            fp.seek(0)
+            sha = hashlib.sha1()
+            while True:
+                chunk = fp.read(self.chunk_size)
+                if not chunk:
+                    break
+                sha.update(chunk)
+            # END for each chunk
+            pack_sha = sha.digest()
+            fp.write(pack_sha)
+            fp.close()
+        # END lock
+
+        binshas = sorted(self._entries)
+        entries = self._entries
+        fanout = [0] * 256
+        for binsha in binshas:
+            fanout[bytearray(binsha[:1])[0]] += 1
+        # END count first bytes
+        for i in range(1, 256):
+            fanout[i] += fanout[i - 1]
+        # END accumulate
+        offsets = list()
+        large_offsets = list()
+        for binsha in binshas:
+            offset = entries[binsha][0]
+            if offset >= 0x80000000:
+                large_offsets.append(offset)
+                offset = 0x80000000 | (len(large_offsets) - 1)
+            offsets.append(offset)
+        # END for each offset
+        index = b''.join((b'\377tOc', pack('>I', 2), pack('>256I', *fanout), b''.join(binshas),
+                          pack('>%iI' % len(binshas), *[entries[binsha][1] for binsha in binshas]),
+                          pack('>%iI' % len(offsets), *offsets),
+                          pack('>%iQ' % len(large_offsets), *large_offsets), pack_sha))
+        index += hashlib.sha1(index).digest()
+
+        fd, tmp_index_path = tempfile.mkstemp(prefix='tmp_idx_', dir=self._pack_dir)
+        with os.fdopen(fd, 'wb') as index_fp:
+            index_fp.write(index)
+        # END write index
+        base_path = os.path.join(self._pack_dir, 'pack-%s' % b2a_hex(pack_sha).decode('ascii'))
+        # like git, packs are read-only. The index comes last, as readers look for it
+        for tmp_path, path in ((self._tmp_path, base_path + '.pack'), (tmp_index_path, base_path + '.idx')):
+            os.chmod(tmp_path, 0o444)
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        # END for each file
+        self._entries.clear()
+        return base_path + '.pack'
@@ -22,7 +22,9 @@ from git.refs import (
 from git.objects import (
     Submodule,
     RootModule,
-    Commit
+    Commit,
+    CommitRecord,
+    Object
 )
 from git.util import (
     Actor,
@@ -36,12 +38,21 @@ from git.remote import (
     to_progress_instance
 )
 
-from git.db import GitCmdObjectDB
+from git.db import (
+    GitCmdObjectDB,
+    CachingObjectDB
+)
+from git.commitgraph import CommitGraph
+from git.commitdag import CommitDAG
+from git.bitmap import PackBitmap
+from git.objects.util import get_object_type_by_name
+from git.odict import OrderedDict
 
 from gitdb.util import (
     join,
     isfile,
-    hex_to_bin
+    hex_to_bin,
+    bin_to_hex
 )
 
 from .fun import (
@@ -52,6 +63,7 @@ from .fun import (
 )
 from git.compat import (
     text_type,
+    string_types,
     defenc,
     PY3,
     safe_decode,
@@ -61,6 +73,7 @@ from git.compat import (
 import os
 import sys
 import re
+import tempfile
 from collections import namedtuple
 
 DefaultDBType = GitCmdObjectDB
@@ -109,6 +122,17 @@ class Repo(object):
     # Subclasses may easily bring in their own custom types by placing a constructor or type here
     GitCommandWrapperType = Git
 
+    # If True, commits are walked using git's commit-graph files if there are any, see ``commit_graph``
+    use_commit_graph = True
+
+    # If True, reachable objects are counted and listed using reachability bitmaps if there are any,
+    # see ``reachability_bitmap``
+    use_reachability_bitmap = True
+
+    # Maximum total length of the commits passed to a single git describe by ``describe_many()``, which keeps
+    # its command line well below the limit of 32767 characters on Windows
+    describe_batch_length = 16 * 1024
+
     def __init__(self, path=None, odbt=DefaultDBType, search_parent_directories=False):
         """Create a new Repo instance
 
@@ -140,6 +164,10 @@ class Repo(object):
         self.working_dir = None
         self._working_tree_dir = None
         self.git_dir = None
+        self._commit_graph = None
+        self._commit_graph_read = False
+        self._reachability_bitmap = None
+        self._reachability_bitmap_read = False
         curpath = os.getenv('GIT_DIR', epath)
 
         # walk up the path to find the .git dir
@@ -187,7 +215,7 @@ class Repo(object):
 
         # special handling, in special times
         args = [join(self.git_dir, 'objects')]
-        if issubclass(odbt, GitCmdObjectDB):
+        if issubclass(odbt, (GitCmdObjectDB, CachingObjectDB)):
             args.append(self.git)
         self.odb = odbt(*args)
 
@@ -231,6 +259,48 @@ class Repo(object):
         """:return: True if the repository is bare"""
         return self._bare
 
+    @property
+    def commit_graph(self):
+        """:return: ``CommitGraph`` of this repository, or None if there is none or if ``use_commit_graph``
+            is False. Like git, it is not used in shallow repositories, or if grafts or replacement
+            objects alter the history.
+        :note: it is read on first access, commits added afterwards are read from the object database"""
+        if not self._commit_graph_read:
+            self._commit_graph_read = True
+            if self.use_commit_graph and not self._history_is_altered():
+                self._commit_graph = CommitGraph.from_objects_dir(join(self.git_dir, 'objects'))
+        # END read commit graph
+        return self._commit_graph
+
+    @property
+    def reachability_bitmap(self):
+        """:return: ``PackBitmap`` of the pack with a reachability bitmap, or None if there is none or if
+            ``use_reachability_bitmap`` is False. Like ``commit_graph``, it is not used if the history is altered.
+        :note: it is read on first access. Objects which are not in its pack are counted and listed by git"""
+        if not self._reachability_bitmap_read:
+            self._reachability_bitmap_read = True
+            if self.use_reachability_bitmap and not self._history_is_altered():
+                self._reachability_bitmap = PackBitmap.from_objects_dir(join(self.git_dir, 'objects'))
+        # END read bitmap
+        return self._reachability_bitmap
+
+    def _history_is_altered(self):
+        """:return: True if the parents of commits might differ from those stored in the commits"""
+        if isfile(join(self.git_dir, 'shallow')) or isfile(join(self.git_dir, 'info', 'grafts')):
+            return True
+        if os.environ.get('GIT_NO_REPLACE_OBJECTS'):
+            return False
+        replace_dir = join(self.git_dir, 'refs', 'replace')
+        if os.path.isdir(replace_dir) and os.listdir(replace_dir):
+            return True
+        try:
+            with open(join(self.git_dir, 'packed-refs'), 'rb') as fp:
+                return b' refs/replace/' in fp.read()
+            # END close file
+        except (IOError, OSError):
+            return False
+        # END handle missing packed refs
+
     @property
     def heads(self):
         """A list of ``Head`` objects representing the branch heads in
@@ -466,7 +536,9 @@ class Repo(object):
 
         :parm kwargs:
             Arguments to be passed to git-rev-list - common ones are
-            max_count and skip
+            max_count and skip. Pass prefetch=True to have git provide the information
+            of all commits in the same stream, and with_stats=True to have it compute
+            their stats as well, see ``Commit.iter_items()``
 
         :note: to receive only commits between two named revisions, use the
             "revA...revB" revision specifier
@@ -477,6 +549,117 @@ class Repo(object):
 
         return Commit.iter_items(self, rev, paths, **kwargs)
 
+    def iter_stats(self, rev=None, paths='', **kwargs):
+        """Compute the stats of the commits ``iter_commits()`` would yield, using a single git log process
+        instead of one git diff per commit.
+
+        :param kwargs: see ``iter_commits()``, prefetch=True provides the information of the commits as well
+        :return: iterator yielding (Commit, Stats) tuples"""
+        for commit in self.iter_commits(rev, paths, with_stats=True, **kwargs):
+            yield commit, commit.stats
+        # END for each commit
+
+    def iter_commit_records(self, rev=None, paths='', actors=None, **kwargs):
+        """Like ``iter_commits()``, but yielding compact ``CommitRecord`` instances, which are suitable for holding
+        the information of a large amount of commits in memory
+
+        :param actors: ``ActorTable`` the authors and committers of the records are interned in, or None to use
+            a new one for all of them
+        :return: iterator yielding CommitRecord instances"""
+        if rev is None:
+            rev = self.head.commit
+        return CommitRecord.iter_items(self, rev, paths, actors, **kwargs)
+
+    def _reachable_bitmap(self, rev, exclude):
+        """:return: (PackBitmap, bitmap) of the objects reachable from rev but not from the revisions in exclude,
+            or None if it can't be computed from the ``reachability_bitmap``"""
+        pack_bitmap = self.reachability_bitmap
+        if pack_bitmap is None:
+            return None
+        binshas = self._resolve_binshas([rev] + list(exclude))
+        if binshas is None:
+            return None
+        bitmap = pack_bitmap.reachable(self.odb, binshas[:1], binshas[1:])
+        if bitmap is None:
+            return None
+        return pack_bitmap, bitmap
+
+    def _resolve_binshas(self, revs, suffix='', peel=False):
+        """:return: list with the binary sha of each of the given revisions, or None if they don't refer to
+            one object each. Objects and full hexshas are taken as they are, all other revisions are resolved
+            by a single call to git rev-parse
+        :param suffix: appended to the revisions git resolves, like '^{commit}'
+        :param peel: if True, only Commit objects are taken as they are, while other objects and full hexshas,
+            which might refer to annotated tags, are resolved by git as well
+        :raise GitCommandError: if a revision is invalid"""
+        binshas = list()
+        names = list()
+        for rev in revs:
+            if isinstance(rev, Object) and (not peel or rev.type == 'commit'):
+                binshas.append(rev.binsha)
+            elif isinstance(rev, string_types) and not peel and self.re_hexsha_only.match(rev):
+                binshas.append(hex_to_bin(rev))
+            else:
+                binshas.append(None)
+                names.append(text_type(rev) + suffix)
+            # END handle revision type
+        # END for each revision
+        if names:
+            hexshas = self.git.rev_parse(*names).split()
+            if len(hexshas) != len(names) or not all(self.re_hexsha_only.match(h) for h in hexshas):
+                return None
+            hexshas.reverse()
+            binshas = [binsha is None and hex_to_bin(hexshas.pop()) or binsha for binsha in binshas]
+        # END resolve names
+        return binshas
+
+    def count_commits(self, rev=None, exclude=()):
+        """Count the commits reachable from rev, like ``git rev-list --count rev --not exclude...``
+
+        :param rev: revision specifier, the active branch's commit if None
+        :param exclude: revision specifiers whose ancestors are not counted
+        :return: int
+        :note: it is computed without git if the objects are in the pack of the ``reachability_bitmap``"""
+        if rev is None:
+            rev = self.head.commit
+        result = self._reachable_bitmap(rev, exclude)
+        if result is not None:
+            pack_bitmap, bitmap = result
+            return pack_bitmap.count(bitmap, b'commit')
+        args = [rev]
+        if exclude:
+            args.append('--not')
+            args.extend(exclude)
+        # END handle excluded revisions
+        return int(self.git.rev_list(*args, count=True))
+
+    def iter_objects(self, rev=None, exclude=()):
+        """Iterate the commits, trees, blobs and tags reachable from rev, like
+        ``git rev-list --objects rev --not exclude...``, which can be used to find all objects which were
+        added between two releases.
+
+        :param rev: revision specifier, the active branch's commit if None
+        :param exclude: revision specifiers whose reachable objects are not returned
+        :return: iterator yielding ``git.Object`` instances of the respective type, in no particular order.
+            Trees and blobs have no path.
+        :note: they are found without git if the objects are in the pack of the ``reachability_bitmap``"""
+        if rev is None:
+            rev = self.head.commit
+        result = self._reachable_bitmap(rev, exclude)
+        if result is not None:
+            pack_bitmap, bitmap = result
+            return (get_object_type_by_name(typename)(self, binsha)
+                    for binsha, typename in pack_bitmap.iter_objects(bitmap))
+        # END use bitmap
+        args = [rev]
+        if exclude:
+            args.append('--not')
+            args.extend(exclude)
+        # END handle excluded revisions
+        hexshas = (line[:40] for line in self.git.iter_lines('rev_list', *args, objects=True))
+        return (get_object_type_by_name(typename)(self, hex_to_bin(hexsha))
+                for hexsha, typename, size in self.git.get_object_headers(hexshas))
+
     def merge_base(self, *rev, **kwargs):
         """Find the closest common ancestor for the given revision (e.g. Commits, Tags, References, etc)
 
@@ -514,7 +697,15 @@ class Repo(object):
         :param ancestor_rev: Rev which should be an ancestor
         :param rev: Rev to test against ancestor_rev
         :return: ``True``, ancestor_rev is an accestor to rev.
+        :note: it is answered without git if both are in the ``commit_graph``
         """
+        graph = self.commit_graph
+        if graph is not None:
+            binshas = self._resolve_binshas((ancestor_rev, rev), '^{commit}')
+            result = graph.is_ancestor(*binshas) if binshas is not None else None
+            if result is not None:
+                return result
+        # END use commit graph
         try:
             self.git.merge_base(ancestor_rev, rev, is_ancestor=True)
         except GitCommandError as err:
@@ -523,6 +714,132 @@ class Repo(object):
             raise
         return True
 
+    def commit_dag(self, revs=None, **kwargs):
+        """Read the commits reachable from the given revisions into a ``CommitDAG``, using a single git rev-list.
+        It answers ``is_ancestor()``, ``merge_base()`` and ``ahead_behind()`` queries and provides topological
+        and date orderings without running git, which pays off if many of them are asked about the same history.
+
+        :param revs: revision specifier or list of them, which may exclude commits like 'a..b' or '^a'.
+            If None, the active branch will be used.
+        :param kwargs: additional arguments to be passed to git rev-list, like all=True
+        :return: ``git.commitdag.CommitDAG``"""
+        if revs is None:
+            revs = [self.head.commit]
+        elif not isinstance(revs, (list, tuple)):
+            revs = [revs]
+        # END handle single revision
+        return CommitDAG.from_rev_list(self, revs, **kwargs)
+
+    def _resolve_commits(self, revs):
+        """:return: list with the binary sha of the commit each of the given revisions refers to, with
+            annotated tags being peeled
+        :raise ValueError: if a revision doesn't refer to a single commit"""
+        binshas = self._resolve_binshas(revs, '^{commit}', peel=True)
+        if binshas is None:
+            raise ValueError("Revisions must refer to a single commit each, got %r" % (revs, ))
+        return binshas
+
+    def compare_refs(self, base, refs=None):
+        """Count the commits each of the given references is ahead of and behind base, like
+        ``git rev-list --left-right --count base...ref`` would for each of them.
+        All references are compared by a single walk through their history, which ends once the remaining
+        commits are reachable from the base and all of the references. The history below the common merge bases
+        of all of them isn't listed at all.
+
+        :param base: revision specifier to compare against
+        :param refs: references or other revision specifiers to compare, all ``heads`` if None
+        :return: OrderedDict mapping each of the refs to an (ahead, behind) tuple
+        :raise ValueError: if a revision doesn't refer to a single commit"""
+        refs = list(self.heads if refs is None else refs)
+        result = OrderedDict()
+        if not refs:
+            return result
+        binshas = self._resolve_commits([base] + refs)
+        hexshas = sorted(set(bin_to_hex(binsha).decode('ascii') for binsha in binshas))
+        # commits reachable from all of them count for none. Merge bases are kept, as they might be compared,
+        # and unrelated histories have none
+        bases = self.git.merge_base(*hexshas, octopus=True, all=True, with_exceptions=False).split()
+        dag = CommitDAG.from_rev_list(self, hexshas + ['--not'] + [hexsha + '^@' for hexsha in bases])
+        for ref, counts in zip(refs, dag.ahead_behind_many(binshas[0], binshas[1:])):
+            result[ref] = counts
+        # END for each reference
+        return result
+
+    def refs_containing(self, commit, refs=None):
+        """Find the references which contain the given commit, like ``git branch --contains`` does.
+        All references are checked by a single walk, which doesn't visit the history below the commit.
+
+        :param commit: revision specifier of the commit to look for
+        :param refs: references or other revision specifiers to check, all ``heads`` if None
+        :return: list of those refs which are the commit or one of its descendants, in order
+        :raise ValueError: if a revision doesn't refer to a single commit"""
+        refs = list(self.heads if refs is None else refs)
+        if not refs:
+            return list()
+        binshas = self._resolve_commits([commit] + refs)
+        hexshas = [bin_to_hex(binsha).decode('ascii') for binsha in binshas]
+        dag = CommitDAG.from_rev_list(self, sorted(set(hexshas)) + ['--not', hexshas[0] + '^@'])
+        # refs whose commits were excluded are ancestors of the commit's parents
+        containing = set(dag.containing(binshas[0], [binsha for binsha in binshas[1:] if binsha in dag]))
+        return [ref for ref, binsha in zip(refs, binshas[1:]) if binsha in containing]
+
+    def name_revs(self, commits, **kwargs):
+        """Name many commits based on the closest references, like ``git name-rev --name-only`` and
+        ``Commit.name_rev``, using a single git name-rev process which reads the shas of all commits from its
+        standard input.
+
+        :param commits: Commit objects or revision specifiers
+        :param kwargs: additional arguments to be passed to git name-rev, like tags=True or refs='release/*'
+        :return: OrderedDict mapping each of the commits to its name, like 'master~2', or None if it has none
+        :raise ValueError: if a revision doesn't refer to a single commit"""
+        commits = list(commits)
+        result = OrderedDict()
+        if not commits:
+            return result
+        hexshas = [bin_to_hex(binsha).decode('ascii') for binsha in self._resolve_commits(commits)]
+        # git 2.39 renamed --stdin, which still works, but prints a warning
+        stdin = self.git.version_info[:2] < (2, 39) and '--stdin' or '--annotate-stdin'
+        with tempfile.TemporaryFile() as fp:
+            fp.write(''.join(hexsha + '\n' for hexsha in hexshas).encode('ascii'))
+            fp.seek(0)
+            lines = self.git.name_rev(stdin, istream=fp, name_only=True, **kwargs).splitlines()
+        # END close file
+        for commit, hexsha, line in zip(commits, hexshas, lines):
+            # the shas of commits without name are left as they are
+            result[commit] = line != hexsha and line or None
+        # END for each commit
+        return result
+
+    def describe_many(self, commits, **kwargs):
+        """Describe many commits based on the closest tags, like ``git describe``, passing as many of them
+        to each git describe process as fit into ``describe_batch_length`` characters.
+
+        :param commits: Commit objects or revision specifiers
+        :param kwargs: additional arguments to be passed to git describe, like tags=True. Pass always=True
+            to have commits without tag in their history described by their abbreviated sha
+        :return: OrderedDict mapping each of the commits to its description, like 'v1.0-2-g6dd0ec1'
+        :raise GitCommandError: if a commit can't be described"""
+        batches = list()
+        length = self.describe_batch_length
+        for commit in commits:
+            # each commit is followed by a space on the command line
+            commit_length = len(str(commit)) + 1
+            if length + commit_length > self.describe_batch_length:
+                batches.append(list())
+                length = 0
+            # END start new batch
+            batches[-1].append(commit)
+            length += commit_length
+        # END for each commit
+
+        result = OrderedDict()
+        for batch in batches:
+            for commit, description in zip(batch, self.git.describe(*batch, **kwargs).splitlines()):
+                result[commit] = description
+            # END for each commit
+        # END for each batch
+        return result
+
     def _get_daemon_export(self):
         filename = join(self.git_dir, self.DAEMON_EXPORT_FILE)
         return os.path.exists(filename)
@@ -0,0 +1,86 @@
+"""Performance tests for the git command and its utilities"""
+from __future__ import print_function
+from time import time
+import subprocess
+import sys
+
+from git.cmd import (
+    Git,
+    handle_process_output
+)
+
+from .lib import (
+    TestBigRepoR
+)
+
+
+class TestCmdPerformance(TestBigRepoR):
+
+    # amount of lines the producer writes to stdout and stderr each
+    nlines = 200000
+
+    def _produce(self, sep):
+        code = ("import os, sys; sep = %r.encode('ascii')\n"
+                "line = b'remote: Counting objects: 1234/5678, done.' + sep\n"
+                "chunk = line * 1000\n"
+                "for _ in range(%i):\n"
+                "    os.write(1, chunk)\n"
+                "    os.write(2, chunk)\n" % (sep.decode('ascii'), self.nlines // 1000))
+        return subprocess.Popen([sys.executable, '-c', code],
+                                stdin=None,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                shell=False)
+
+    def test_handle_process_output(self):
+        for sep, separators in ((b'\n', (b'\n', b'\r')),
+                                (b'\r', (b'\n', b'\r')),
+                                (b'\0', (b'\0',))):
+            for decode_streams in (True, False):
+                counts = [0, 0]
+
+                def stdout_handler(record):
+                    counts[0] += len(record) + 1
+
+                def stderr_handler(record):
+                    counts[1] += len(record) + 1
+
+                proc = self._produce(sep)
+                st = time()
+                handle_process_output(proc, stdout_handler, stderr_handler, lambda proc: proc.wait(),
+                                      decode_streams=decode_streams, separators=separators)
+                elapsed = time() - st
+                assert counts[0] == counts[1]
+
+                nbytes = counts[0] * 2
+                print("Dispatched %i records (%i KiB) separated by %r (decoded: %s) in %f s ( %f records / s )"
+                      % (self.nlines * 2, nbytes / 1024, sep, decode_streams, elapsed,
+                         (self.nlines * 2) / elapsed), file=sys.stderr)
+            # END for each decode mode
+        # END for each separator
+
+    def test_execute_overhead(self):
+        ni = 500
+        git = Git(self.gitrorepo.working_dir)
+        command = [git.GIT_PYTHON_GIT_EXECUTABLE, 'rev-parse', 'HEAD']
+
+        # spawning the process directly is the lower bound
+        st = time()
+        for _ in range(ni):
+            proc = subprocess.Popen(command, cwd=git.working_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            proc.communicate()
+        # END for each invocation
+        elapsed_popen = time() - st
+
+        for name, func in (("Git.execute", lambda: git.execute(command)),
+                           ("Git.rev_parse", lambda: git.rev_parse('HEAD')),
+                           ("Git.execute without stdout", lambda: git.execute(command, with_stdout=False))):
+            st = time()
+            for _ in range(ni):
+                func()
+            # END for each invocation
+            elapsed = time() - st
+            print("%s: %i invocations of 'git rev-parse HEAD' in %f s ( %f ms per invocation, "
+                  "%f ms more than plain Popen )" % (name, ni, elapsed, elapsed / ni * 1000,
+                                                     (elapsed - elapsed_popen) / ni * 1000), file=sys.stderr)
+        # END for each way to invoke git
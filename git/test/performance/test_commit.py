@@ -8,9 +8,18 @@ from io import BytesIO
 from time import time
 import sys
 
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
 from .lib import TestBigRepoRW
-from git import Commit
+from git import (
+    Commit,
+    Repo
+)
 from gitdb import IStream
+from gitdb.util import hex_to_bin
 from git.compat import xrange
 from git.test.test_commit import assert_commit_serialization
 
@@ -63,17 +72,202 @@ class TestPerformance(TestBigRepoRW):
         print("Traversed %i Commits in %s [s] ( %f commits/s )"
               % (nc, elapsed_time, nc / elapsed_time), file=sys.stderr)
 
-    def test_commit_iteration(self):
-        # bound to stream parsing performance
-        nc = 0
+    def test_commit_graph_traversal(self):
+        rwrepo = self.gitrwrepo
+        rwrepo.git.commit_graph('write', '--reachable')
+        head = rwrepo.git.rev_parse('HEAD')
+        results = list()
+        for use_commit_graph in (False, True):
+            repo = Repo(rwrepo.git_dir)
+            repo.use_commit_graph = use_commit_graph
+            assert (repo.commit_graph is not None) == use_commit_graph
+
+            # only parents are needed to walk the history
+            st = time()
+            nc = sum(1 for c in repo.commit(head).traverse(branch_first=False))
+            elapsed_time = time() - st
+            results.append(elapsed_time)
+            print("Traversed %i Commits %s the commit-graph in %s [s] ( %f commits/s )"
+                  % (nc, use_commit_graph and "with" or "without", elapsed_time, nc / elapsed_time), file=sys.stderr)
+            repo.git.clear_cache()
+        # END for each mode
+        print("The commit-graph makes traversals %f times faster" % (results[0] / results[1]), file=sys.stderr)
+
+    def test_bitmap_counting(self):
+        rwrepo = self.gitrwrepo
+        rwrepo.git.repack(a=True, d=True, write_bitmap_index=True)
+        hexshas = rwrepo.git.rev_list('HEAD', max_count=100).split()
+        pairs = list(zip(hexshas[1:], hexshas[:-1]))[::10]
+        results = list()
+        for use_reachability_bitmap in (False, True):
+            repo = Repo(rwrepo.git_dir)
+            repo.use_reachability_bitmap = use_reachability_bitmap
+            assert (repo.reachability_bitmap is not None) == use_reachability_bitmap
+
+            st = time()
+            counts = [(repo.count_commits(rev), repo.count_commits(rev, [base]),
+                       sum(1 for obj in repo.iter_objects(rev, [base]))) for base, rev in pairs]
+            elapsed_time = time() - st
+            results.append((counts, elapsed_time))
+            print("Counted commits and objects of %i revision ranges %s bitmaps in %s [s] ( %f ranges/s )"
+                  % (len(pairs), use_reachability_bitmap and "with" or "without", elapsed_time,
+                     len(pairs) / elapsed_time), file=sys.stderr)
+            repo.git.clear_cache()
+        # END for each mode
+        assert results[0][0] == results[1][0]
+        print("Reachability bitmaps make counting %f times faster" % (results[0][1] / results[1][1]), file=sys.stderr)
+
+    def test_commit_dag_queries(self):
+        repo = self.gitrorepo
+        hexshas = repo.git.rev_list('HEAD').split()
+        pairs = list(zip(hexshas[::7], hexshas[3::5]))[:50]
+
         st = time()
-        for c in Commit.iter_items(self.gitrorepo, self.gitrorepo.head):
-            nc += 1
-            self._query_commit_info(c)
-        # END for each traversed commit
+        expected = [(repo.is_ancestor(x, y), repo.merge_base(x, y)) for x, y in pairs]
+        elapsed_git = time() - st
+        print("Answered %i ancestry and merge-base queries with git in %s [s] ( %f queries/s )"
+              % (len(pairs), elapsed_git, len(pairs) / elapsed_git), file=sys.stderr)
+
+        st = time()
+        dag = repo.commit_dag('HEAD')
+        elapsed_build = time() - st
+        results = [(dag.is_ancestor(x, y), dag.merge_base(x, y)) for x, y in pairs]
         elapsed_time = time() - st
-        print("Iterated %i Commits in %s [s] ( %f commits/s )"
-              % (nc, elapsed_time, nc / elapsed_time), file=sys.stderr)
+        assert results == expected
+        print("Read %i commits into a CommitDAG in %s [s] and answered the same queries in %s [s] "
+              "( %f queries/s ), %f times faster"
+              % (len(dag), elapsed_build, elapsed_time - elapsed_build, len(pairs) / (elapsed_time - elapsed_build),
+                 elapsed_git / elapsed_time), file=sys.stderr)
+
+    def test_compare_refs(self):
+        repo = self.gitrorepo
+        git = repo.git
+        hexshas = git.rev_list('HEAD', max_count=100).split()[::3]
+        base = hexshas[len(hexshas) // 2]
+
+        st = time()
+        expected = list()
+        for hexsha in hexshas:
+            behind, ahead = git.rev_list('--left-right', '--count', '%s...%s' % (base, hexsha)).split()
+            expected.append((int(ahead), int(behind)))
+        # END for each revision
+        contained = [hexsha for hexsha in hexshas if repo.is_ancestor(base, hexsha)]
+        elapsed_git = time() - st
+        print("Compared %i revisions and checked their containment with one git process each in %s [s]"
+              % (len(hexshas), elapsed_git), file=sys.stderr)
+
+        st = time()
+        assert list(repo.compare_refs(base, hexshas).values()) == expected
+        assert repo.refs_containing(base, hexshas) == contained
+        elapsed_time = time() - st
+        print("Compared %i revisions and checked their containment with single walks in %s [s], %f times faster"
+              % (len(hexshas), elapsed_time, elapsed_git / elapsed_time), file=sys.stderr)
+
+    def test_name_revs(self):
+        repo = self.gitrorepo
+        commits = list(repo.iter_commits('HEAD', max_count=100))
+
+        st = time()
+        expected = [c.name_rev.split()[1] for c in commits]
+        elapsed_single = time() - st
+
+        st = time()
+        names = repo.name_revs(commits)
+        elapsed_time = time() - st
+        assert [name or 'undefined' for name in names.values()] == expected
+        print("Named %i commits with one git name-rev process each in %s [s], and with a single one in %s [s], "
+              "%f times faster" % (len(commits), elapsed_single, elapsed_time, elapsed_single / elapsed_time),
+              file=sys.stderr)
+
+    def test_commit_iteration(self):
+        # bound to stream parsing performance
+        results = list()
+        for prefetch in (False, True):
+            nc = 0
+            st = time()
+            for c in Commit.iter_items(self.gitrorepo, self.gitrorepo.head, prefetch=prefetch):
+                nc += 1
+                self._query_commit_info(c)
+            # END for each traversed commit
+            elapsed_time = time() - st
+            results.append(elapsed_time)
+            print("Iterated %i Commits %s in %s [s] ( %f commits/s )"
+                  % (nc, prefetch and "with prefetching" or "one by one", elapsed_time, nc / elapsed_time),
+                  file=sys.stderr)
+        # END for each mode
+        print("Prefetching commits is %f times faster" % (results[0] / results[1]), file=sys.stderr)
+
+    def test_commit_stats(self):
+        # bound to the amount of git processes
+        results = list()
+        for with_stats in (False, True):
+            nc = nf = 0
+            st = time()
+            for c in self.gitrorepo.iter_commits(self.gitrorepo.head, with_stats=with_stats):
+                nc += 1
+                nf += c.stats.total['files']
+            # END for each commit
+            elapsed_time = time() - st
+            results.append(elapsed_time)
+            print("Computed the stats of %i Commits, changing %i files, %s in %s [s] ( %f commits/s )"
+                  % (nc, nf, with_stats and "in one pass" or "one by one", elapsed_time, nc / elapsed_time),
+                  file=sys.stderr)
+        # END for each mode
+        print("Computing stats in one pass is %f times faster" % (results[0] / results[1]), file=sys.stderr)
+
+    def test_commit_records(self):
+        # bound to the memory and time needed per commit
+        results = list()
+        for use_records in (False, True):
+            if tracemalloc is not None:
+                tracemalloc.start()
+            # END measure memory
+            st = time()
+            if use_records:
+                items = list(self.gitrorepo.iter_commit_records(self.gitrorepo.head))
+            else:
+                items = list(self.gitrorepo.iter_commits(self.gitrorepo.head, prefetch=True))
+            # END handle type
+            for item in items:
+                item.author
+                item.committed_date
+            # END for each item
+            elapsed_time = time() - st
+            nbytes = 0
+            if tracemalloc is not None:
+                nbytes = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+            # END measure memory
+            nc = len(items)
+            results.append((elapsed_time, nbytes))
+            print("Read %i %s in %s [s] ( %f commits/s ), taking %i bytes each"
+                  % (nc, use_records and "CommitRecords" or "Commits", elapsed_time, nc / elapsed_time,
+                     nbytes / max(nc, 1)), file=sys.stderr)
+            del items
+        # END for each type
+        print("CommitRecords are read %f times faster and take %f times less memory"
+              % (results[0][0] / results[1][0], results[0][1] / max(results[1][1], 1)), file=sys.stderr)
+
+    def test_commit_deserialization(self):
+        # bound to parsing performance, the data of all commits is read beforehand
+        repo = self.gitrorepo
+        shas = [hex_to_bin(sha) for sha in repo.git.rev_list(repo.head).split()]
+        datas = [ostream.read() for ostream in repo.odb.stream_many(shas)]
+        nc = len(datas)
+
+        for attrs in ((), ('tree', 'parents'), ('author', 'committed_date'),
+                      ('tree', 'parents', 'author', 'committer', 'authored_date', 'message')):
+            st = time()
+            for binsha, data in zip(shas, datas):
+                c = Commit(repo, binsha)._deserialize(BytesIO(data))
+                for attr in attrs:
+                    getattr(c, attr)
+                # END for each attribute
+            # END for each commit
+            elapsed_time = time() - st
+            print("Deserialized %i Commits, accessing %s, in %f s ( %f commits / s )"
+                  % (nc, attrs and ', '.join(attrs) or "nothing", elapsed_time, nc / elapsed_time), file=sys.stderr)
+        # END for each set of attributes
 
     def test_commit_serialization(self):
         assert_commit_serialization(self.gitrwrepo, '58c78e6', True)
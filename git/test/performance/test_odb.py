@@ -1,8 +1,23 @@
 """Performance tests for object store"""
 from __future__ import print_function
+from io import BytesIO
 from time import time
+import os
+import random
 import sys
 
+from gitdb.base import IStream
+from gitdb.test.lib import with_rw_directory
+
+from git import Repo
+from git.db import (
+    AlternatesObjectDB,
+    CachingObjectDB,
+    GitCmdObjectDB,
+    GitNativeObjectDB,
+    GitDB
+)
+
 from .lib import (
     TestBigRepoR
 )
@@ -71,3 +86,222 @@ class TestObjDBPerformance(TestBigRepoR):
         for test_name, a, b in results:
             print("%s: %f s vs %f s, pure is %f times slower" % (test_name, a, b, b / a), file=sys.stderr)
         # END for each result
+
+    def test_info_many(self):
+        odb = self.gitrorepo.odb
+        shas = list()
+        for commit in self.gitrorepo.commit(self.gitrorepo.head).traverse():
+            shas.extend(item.binsha for item in commit.tree.traverse())
+            if len(shas) > 15000:
+                break
+        # END for each commit
+        ns = len(shas)
+
+        st = time()
+        sizes = [odb.info(sha).size for sha in shas]
+        elapsed_single = time() - st
+        print("%s: Retrieved %i object infos one by one in %g s ( %f infos / s )"
+              % (type(odb), ns, elapsed_single, ns / elapsed_single), file=sys.stderr)
+
+        st = time()
+        assert [info.size for info in odb.info_many(shas)] == sizes
+        elapsed_many = time() - st
+        print("%s: Retrieved %i object infos pipelined in %g s ( %f infos / s ), %f times faster"
+              % (type(odb), ns, elapsed_many, ns / elapsed_many, elapsed_single / elapsed_many), file=sys.stderr)
+
+    def test_stream_many(self):
+        odb = self.gitrorepo.odb
+        shas = list()
+        for commit in self.gitrorepo.commit(self.gitrorepo.head).traverse():
+            shas.extend(item.binsha for item in commit.tree.traverse() if item.type == 'blob')
+            if len(shas) > 15000:
+                break
+        # END for each commit
+        ns = len(shas)
+
+        st = time()
+        data_bytes = sum(len(odb.stream(sha).read()) for sha in shas)
+        elapsed_single = time() - st
+        print("%s: Retrieved %i blobs (%i KiB) one by one in %g s ( %f blobs / s )"
+              % (type(odb), ns, data_bytes / 1000, elapsed_single, ns / elapsed_single), file=sys.stderr)
+
+        st = time()
+        assert sum(len(ostream.read()) for ostream in odb.stream_many(shas)) == data_bytes
+        elapsed_many = time() - st
+        print("%s: Retrieved %i blobs (%i KiB) pipelined in %g s ( %f blobs / s ), %f times faster"
+              % (type(odb), ns, data_bytes / 1000, elapsed_many, ns / elapsed_many, elapsed_single / elapsed_many),
+              file=sys.stderr)
+
+    def test_native_random_access(self):
+        shas = list()
+        for commit in self.gitrorepo.commit(self.gitrorepo.head).traverse():
+            shas.extend(item.binsha for item in commit.tree.traverse() if item.type == 'blob')
+            if len(shas) > 15000:
+                break
+        # END for each commit
+        shas = list(set(shas))
+        random.seed(0)
+        random.shuffle(shas)
+        ns = len(shas)
+
+        results = list()
+        for odbt in (GitCmdObjectDB, GitDB, GitNativeObjectDB):
+            odb = Repo(self.gitrorepo.git_dir, odbt=odbt).odb
+            st = time()
+            data_bytes = sum(len(odb.stream(sha).read()) for sha in shas)
+            elapsed = time() - st
+            results.append((odbt, data_bytes, elapsed))
+            print("%s: Retrieved %i blobs (%i KiB) in random order in %g s ( %f blobs / s )"
+                  % (odbt.__name__, ns, data_bytes / 1000, elapsed, ns / elapsed), file=sys.stderr)
+        # END for each database type
+        assert len(set(data_bytes for odbt, data_bytes, elapsed in results)) == 1
+
+        native_elapsed = results[-1][2]
+        for odbt, data_bytes, elapsed in results[:-1]:
+            print("%s is %f times faster than %s" % (GitNativeObjectDB.__name__, elapsed / native_elapsed,
+                                                     odbt.__name__), file=sys.stderr)
+        # END for each result
+
+    @with_rw_directory
+    def test_alternates_random_access(self, rw_dir):
+        shas = list()
+        for commit in self.gitrorepo.commit(self.gitrorepo.head).traverse():
+            shas.extend(item.binsha for item in commit.tree.traverse() if item.type == 'blob')
+            if len(shas) > 5000:
+                break
+        # END for each commit
+        shas = list(set(shas))
+        random.seed(0)
+        random.shuffle(shas)
+        ns = len(shas)
+
+        # a fork without objects of its own, like those of a fork network
+        fork_dir = os.path.join(rw_dir, 'fork')
+        self.gitrorepo.git.clone('--shared', '--bare', self.gitrorepo.git_dir, fork_dir)
+        results = list()
+        for odbt in (GitCmdObjectDB, GitNativeObjectDB, AlternatesObjectDB):
+            odb = Repo(fork_dir, odbt=odbt).odb
+            st = time()
+            data_bytes = sum(len(odb.stream(sha).read()) for sha in shas)
+            elapsed = time() - st
+            results.append((odbt, data_bytes, elapsed))
+            print("%s: Retrieved %i blobs (%i KiB) of an alternate in random order in %g s ( %f blobs / s )"
+                  % (odbt.__name__, ns, data_bytes / 1000, elapsed, ns / elapsed), file=sys.stderr)
+        # END for each database type
+        assert len(set(data_bytes for odbt, data_bytes, elapsed in results)) == 1
+
+        alternates_elapsed = results[-1][2]
+        for odbt, data_bytes, elapsed in results[:-1]:
+            print("%s is %f times faster than %s" % (AlternatesObjectDB.__name__, elapsed / alternates_elapsed,
+                                                     odbt.__name__), file=sys.stderr)
+        # END for each result
+
+    def test_caching_traversal(self):
+        results = list()
+        for odbt in (GitCmdObjectDB, CachingObjectDB, CachingObjectDB.wrapping(GitNativeObjectDB)):
+            repo = Repo(self.gitrorepo.git_dir, odbt=odbt)
+            commits = list(repo.commit(repo.head).traverse())[:1000]
+
+            # walk all trees of all commits, which mostly consist of the same trees
+            st = time()
+            nt = 0
+            for commit in commits:
+                for item in commit.tree.traverse():
+                    nt += 1
+                # END for each item
+            # END for each commit
+            elapsed = time() - st
+            results.append(elapsed)
+
+            stats = ''
+            if isinstance(repo.odb, CachingObjectDB):
+                odb = repo.odb
+                stats = ", %i info hits, %i info misses, %i stream hits, %i stream misses" \
+                    % (odb.info_hits, odb.info_misses, odb.stream_hits, odb.stream_misses)
+            # END get statistics
+            print("%s: Retrieved %i objects from %i commits in %g s ( %f objects / s )%s"
+                  % (odbt.__name__, nt, len(commits), elapsed, nt / elapsed, stats), file=sys.stderr)
+            repo.git.clear_cache()
+        # END for each database type
+        print("Caching is %f times faster, %f times when wrapping %s" % (results[0] / results[1],
+              results[0] / results[2], GitNativeObjectDB.__name__), file=sys.stderr)
+
+    def test_delta_base_cache(self):
+        results = list()
+        for max_delta_base_bytes in (0, GitNativeObjectDB.max_delta_base_bytes):
+            repo = Repo(self.gitrorepo.git_dir, odbt=GitNativeObjectDB)
+            repo.odb.delta_base_cache.max_bytes = max_delta_base_bytes
+            shas = [commit.tree.binsha for commit in repo.iter_commits(repo.head, max_count=2000)]
+
+            # consecutive versions of the root tree are likely to share the bases of their deltas
+            st = time()
+            data_bytes = sum(len(repo.odb.stream(sha).read()) for sha in shas)
+            elapsed = time() - st
+            results.append(elapsed)
+
+            cache = repo.odb.delta_base_cache
+            print("Delta base cache of %i KiB: Retrieved %i trees (%i KiB) in %g s ( %f trees / s ), "
+                  "%i of %i bases cached, %f deltas applied per object, %i at most"
+                  % (max_delta_base_bytes / 1024, len(shas), data_bytes / 1024, elapsed, len(shas) / elapsed,
+                     cache.hits, cache.hits + cache.misses, cache.depth / max(cache.chains, 1), cache.max_depth),
+                  file=sys.stderr)
+            repo.git.clear_cache()
+        # END for each cache size
+        print("The delta base cache makes reading trees %f times faster" % (results[0] / results[1]), file=sys.stderr)
+
+    @with_rw_directory
+    def test_pack_writer(self, rw_dir):
+        ni = 5000
+        datas = [('blob number %i\n' % i).encode('ascii') * 10 for i in range(ni)]
+        results = list()
+        for use_pack_writer in (False, True):
+            odb = Repo.init(os.path.join(rw_dir, 'repo_%s' % use_pack_writer)).odb
+            st = time()
+            if use_pack_writer:
+                with odb.pack_writer():
+                    for data in datas:
+                        odb.store(IStream(b'blob', len(data), BytesIO(data)))
+                    # END for each blob
+                # END write pack
+            else:
+                for data in datas:
+                    odb.store(IStream(b'blob', len(data), BytesIO(data)))
+                # END for each blob
+            # END handle mode
+            elapsed = time() - st
+            results.append(elapsed)
+            print("Stored %i blobs %s in %g s ( %f blobs / s )"
+                  % (ni, use_pack_writer and "in a pack" or "as loose objects", elapsed, ni / elapsed), file=sys.stderr)
+        # END for each mode
+        print("Writing a pack is %f times faster" % (results[0] / results[1]), file=sys.stderr)
+
+    @with_rw_directory
+    def test_store_many(self, rw_dir):
+        ni = 2000
+        datas = [os.urandom(256) * 64 for i in range(ni)]
+        odb = Repo.init(os.path.join(rw_dir, 'repo')).odb
+        results = dict()
+        for store_threads in (1, 4):
+            odb.store_threads = store_threads
+            for use_pack_writer in (False, True):
+                istreams = [IStream(b'blob', len(data), BytesIO(data)) for data in datas]
+                st = time()
+                if use_pack_writer:
+                    with odb.pack_writer():
+                        list(odb.store_many(istreams))
+                    # END write pack
+                else:
+                    list(odb.store_many(istreams))
+                # END handle mode
+                elapsed = time() - st
+                results[(store_threads, use_pack_writer)] = elapsed
+                print("Stored %i blobs of %i KiB %s with %i threads in %g s ( %f blobs / s )"
+                      % (ni, len(datas[0]) / 1024, use_pack_writer and "in a pack" or "as loose objects",
+                         store_threads, elapsed, ni / elapsed), file=sys.stderr)
+            # END for each mode
+        # END for each amount of threads
+        for use_pack_writer in (False, True):
+            print("Storing in parallel %s is %f times faster"
+                  % (use_pack_writer and "in a pack" or "as loose objects",
+                     results[(1, use_pack_writer)] / results[(4, use_pack_writer)]), file=sys.stderr)
+        # END for each mode
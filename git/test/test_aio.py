@@ -0,0 +1,136 @@
+# test_aio.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+import sys
+
+from nose import SkipTest
+
+from git.test.lib import (
+    TestBase,
+    fixture_path
+)
+from git import (
+    Git,
+    GitCommandError,
+    GitCommandNotFound
+)
+
+if sys.version_info >= (3, 7):
+    import asyncio
+    from git.aio import AsyncGit
+# END handle python version
+
+
+class TestAsyncGit(TestBase):
+
+    def setUp(self):
+        if sys.version_info < (3, 7):
+            raise SkipTest("asyncio support requires python 3.7")
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.agit = AsyncGit(self.rorepo.git)
+
+    def tearDown(self):
+        self._run(self.agit.close())
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def _collect(self, async_iterator):
+        items = list()
+        while True:
+            try:
+                items.append(self._run(async_iterator.__anext__()))
+            except StopAsyncIteration:
+                break
+        # END for each item
+        return items
+
+    def test_execute(self):
+        git = self.rorepo.git
+        assert self._run(self.agit.rev_parse('HEAD')) == git.rev_parse('HEAD')
+        assert self._run(self.agit.log(n=1, format='%H')) == git.log(n=1, format='%H')
+        status, stdout, stderr = self._run(self.agit.version(with_extended_output=True))
+        assert status == 0 and stdout.startswith('git version') and stderr == ''
+        assert self._run(self.agit.cat_file('-t', 'HEAD', stdout_as_string=False)) == b'commit'
+
+        with open(fixture_path("cat_file_blob"), 'rb') as fp:
+            data = fp.read()
+        assert self._run(self.agit.hash_object(istream=data, stdin=True)) == \
+            "70c379b63ffa0795fdbfbc128e5a2818397b7ef8"
+
+        self.failUnlessRaises(GitCommandError, self._run, self.agit.this_does_not_exist())
+        cmd = self.agit.this_does_not_exist(with_exceptions=False, with_extended_output=True)
+        status, stdout, stderr = self._run(cmd)
+        assert status != 0 and stderr
+
+        with Git.measure_commands() as counters:
+            self._run(self.agit.rev_parse('HEAD'))
+            self._run(self.agit.get_object_header('HEAD'))
+        # END measure
+        assert counters.by_command['rev-parse'].processes == 1
+        assert counters.by_command['cat-file'].requests == 1
+
+        agit = AsyncGit(Git(self.rorepo.working_dir))
+        prev_cmd = Git.GIT_PYTHON_GIT_EXECUTABLE
+        Git.GIT_PYTHON_GIT_EXECUTABLE = "some-git-binary-which-doesnt-exist"
+        try:
+            self.failUnlessRaises(GitCommandNotFound, self._run, agit.version())
+        finally:
+            Git.GIT_PYTHON_GIT_EXECUTABLE = prev_cmd
+        # END reset executable
+
+    def test_as_process(self):
+        git = self.rorepo.git
+        proc = self._run(self.agit.ls_tree('HEAD', r=True, as_process=True))
+        lines = self._collect(proc.iter_stdout())
+        assert b''.join(lines).decode('utf-8') == git.ls_tree('HEAD', r=True) + '\n'
+        assert self._collect(proc.iter_stderr()) == []
+        assert self._run(proc.wait()) == 0
+
+        proc = self._run(self.agit.this_does_not_exist(as_process=True))
+        self.failUnlessRaises(GitCommandError, self._run, proc.wait())
+
+    def test_persistent_cat_file(self):
+        git = self.rorepo.git
+        shas = [item.hexsha for item in self.rorepo.head.commit.tree.traverse()]
+
+        for sha in shas:
+            assert self._run(self.agit.get_object_header(sha)) == git.get_object_header(sha)
+            assert self._run(self.agit.get_object_data(sha)) == git.get_object_data(sha)
+        # END for each sha
+        self.failUnlessRaises(ValueError, self._run, self.agit.get_object_header('0' * 40))
+
+        data_list = self._run(asyncio.gather(*[self.agit.get_object_data(sha) for sha in shas]))
+        assert data_list == [git.get_object_data(sha) for sha in shas]
+
+        # streams not read to the end terminate their process
+        hexsha, typename, size, stream = self._run(self.agit.stream_object_data(shas[0]))
+        assert self._run(stream.read(1)) == git.get_object_data(shas[0])[3][:1]
+        proc = self.agit._cat_file_all._proc
+        del stream
+        assert self._run(self.agit.get_object_data(shas[1])) == git.get_object_data(shas[1])
+        self._run(self.agit.close())
+        assert proc.returncode is not None
+
+        # cleared processes are terminated, those in use once they are released
+        self._run(self.agit.get_object_header(shas[0]))
+        header_proc = self.agit._cat_file_header._proc
+        hexsha, typename, size, stream = self._run(self.agit.stream_object_data(shas[0]))
+        proc = self.agit._cat_file_all._proc
+        self.agit.clear_cache()
+        assert self._run(stream.read()) == git.get_object_data(shas[0])[3] and proc.returncode is None
+        self._run(self.agit.close())
+        assert header_proc.returncode is not None and proc.returncode is not None
+
+        # they work across loops
+        self._run(self.agit.get_object_header(shas[0]))
+        self._run(self.agit.close())
+        self.loop.close()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        assert self._run(self.agit.get_object_header(shas[0])) == git.get_object_header(shas[0])
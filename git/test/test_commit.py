@@ -16,7 +16,10 @@ from git.test.lib import (
 )
 from git import (
     Commit,
+    CommitRecord,
+    ActorTable,
     Actor,
+    Git
 )
 from gitdb import IStream
 from gitdb.test.lib import with_rw_directory
@@ -133,6 +136,63 @@ class TestCommit(TestBase):
         assert commit.committer_tz_offset == 14400, commit.committer_tz_offset
         assert commit.message == "initial project\n"
 
+    @with_rw_directory
+    def test_iter_stats(self, rw_dir):
+        repo = Repo.init(rw_dir)
+        git = repo.git
+        git.update_environment(GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@example.com',
+                               GIT_COMMITTER_NAME='c', GIT_COMMITTER_EMAIL='c@example.com')
+
+        def commit(message, **files):
+            for name, data in files.items():
+                path = os.path.join(rw_dir, name)
+                if data is None:
+                    git.rm(name)
+                    continue
+                with open(path, 'wb') as fp:
+                    fp.write(data)
+                # END write file
+                git.add(name)
+            # END for each file
+            git.commit(m=message, allow_empty=True)
+
+        # a root commit, binary files, renames, removals, an empty commit and a merge with changes
+        commit('root', a=b'1\n2\n3\n', b=b'\0binary', c=b'x\n' * 20, e=b'e\n')
+        git.checkout('-b', 'side')
+        commit('side', a=b'1\n2\n3\n4\n', d=b'side\n')
+        git.checkout('master')
+        git.mv('c', 'renamed c')
+        commit('rename', b=b'\0changed', e=None)
+        commit('empty')
+        git.merge('side', m='merge', no_ff=True)
+        commit('after merge', d=b'side\nmaster\n')
+
+        for version_info in (git.version_info, (2, 30)):
+            git._version_info = version_info
+            for kwargs in (dict(), dict(prefetch=True), dict(paths='d'), dict(max_count=2, skip=1),
+                           dict(paths='d', first_parent=True)):
+                with Git.measure_commands() as counters:
+                    commits = list(repo.iter_commits('master', with_stats=True, **kwargs))
+                # END measure
+                assert counters.totals.processes == 1
+                assert commits == list(repo.iter_commits('master', **kwargs)) and commits
+                stats = list(repo.iter_stats('master', **kwargs))
+                assert [commit for commit, commit_stats in stats] == commits
+                for commit, commit_stats in stats:
+                    expected = commit._compute_stats()
+                    assert (commit_stats.total, commit_stats.files) == (expected.total, expected.files)
+                # END for each commit
+            # END for each set of arguments
+        # END for each way to show diffs of merges
+        del git._version_info
+
+        merge = repo.commit('master~1')
+        assert len(merge.parents) == 2 and list(merge.stats.files) == ['a', 'd']
+        assert next(repo.iter_commits('master~1', with_stats=True)).stats.files == merge.stats.files
+        assert repo.commit('master~2').stats.total['files'] == 0
+        assert repo.commit('master~3').stats.total['files'] == 3
+        assert sorted(repo.commit('master~4').stats.files) == ['a', 'b', 'c', 'e']
+
     def test_unicode_actor(self):
         # assure we can parse unicode actors correctly
         name = u"Üäöß ÄußÉ"
@@ -207,6 +267,121 @@ class TestCommit(TestBase):
         # pretty not allowed
         self.failUnlessRaises(ValueError, Commit.iter_items, self.rorepo, 'master', pretty="raw")
 
+    @with_rw_directory
+    def test_iteration_prefetch(self, rw_dir):
+        repo = Repo.init(rw_dir)
+        git = repo.git
+        git.update_environment(GIT_AUTHOR_NAME=u'Sebastian Thiel ä', GIT_AUTHOR_EMAIL='a@example.com',
+                               GIT_COMMITTER_NAME='c', GIT_COMMITTER_EMAIL='c@example.com',
+                               GIT_AUTHOR_DATE='1500000000 +0200', GIT_COMMITTER_DATE='1500000100 -0100')
+        tree = git.write_tree()
+        message_path = os.path.join(rw_dir, 'message')
+        parents = list()
+        messages = (b'', b'no newline', b'\n\nleading blank lines\ntrailing spaces   \n\n\n',
+                    u'unicode äöü\n\n\tindented body\n'.encode('utf-8'))
+        for message in messages:
+            with open(message_path, 'wb') as fp:
+                fp.write(message)
+            # END write message
+            args = [tree]
+            for parent in parents[-2:]:
+                args.extend(('-p', parent))
+            # END for each parent
+            parents.append(git.commit_tree(*args, F=message_path))
+        # END for each message
+        with open(message_path, 'wb') as fp:
+            fp.write(u'latin-1 ä\n'.encode('iso-8859-1'))
+        # END write message
+        git.update_environment(GIT_AUTHOR_NAME=u'a', GIT_COMMITTER_NAME='c')
+        git.config('i18n.commitEncoding', 'ISO-8859-1')
+        latin_sha = git.commit_tree(tree, '-p', parents[-1], F=message_path)
+        git.update_ref('refs/heads/master', latin_sha)
+
+        attrs = ('tree', 'parents', 'author', 'authored_date', 'author_tz_offset', 'committer',
+                 'committed_date', 'committer_tz_offset', 'message')
+        for kwargs in (dict(), dict(max_count=3), dict(skip=1, first_parent=True)):
+            with Git.measure_commands() as counters:
+                commits = list(repo.iter_commits('master', prefetch=True, **kwargs))
+                values = [[getattr(commit, attr) for attr in attrs] for commit in commits]
+            # END measure
+            assert counters.totals.processes == 1 and counters.totals.requests == 0
+            expected = list(repo.iter_commits('master', **kwargs))
+            assert commits == expected and commits
+            for commit, commit_values in zip(expected, values):
+                assert [getattr(commit, attr) for attr in attrs] == commit_values
+            # END for each commit
+        # END for each set of arguments
+
+        # messages are kept as they are, and converted from the encoding of their commit
+        commits = list(repo.iter_commits('master', prefetch=True))
+        assert commits[0].encoding == 'ISO-8859-1' and commits[0].message == u'latin-1 ä\n'
+        assert next(repo.iter_commit_records('master')).message == u'latin-1 ä\n'
+        assert sorted(commit.message for commit in commits[1:]) == sorted(m.decode('utf-8') for m in messages)
+        assert commits[1].author.name == u'Sebastian Thiel ä' and commits[1].committer_tz_offset == 3600
+        self.failUnlessRaises(ValueError, Commit.iter_items, repo, 'master', prefetch=True, format='%H')
+
+        # fields are split correctly regardless of the chunks they are read in
+        data = b'a\0bc\0\0def\0tail'
+        prefetch_chunk_size = Commit._prefetch_chunk_size
+        for chunk_size in (1, 2, 3, 100):
+            Commit._prefetch_chunk_size = chunk_size
+            try:
+                assert list(Commit._iter_null_terminated(BytesIO(data))) == [b'a', b'bc', b'', b'def']
+                assert list(Commit._iter_null_terminated(BytesIO(data), final=True))[-1] == b'tail'
+            finally:
+                Commit._prefetch_chunk_size = prefetch_chunk_size
+            # END restore chunk size
+        # END for each chunk size
+
+    @with_rw_directory
+    def test_commit_records(self, rw_dir):
+        repo = Repo.init(rw_dir)
+        git = repo.git
+        tree = git.write_tree()
+        shas = list()
+        for i, (author, committer) in enumerate(((u'ä', 'c'), ('a', 'c'), (u'ä', 'a'), ('a', 'c'))):
+            git.update_environment(GIT_AUTHOR_NAME=author, GIT_AUTHOR_EMAIL='%s@example.com' % author,
+                                   GIT_COMMITTER_NAME=committer, GIT_COMMITTER_EMAIL='c@example.com',
+                                   GIT_AUTHOR_DATE='%i +0200' % (1500000000 + i),
+                                   GIT_COMMITTER_DATE='%i -0300' % (1500000100 + i))
+            args = [tree]
+            for parent in shas[-2:]:
+                args.extend(('-p', parent))
+            # END for each parent
+            shas.append(git.commit_tree(*args, m='commit %i' % i))
+        # END for each commit
+        git.update_ref('refs/heads/master', shas[-1])
+
+        actors = ActorTable()
+        with Git.measure_commands() as counters:
+            records = list(repo.iter_commit_records('master', actors=actors))
+        # END measure
+        assert counters.totals.processes == 1 and counters.totals.requests == 0
+        commits = list(repo.iter_commits('master'))
+        assert [record.hexsha for record in records] == [commit.hexsha for commit in commits]
+        assert len(actors) == 4 and records[0].author is records[2].author
+
+        attrs = ('tree', 'parents', 'author', 'authored_date', 'author_tz_offset', 'committer',
+                 'committed_date', 'committer_tz_offset')
+        for record, commit in zip(records, commits):
+            assert record == commit and record.binsha == commit.binsha
+            assert record.tree_binsha == commit.tree.binsha
+            assert record.parent_binshas == tuple(parent.binsha for parent in commit.parents)
+            assert record.author == commit.author and record.committer == commit.committer
+            with Git.measure_commands() as counters:
+                converted = record.to_commit()
+                values = [getattr(converted, attr) for attr in attrs]
+            # END measure
+            assert counters.totals.requests == 0
+            assert values == [getattr(commit, attr) for attr in attrs]
+            assert record.message == commit.message == converted.message
+            assert converted.author is record.author and converted.encoding == commit.encoding
+        # END for each record
+        assert records[0].author_tz_offset == -7200 and records[0].committer_tz_offset == 10800
+        assert len(set(records)) == len(records) and records[0] == commits[0]
+        assert list(CommitRecord.iter_items(repo, 'master', max_count=1)) == records[:1]
+        self.failUnlessRaises(ValueError, next, CommitRecord.iter_items(repo, 'master', format='%H'))
+
     def test_rev_list_bisect_all(self):
         """
         'git rev-list --bisect-all' returns additional information
@@ -307,6 +482,53 @@ class TestCommit(TestBase):
         # it appears
         cmt.author.__repr__()
 
+    def test_lazy_deserialization(self):
+        data = b"\n".join((b"tree 4b825dc642cb6eb9a060e54bf8d69288fbee4904",
+                           b"parent 1111111111111111111111111111111111111111",
+                           b"parent 2222222222222222222222222222222222222222",
+                           u"author Sébastien <s@example.com> 1500000000 +0200".encode('iso-8859-1'),
+                           b"committer c <c@example.com> 1500000100 -0100",
+                           b"mergetag object 1111111111111111111111111111111111111111",
+                           b" type commit",
+                           b"encoding ISO-8859-1",
+                           b"unknown header",
+                           b"",
+                           u"résumé\n\nbody\n".encode('iso-8859-1')))
+        cmt = Commit(self.rorepo, Commit.NULL_BIN_SHA)
+        cmt._deserialize(BytesIO(data))
+        assert cmt.encoding == 'ISO-8859-1' and cmt.gpgsig is None
+        assert cmt.tree.hexsha == '4b825dc642cb6eb9a060e54bf8d69288fbee4904'
+
+        # the other attributes are decoded once they are accessed
+        for attr in ('parents', 'author', 'committed_date', 'message'):
+            self.failUnlessRaises(AttributeError, getattr(Commit, attr).__get__, cmt, Commit)
+        # END for each lazy attribute
+        assert [parent.hexsha[:1] for parent in cmt.parents] == ['1', '2']
+        self.failUnlessRaises(AttributeError, Commit.author.__get__, cmt, Commit)
+        assert cmt.author.name == u'Sébastien' and cmt.author_tz_offset == -7200
+        self.failUnlessRaises(AttributeError, Commit.committer.__get__, cmt, Commit)
+        assert cmt.committed_date == 1500000100 and cmt.committer.email == 'c@example.com'
+        assert Commit._raw.__get__(cmt, Commit)
+        assert cmt.message == u'résumé\n\nbody\n'
+        # the raw data is released once everything was decoded from it
+        self.failUnlessRaises(AttributeError, Commit._raw.__get__, cmt, Commit)
+
+        # attributes which are set already, like by prefetching, are kept
+        cmt._deserialize(BytesIO(b"tree 4b825dc642cb6eb9a060e54bf8d69288fbee4904\n"
+                                 b"author a <a@example.com> 1 +0000\ncommitter c <c@example.com> 2 +0000\n"))
+        assert len(cmt.parents) == 2 and cmt.message == u'résumé\n\nbody\n' and cmt.author.name == u'Sébastien'
+        self.failUnlessRaises(AttributeError, Commit._raw.__get__, cmt, Commit)
+        cmt = Commit(self.rorepo, Commit.NULL_BIN_SHA, author=Actor('p', 'p@example.com'), message=u'prefetched')
+        cmt._deserialize(BytesIO(b"tree 4b825dc642cb6eb9a060e54bf8d69288fbee4904\n"
+                                 b"author a <a@example.com> 1 +0000\ncommitter c <c@example.com> 2 +0000\n"))
+        assert cmt.author.name == 'p' and cmt.message == u'prefetched'
+        assert cmt.parents == () and cmt.authored_date == 1 and cmt.committer.name == 'c' and cmt.encoding == 'UTF-8'
+
+        # unknown encodings fall back to the default one
+        cmt = Commit(self.rorepo, Commit.NULL_BIN_SHA)
+        cmt._deserialize(BytesIO(data.replace(b"ISO-8859-1", b"unknown-encoding")))
+        assert cmt.encoding == 'unknown-encoding' and cmt.message.startswith(u'r')
+
     def test_invalid_commit(self):
         cmt = self.rorepo.commit()
         cmt._deserialize(open(fixture_path('commit_invalid_data'), 'rb'))
@@ -378,6 +600,8 @@ JzJMZDRLQLFvnzqZuCjE
                     
         repo_mock = RepoMock(cstream.getvalue())
         for field in Commit.__slots__:
+            if field.startswith('_'):
+                continue    # private caches
             c = Commit(repo_mock, b'x' * 20)
             assert getattr(c, field) is not None
 
@@ -389,3 +613,95 @@ JzJMZDRLQLFvnzqZuCjE
         assert commit.authored_datetime == datetime(2009, 10, 8, 16, 17, 5, tzinfo=utc), commit.authored_datetime
         assert commit.committed_datetime == datetime(2009, 10, 8, 20, 22, 51, tzinfo=tzoffset(-7200))
         assert commit.committed_datetime == datetime(2009, 10, 8, 18, 22, 51, tzinfo=utc), commit.committed_datetime
+
+    @with_rw_directory
+    def test_commit_graph(self, rw_dir):
+        repo = Repo.init(rw_dir)
+        git = repo.git
+        tree = git.write_tree()
+
+        def commit(date, *parents):
+            git.update_environment(GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@example.com',
+                                   GIT_COMMITTER_NAME='c', GIT_COMMITTER_EMAIL='c@example.com',
+                                   GIT_AUTHOR_DATE='%i +0200' % (1500000000 + date),
+                                   GIT_COMMITTER_DATE='%i +0200' % (1500000000 + date))
+            args = [tree]
+            for parent in parents:
+                args.extend(('-p', parent))
+            # END for each parent
+            return git.commit_tree(*args, m='commit at %i' % date)
+
+        # merges, an octopus merge and commits of the same time, whose order depends on when they are queued
+        root = commit(1000)
+        a, b, c = commit(2000, root), commit(3000, root), commit(3000, root)
+        octopus = commit(4000, a, b, c)
+        d = commit(3000, b)
+        tip = commit(5000, octopus, d)
+        git.update_ref('refs/heads/master', tip)
+        git.commit_graph('write', '--reachable')
+
+        def assert_graph_matches_git(graph_repo):
+            graph = graph_repo.commit_graph
+            assert graph is not None and len(graph) == len(git.rev_list('--all').split())
+            shas = git.rev_list('--all').split()
+            for hexsha in shas:
+                c = graph_repo.commit(hexsha)
+                parsed = Commit(repo, c.binsha)
+                parsed._deserialize(BytesIO(repo.odb.stream(c.binsha).read()))
+                assert (c.parents, c.tree, c.committed_date) == \
+                    (parsed.parents, parsed.tree, parsed.committed_date)
+                assert c.size is not None      # everything else is still read from the object
+
+                expected = git.rev_list(hexsha, skip=1).split()
+                assert [p.hexsha for p in c.iter_parents()] == expected
+                assert [p.hexsha for p in c.iter_parents(skip=2, max_count=2)] == expected[1:3]
+                assert set(p.hexsha for p in c.traverse()) == set(expected)
+                for other in shas:
+                    assert graph_repo.is_ancestor(other, hexsha) == \
+                        (git.merge_base(other, hexsha, is_ancestor=True, with_exceptions=False,
+                                        with_extended_output=True)[0] == 0)
+                # END for each other commit
+            # END for each commit
+
+        assert_graph_matches_git(Repo(rw_dir))
+        generation = repo.commit_graph.generation
+        position = repo.commit_graph.position
+        assert generation(position(repo.commit(tip).binsha)) == 4
+        assert generation(position(repo.commit(root).binsha)) == 1
+
+        # negative answers of the graph are final, too
+        for revs, nprocesses in (((repo.commit(tip), repo.commit(root)), 0), (('master', root[:7]), 1)):
+            with Git.measure_commands() as counters:
+                assert not repo.is_ancestor(*revs)
+            # END measure
+            assert counters.totals.processes == nprocesses and 'merge-base' not in counters.by_command
+        # END for each kind of revision
+
+        # commits which are not in the graph are read from the object database
+        new_tip = commit(6000, tip)
+        git.update_ref('refs/heads/master', new_tip)
+        assert repo.commit_graph.position(repo.commit(new_tip).binsha) is None
+        assert repo.commit(new_tip).parents == (repo.commit(tip), )
+        assert [c.hexsha for c in repo.commit(new_tip).iter_parents()] == git.rev_list(new_tip, skip=1).split()
+        assert repo.is_ancestor(tip, new_tip) and not repo.is_ancestor(new_tip, tip)
+
+        # chains of graphs
+        git.commit_graph('write', '--split=no-merge', '--reachable')
+        assert not os.path.exists(os.path.join(repo.git_dir, 'objects', 'info', 'commit-graph'))
+        git.update_ref('refs/heads/master', commit(7000, new_tip))
+        git.commit_graph('write', '--split=no-merge', '--reachable')
+        chain_repo = Repo(rw_dir)
+        assert len(chain_repo.commit_graph.paths) > 1
+        assert_graph_matches_git(chain_repo)
+
+        # the graph is ignored if the history is altered
+        git.replace('--graft', tip, root)
+        assert Repo(rw_dir).commit_graph is None
+        Repo.use_commit_graph = False
+        try:
+            git.replace('-d', tip)
+            assert Repo(rw_dir).commit_graph is None
+        finally:
+            Repo.use_commit_graph = True
+        # END reset configuration
+        assert Repo(rw_dir).commit_graph is not None
@@ -4,9 +4,30 @@
 # This module is part of GitPython and is released under
 # the BSD License: http://www.opensource.org/licenses/bsd-license.php
 from git.test.lib import TestBase
-from git.db import GitCmdObjectDB
+from git.db import (
+    AlternatesObjectDB,
+    CachingObjectDB,
+    GitCmdObjectDB,
+    GitNativeObjectDB,
+    GitDB
+)
+from git.pack import (
+    DeltaBaseCache,
+    PackFile,
+    PackIndex,
+    PackWriter,
+    apply_delta
+)
+from git import Repo
+from gitdb.base import IStream
+from gitdb.test.lib import with_rw_directory
 from gitdb.util import bin_to_hex
-from git.exc import BadObject
+from git.exc import (
+    BadObject,
+    ParseError
+)
+from io import BytesIO
+import threading
 import os
 
 
@@ -24,3 +45,460 @@ class TestDB(TestBase):
         # fails with BadObject
         for invalid_rev in ("0000", "bad/ref", "super bad"):
             self.failUnlessRaises(BadObject, gdb.partial_to_complete_sha_hex, invalid_rev)
+
+    def test_info_many(self):
+        gdb = GitCmdObjectDB(os.path.join(self.rorepo.git_dir, 'objects'), self.rorepo.git)
+        shas = [item.binsha for item in self.rorepo.head.commit.tree.traverse()]
+        infos = list(gdb.info_many(shas))
+        assert [info.binsha for info in infos] == shas
+        for info in infos:
+            assert tuple(gdb.info(info.binsha)) == tuple(info)
+        # END for each info
+
+    def test_stream_many(self):
+        gdb = GitCmdObjectDB(os.path.join(self.rorepo.git_dir, 'objects'), self.rorepo.git)
+        shas = [item.binsha for item in self.rorepo.head.commit.tree.traverse()]
+        nstreams = 0
+        # each stream must be read before the next one is requested
+        for ostream in gdb.stream_many(shas):
+            sha = shas[nstreams]
+            assert ostream.binsha == sha
+            assert ostream.read() == gdb.stream(sha).read()
+            nstreams += 1
+        # END for each stream
+        assert nstreams == len(shas)
+
+    @with_rw_directory
+    def test_native_db(self, rw_dir):
+        # a packed clone, with deltas
+        repo = Repo.clone_from(self.rorepo.git_dir, os.path.join(rw_dir, 'repo'), no_local=True)
+        repo.git.repack(a=True, d=True, f=True)
+        objects_dir = os.path.join(repo.git_dir, 'objects')
+        ndb = GitNativeObjectDB(objects_dir, repo.git)
+        gdb = GitCmdObjectDB(objects_dir, repo.git)
+        assert len(ndb._packs) == 1
+
+        shas = list()
+        for commit in repo.iter_commits('HEAD'):
+            shas.append(commit.binsha)
+            shas.extend(item.binsha for item in commit.tree.traverse())
+        # END for each commit
+        for sha in shas:
+            assert tuple(ndb.info(sha)) == tuple(gdb.info(sha))
+            ostream = ndb.stream(sha)
+            assert ostream.read() == gdb.stream(sha).read()
+            assert ndb.has_object(sha)
+        # END for each sha
+        assert [tuple(info) for info in ndb.info_many(shas[:10])] == [tuple(gdb.info(sha)) for sha in shas[:10]]
+        assert [ostream.read() for ostream in ndb.stream_many(shas[:10])] == \
+            [gdb.stream(sha).read() for sha in shas[:10]]
+        assert ndb._packs[0].base_cache is ndb.delta_base_cache and ndb.delta_base_cache.chains
+
+        missing = b'\1' * 20
+        assert not ndb.has_object(missing)
+        self.failUnlessRaises(ValueError, ndb.info, missing)
+        self.failUnlessRaises(ValueError, ndb.stream, missing)
+
+        # loose objects
+        data = b'loose object contents'
+        sha = ndb.store(IStream(b'blob', len(data), BytesIO(data))).binsha
+        assert ndb._find(sha) is None
+        assert ndb.info(sha).size == len(data)
+        assert ndb.stream(sha).read() == data
+
+        # new packs are picked up once an object is missing
+        repo.git.repack(a=True, d=True, keep_unreachable=True)
+        assert not os.path.exists(ndb._loose_path(sha))
+        assert ndb._find(sha) is None
+        assert ndb.stream(sha).read() == data
+        assert ndb._find(sha) is not None
+        assert not ndb.update_cache()
+
+        # large objects and objects of alternates are read by git
+        ndb.max_native_size = 0
+        assert ndb.stream(shas[-1]).read() == gdb.stream(shas[-1]).read()
+        alternate = Repo.init(os.path.join(rw_dir, 'alternate'))
+        with open(os.path.join(alternate.git_dir, 'objects', 'info', 'alternates'), 'w') as fp:
+            fp.write(objects_dir)
+        # END write alternates
+        adb = GitNativeObjectDB(os.path.join(alternate.git_dir, 'objects'), alternate.git)
+        assert not adb._packs
+        assert adb.stream(sha).read() == data
+        assert adb.has_object(sha)
+
+        # it can be used by repositories
+        native_repo = Repo(repo.working_dir, odbt=GitNativeObjectDB)
+        assert isinstance(native_repo.odb, GitNativeObjectDB)
+        assert native_repo.head.commit.tree.blobs[0].data_stream.read()
+
+    @with_rw_directory
+    def test_pack_file(self, rw_dir):
+        repo = Repo.clone_from(self.rorepo.git_dir, os.path.join(rw_dir, 'repo'), no_local=True)
+        repo.git.repack(a=True, d=True, f=True)
+        pack_dir = os.path.join(repo.git_dir, 'objects', 'pack')
+        pack = PackFile(os.path.join(pack_dir, [name for name in os.listdir(pack_dir) if name.endswith('.pack')][0]))
+        index = pack.index
+        assert len(pack) == len(index) > 0
+        assert index.version == 2
+
+        ndeltas = 0
+        for i in range(len(index)):
+            sha = index.sha(i)
+            assert index.index(sha) == i
+            offset = index.offset(sha)
+            typename, size = pack.info_at(offset)
+            hexsha, git_typename, git_size, git_data = repo.git.get_object_data(bin_to_hex(sha))
+            assert (typename, size) == (git_typename, git_size)
+            assert pack.data_at(offset) == (git_typename, git_data)
+            ndeltas += pack._entry(offset)[0] >= 6
+        # END for each object
+        assert ndeltas, "expected deltas to be tested"
+        assert index.offset(b'\0' * 20) is None and index.offset(b'\xff' * 20) is None
+        pack.close()
+
+        # bases of deltas are read from the cache, which is shared by packs and evicts by size
+        cache = DeltaBaseCache(1024 ** 2)
+        pack = PackFile(pack.path, base_cache=cache)
+        index = pack.index
+        offsets = [index.offset_at(i) for i in range(len(index))]
+        expected = [repo.git.get_object_data(bin_to_hex(index.sha(i)))[1::2] for i in range(len(index))]
+        for _ in range(2):
+            assert [pack.data_at(offset) for offset in offsets] == expected
+        # END read all objects twice
+        assert cache.chains >= ndeltas and cache.max_depth >= 1 and cache.depth >= cache.chains
+        assert cache.hits and cache.misses and len(cache) and cache.nbytes <= cache.max_bytes
+        assert all(not isinstance(data, bytearray) for type_id, data in cache._entries.values())
+        cache.reset_counters()
+        cache.max_bytes = 0
+        cache.clear()
+        assert [pack.data_at(offset) for offset in offsets] == expected
+        assert len(cache) == cache.nbytes == cache.hits == 0 and cache.misses
+        pack.close()
+
+        # copy, copy with offset, insert and the implicit copy size of 0x10000
+        base = b'0123456789' * 10000
+        delta = b'\xa0\x8d\x06' + b'\x12' + b'\x90\x0a' + b'\x91\x05\x03' + b'\x05hello'
+        assert bytes(apply_delta(base, delta)) == base[:10] + b'567' + b'hello'
+        assert bytes(apply_delta(base, b'\xa0\x8d\x06' + b'\x80\x80\x04' + b'\x80')) == base[:0x10000]
+        self.failUnlessRaises(ParseError, apply_delta, base[1:], delta)
+        for end in (1, 3, 4, 5, len(delta) - 1):
+            self.failUnlessRaises(ParseError, apply_delta, base, delta[:end])
+        # END for each truncated delta
+
+        # truncated packs and indices
+        index_path = pack.path[:-len('.pack')] + '.idx'
+        truncated_path = os.path.join(rw_dir, 'truncated.pack')
+        with open(pack.path, 'rb') as fp:
+            data = fp.read()
+        # END read pack
+        with open(truncated_path, 'wb') as fp:
+            fp.write(data[:8])
+        # END write truncated pack
+        self.failUnlessRaises(ParseError, PackFile, truncated_path, PackIndex(index_path))
+        with open(truncated_path, 'wb') as fp:
+            fp.write(data[:len(data) // 2])
+        # END write truncated pack
+        truncated = PackFile(truncated_path, index=PackIndex(index_path))
+        for offset in offsets:
+            if offset >= len(data) // 2 - 20:
+                self.failUnlessRaises(ParseError, truncated.info_at, offset)
+                self.failUnlessRaises(ParseError, truncated.data_at, offset)
+            # END check objects after the end
+        # END for each object
+        truncated.close()
+        with open(index_path, 'rb') as fp:
+            data = fp.read()
+        # END read index
+        for size in (16, len(data) - 41):
+            with open(truncated_path[:-len('.pack')] + '.idx', 'wb') as fp:
+                fp.write(data[:size])
+            # END write truncated index
+            self.failUnlessRaises(ParseError, PackIndex, truncated_path[:-len('.pack')] + '.idx')
+        # END for each size
+
+    def test_caching_db(self):
+        root = os.path.join(self.rorepo.git_dir, 'objects')
+        gdb = GitCmdObjectDB(root, self.rorepo.git)
+        cdb = CachingObjectDB(root, self.rorepo.git)
+        assert isinstance(cdb.odb, GitCmdObjectDB)
+        commit = self.rorepo.head.commit
+        items = list(commit.tree.traverse())
+        shas = [commit.binsha, commit.tree.binsha] + [item.binsha for item in items]
+
+        for sha in shas:
+            assert tuple(cdb.info(sha)) == tuple(gdb.info(sha))
+        # END for each sha
+        assert (cdb.info_hits, cdb.info_misses) == (0, len(shas))
+        assert [tuple(info) for info in cdb.info_many(shas)] == [tuple(gdb.info(sha)) for sha in shas]
+        assert (cdb.info_hits, cdb.info_misses) == (len(shas), len(shas))
+
+        for sha in shas:
+            assert cdb.stream(sha).read() == gdb.stream(sha).read()
+        # END for each sha
+        assert (cdb.stream_hits, cdb.stream_misses) == (0, len(shas))
+        assert [ostream.read() for ostream in cdb.stream_many(shas)] == [gdb.stream(sha).read() for sha in shas]
+        assert cdb.stream(shas[0]).read() == cdb.stream(shas[0]).read() == gdb.stream(shas[0]).read()
+        assert (cdb.stream_hits, cdb.stream_misses) == (len(shas) + 2, len(shas))
+        assert cdb.has_object(shas[0]) and not cdb.has_object(b'\1' * 20)
+
+        # partial hits fetch the remaining objects in bulk
+        cdb.clear_cache()
+        assert (cdb.info_hits, cdb.info_misses, cdb.stream_hits, cdb.stream_misses) == (0, 0, 0, 0)
+        cdb.stream(shas[1])
+        assert [ostream.binsha for ostream in cdb.stream_many(shas[:3])] == shas[:3]
+        assert (cdb.stream_hits, cdb.stream_misses) == (1, 3)
+        assert cdb.info(shas[2]).size == gdb.info(shas[2]).size
+        assert cdb.info_hits == 1
+
+        # shas are consumed in windows, and results are yielded before all of them are known
+        cdb.clear_cache()
+        cdb.bulk_window = 2
+        consumed = list()
+
+        def iter_shas():
+            for sha in shas:
+                consumed.append(sha)
+                yield sha
+            # END for each sha
+        # end
+        infos = cdb.info_many(iter_shas())
+        assert next(infos).binsha == shas[0] and len(consumed) == 2
+        assert [info.binsha for info in infos] == shas[1:]
+        assert [ostream.read() for ostream in cdb.stream_many(shas)] == [gdb.stream(sha).read() for sha in shas]
+        del cdb.bulk_window
+
+        # budgets are in bytes, and trees have their own
+        tree_sizes = sum(gdb.info(sha).size for sha in shas if gdb.info(sha).type == b'tree')
+        small_cdb = CachingObjectDB.wrapping(GitCmdObjectDB, max_bytes=1000, max_tree_bytes=tree_sizes)(
+            root, self.rorepo.git)
+        for sha in shas:
+            small_cdb.stream(sha).read()
+        # END for each sha
+        assert small_cdb._data.nbytes <= 1000
+        assert small_cdb._trees.nbytes == tree_sizes
+        for sha in shas:
+            small_cdb.stream(sha).read()
+        # END for each sha
+        # all trees are kept, while objects are evicted before they are needed again
+        assert small_cdb.stream_hits == len(small_cdb._trees) == len([i for i in items if i.type == 'tree']) + 1
+        self.failUnlessRaises(ValueError, CachingObjectDB.wrapping, GitCmdObjectDB, max_byte=1)
+
+        # other database types, used by repositories
+        repo = Repo(self.rorepo.working_dir, odbt=CachingObjectDB.wrapping(GitDB))
+        assert isinstance(repo.odb.odb, GitDB)
+        assert list(repo.head.commit.tree.traverse()) == items
+        assert list(repo.head.commit.tree.traverse()) == items
+        assert repo.odb.stream_hits > 0
+
+    @with_rw_directory
+    def test_pack_writer(self, rw_dir):
+        repo = Repo.init(os.path.join(rw_dir, 'repo'))
+        odb = repo.odb
+        objects_dir = os.path.join(repo.git_dir, 'objects')
+        pack_dir = os.path.join(objects_dir, 'pack')
+
+        def loose_objects():
+            return [name for name in os.listdir(objects_dir) if len(name) == 2]
+
+        datas = [b'', b'small', os.urandom(100000), b'small']
+        with odb.pack_writer() as writer:
+            shas = [odb.store(IStream(b'blob', len(data), BytesIO(data))).binsha for data in datas]
+            assert len(writer) == 3 and shas[1] == shas[3]
+            for sha, data in zip(shas, datas):
+                assert odb.has_object(sha)
+                assert tuple(odb.info(sha)) == (sha, b'blob', len(data))
+                assert odb.stream(sha).read() == data
+            # END for each object
+            assert [info.size for info in odb.info_many(shas)] == [len(data) for data in datas]
+            assert [ostream.read() for ostream in odb.stream_many(shas)] == datas
+
+            # objects are still written into the same pack
+            with odb.pack_writer() as nested_writer:
+                assert nested_writer is writer
+                commit_sha = repo.index.commit("packed").binsha
+            # END nested context
+            assert odb.has_object(commit_sha) and not loose_objects()
+            self.failUnlessRaises(ValueError, odb.store, IStream(b'blob', 10, BytesIO(b'short')))
+        # END write pack
+
+        packs = [name for name in os.listdir(pack_dir)]
+        assert len(packs) == 2 and not loose_objects()
+        pack = PackFile(os.path.join(pack_dir, [name for name in packs if name.endswith('.pack')][0]))
+        assert len(pack) == 5
+        for sha, data in zip(shas, datas):
+            assert pack.data_at(pack.index.offset(sha)) == (b'blob', data)
+            assert repo.git.get_object_data(bin_to_hex(sha))[3] == data
+        # END for each object
+        pack.close()
+        repo.git.fsck(strict=True, full=True)
+        assert repo.head.commit.binsha == commit_sha and repo.head.commit.message == "packed"
+
+        # errors and contexts without objects leave no files behind
+        try:
+            with odb.pack_writer():
+                odb.store(IStream(b'blob', 3, BytesIO(b'abc')))
+                raise ValueError("abort")
+            # END write pack
+        except ValueError:
+            pass
+        # END handle error
+        with odb.pack_writer():
+            pass
+        # END write nothing
+        assert sorted(os.listdir(pack_dir)) == sorted(packs)
+        assert odb._pack_writer is None
+        assert len(odb.store(IStream(b'blob', 5, BytesIO(b'loose'))).binsha) == 20
+        assert len(loose_objects()) == 1
+
+        # duplicates are detected before they are compressed, and threads may write concurrently
+        writer = PackWriter(pack_dir)
+        datas = [os.urandom(i * 50) for i in range(40)] + [os.urandom(PackWriter.chunk_size + 1)]
+        results = dict()
+
+        def write(index):
+            results[index] = [writer.write(b'blob', len(data), BytesIO(data)) for data in datas]
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # END for each thread
+        assert len(results) == 4 and len(set(tuple(shas) for shas in results.values())) == 1
+        assert len(writer) == len(datas)
+        offset = writer._offset
+        for data in datas:
+            writer.write(b'blob', len(data), BytesIO(data))
+        # END for each duplicate
+        assert writer._offset == offset and os.path.getsize(writer._tmp_path) == offset
+        for sha, data in zip(results[0], datas):
+            assert writer.read(sha) == (b'blob', data)
+        # END for each object
+        pack = PackFile(writer.finish())
+        assert len(pack) == len(datas)
+        for sha, data in zip(results[0], datas):
+            assert pack.data_at(pack.index.offset(sha)) == (b'blob', data)
+        # END for each object
+        pack.close()
+
+    @with_rw_directory
+    def test_store_many(self, rw_dir):
+        repo = Repo.init(os.path.join(rw_dir, 'repo'))
+        odb = repo.odb
+        odb.store_threads = 4
+        odb.max_parallel_store_size = 50000
+        datas = [b'', b'small', os.urandom(100000), b'small'] + [os.urandom(i * 100) for i in range(40)]
+
+        def istreams(datas):
+            return [IStream(b'blob', len(data), BytesIO(data)) for data in datas]
+
+        for store_threads in (4, 1):
+            odb.store_threads = store_threads
+            stored = istreams(datas)
+            assert list(odb.store_many(stored)) == stored
+            expected = [odb.store(istream).binsha for istream in istreams(datas)]
+            assert [istream.binsha for istream in stored] == expected
+        # END for each amount of threads
+        for sha, data in zip(expected, datas):
+            assert repo.git.get_object_data(bin_to_hex(sha))[3] == data
+        # END for each loose object
+
+        # the input is consumed lazily
+        consumed = list()
+
+        def generate():
+            for istream in istreams(datas):
+                consumed.append(istream)
+                yield istream
+            # END for each stream
+        odb.store_threads = 2
+        stored = odb.store_many(generate())
+        assert next(stored).binsha == expected[0] and len(consumed) <= 5
+        stored.close()
+
+        datas = [os.urandom(1000) for _ in range(20)]
+        with odb.pack_writer() as writer:
+            shas = [istream.binsha for istream in odb.store_many(istreams(datas))]
+            assert len(writer) == len(datas)
+            assert [ostream.read() for ostream in odb.stream_many(shas)] == datas
+        # END write pack
+        repo.git.fsck(strict=True, full=True)
+        for sha, data in zip(shas, datas):
+            assert repo.git.get_object_data(bin_to_hex(sha))[3] == data
+        # END for each packed object
+
+        invalid = istreams([b'a'] * 3) + [IStream(b'blob', 10, BytesIO(b'short'))]
+        self.failUnlessRaises(ValueError, list, odb.store_many(invalid))
+
+        # the index stores files in bulk
+        paths = list()
+        for i, data in enumerate(datas):
+            paths.append(os.path.join(repo.working_tree_dir, 'file%i' % i))
+            with open(paths[-1], 'wb') as fp:
+                fp.write(data)
+            # END write file
+        # END for each file
+        progress = list()
+        entries = repo.index.add(paths, fprogress=lambda path, done, item: progress.append((path, done)))
+        assert [entry.binsha for entry in entries] == shas
+        assert len(progress) == 2 * len(paths) and [done for path, done in progress].count(True) == len(paths)
+        assert sorted(line.split()[1] for line in repo.git.ls_files(s=True).splitlines()) == \
+            sorted(bin_to_hex(sha).decode('ascii') for sha in shas)
+
+    @with_rw_directory
+    def test_alternates_db(self, rw_dir):
+        base = Repo.init(os.path.join(rw_dir, 'base'))
+        for i in range(3):
+            with open(os.path.join(base.working_tree_dir, 'file'), 'w') as fp:
+                fp.write('content %i\n' % i * 100)
+            # END write file
+            base.index.add(['file'])
+            base.index.commit('base %i' % i)
+        # END for each commit
+        base.git.repack('-a', '-d')
+        with open(os.path.join(base.working_tree_dir, 'file'), 'w') as fp:
+            fp.write('loose\n')
+        # END write file
+        base.index.add(['file'])
+        base.index.commit('loose')
+
+        forks = list()
+        for name in ('fork1', 'fork2'):
+            base.git.clone('--shared', base.git_dir, os.path.join(rw_dir, name))
+            forks.append(Repo(os.path.join(rw_dir, name), odbt=AlternatesObjectDB))
+        # END for each fork
+        fork = forks[0]
+        odb = fork.odb
+        assert len(odb.stores) == 2 and odb.stores[1] is forks[1].odb.stores[1]
+        assert odb.stores[1].root_path() == os.path.realpath(os.path.join(base.git_dir, 'objects'))
+
+        # objects of the alternate are read natively, from packs and loose objects
+        shas = [obj.binsha for commit in base.iter_commits() for obj in commit.tree.traverse()]
+        shas += [commit.binsha for commit in base.iter_commits()]
+        cmd_odb = GitCmdObjectDB(os.path.join(fork.git_dir, 'objects'), fork.git)
+        for sha in shas:
+            assert odb.has_object(sha)
+            assert odb.stream(sha).read() == cmd_odb.stream(sha).read()
+            assert tuple(odb.info(sha)) == tuple(cmd_odb.info(sha))
+            assert odb._read(sha, header_only=True) is not None
+        # END for each object
+        # the alternate provided most objects, and is searched first
+        assert odb.stores[0] is not odb and odb._store_hits[odb.stores[0]] == len(set(shas))
+
+        # local objects are found as well, and the store which provided an object is remembered
+        with open(os.path.join(fork.working_tree_dir, 'file'), 'w') as fp:
+            fp.write('local\n')
+        # END write file
+        fork.index.add(['file'])
+        local_sha = fork.index.commit("local").binsha
+        assert odb.stream(local_sha).read() == cmd_odb.stream(local_sha).read()
+        assert odb._locations.get(local_sha) is odb
+        assert odb._locations.get(shas[0]) is odb.stores[0]
+        assert not odb.has_object(b'\1' * 20)
+        self.failUnlessRaises(ValueError, odb.info, b'\1' * 20)
+
+        # changes of the alternates are picked up
+        fork.alternates = []
+        assert odb.update_cache()
+        assert odb.stores == (odb, )
+        assert odb._read(shas[0], header_only=True) is None and odb.has_object(local_sha)
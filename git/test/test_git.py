@@ -8,6 +8,10 @@ import os
 import sys
 import mock
 import subprocess
+import threading
+import time
+
+from nose import SkipTest
 
 from git.test.lib import (
     TestBase,
@@ -24,6 +28,10 @@ from git import (
     GitCommandNotFound,
     Repo
 )
+from git.cmd import (
+    CallCache,
+    CommandCounters
+)
 from gitdb.test.lib import with_rw_directory
 
 from git.compat import PY3
@@ -80,6 +88,7 @@ class TestGit(TestBase):
 
     def test_it_executes_git_to_shell_and_returns_result(self):
         assert_match('^git version [\d\.]{2}.*$', self.git.execute(["git", "version"]))
+        assert_equal('', self.git.execute(["git", "version"], with_stdout=False))
 
     def test_it_accepts_stdin(self):
         filename = fixture_path("cat_file_blob")
@@ -125,6 +134,360 @@ class TestGit(TestBase):
         hexsha, typename_two, size_two, data = self.git.get_object_data(hexsha)
         assert typename == typename_two and size == size_two
 
+    def test_persistent_cat_file_pool(self):
+        prev_mode = Git.cat_file_batch_command
+        Git.cat_file_batch_command = False
+        try:
+            self._assert_persistent_cat_file_pool()
+        finally:
+            Git.cat_file_batch_command = prev_mode
+        # END reset configuration
+
+    def _assert_persistent_cat_file_pool(self):
+        git = Git(self.rorepo.working_dir)
+        shas = [item.hexsha for item in self.rorepo.head.commit.tree.traverse()][:50]
+        expected = dict((sha, git.get_object_data(sha)) for sha in shas)
+        assert len(git.cat_file_all) == 1
+        assert len(git.cat_file_header) == 0
+
+        # streams which are not yet depleted block their command, others will be spawned
+        first = git.stream_object_data(shas[0])[3]
+        second = git.stream_object_data(shas[1])[3]
+        assert len(git.cat_file_all) == 2
+        assert second.read() == expected[shas[1]][3]
+        assert first.read() == expected[shas[0]][3]
+        del(first)
+        del(second)
+
+        errors = list()
+
+        def reader():
+            try:
+                for sha in shas:
+                    assert git.get_object_header(sha) == expected[sha][:3]
+                    assert git.get_object_data(sha) == expected[sha]
+                # END for each sha
+            except Exception as err:
+                errors.append(err)
+            # END handle errors
+        # end
+
+        threads = [threading.Thread(target=reader) for _ in range(Git.cat_file_pool_size * 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # END for each thread
+        assert not errors, errors
+        assert 0 < len(git.cat_file_header) <= Git.cat_file_pool_size
+        assert 0 < len(git.cat_file_all) <= Git.cat_file_pool_size
+
+        # processes can be reaped once they are idle for too long
+        prev_timeout = Git.cat_file_idle_timeout
+        Git.cat_file_idle_timeout = 0
+        try:
+            time.sleep(0.01)
+            assert git.get_object_header(shas[0]) == expected[shas[0]][:3]
+            assert len(git.cat_file_header) == 1
+        finally:
+            Git.cat_file_idle_timeout = prev_timeout
+        # END reset configuration
+
+        # busy commands are discarded once released
+        stream = git.stream_object_data(shas[0])[3]
+        git.clear_cache()
+        assert len(git.cat_file_all) == 0 and len(git.cat_file_header) == 0
+        assert stream.read() == expected[shas[0]][3]
+        assert len(git.cat_file_all) == 0
+
+        self.failUnlessRaises(ValueError, git.get_object_header, '0' * 40)
+        assert len(git.cat_file_header) == 1
+
+    def test_cat_file_batch_command(self):
+        git = Git(self.rorepo.working_dir)
+        if git.version_info[:2] < Git.cat_file_batch_command_version:
+            raise SkipTest("git %s doesn't support 'cat-file --batch-command'" % (git.version_info,))
+        shas = [item.hexsha for item in self.rorepo.head.commit.tree.traverse()]
+
+        prev_mode = Git.cat_file_batch_command
+        Git.cat_file_batch_command = False
+        try:
+            expected = [git.get_object_data(sha) for sha in shas]
+        finally:
+            Git.cat_file_batch_command = prev_mode
+        # END reset configuration
+        git.clear_cache()
+
+        # it is used by default, serving headers and contents with a single process
+        assert [git.get_object_header(sha) for sha in shas] == [info[:3] for info in expected]
+        assert [git.get_object_data(sha) for sha in shas] == expected
+        assert list(git.get_object_headers(shas)) == [info[:3] for info in expected]
+        data = list()
+        for hexsha, typename, size, stream in git.iter_object_data(shas):
+            data.append((hexsha, typename, size, stream.read()))
+        # END for each object
+        assert data == expected
+        assert len(git.cat_file_command) == 1
+        assert len(git.cat_file_header) == 0 and len(git.cat_file_all) == 0
+
+        self.failUnlessRaises(ValueError, git.get_object_header, '0' * 40)
+        self.failUnlessRaises(ValueError, list, git.get_object_headers(shas[:2] + ['0' * 40]))
+        assert git.get_object_data(shas[0]) == expected[0]
+
+        # streams which are not yet depleted block their command, others will be spawned
+        stream = git.stream_object_data(shas[0])[3]
+        assert git.get_object_header(shas[1]) == expected[1][:3]
+        assert len(git.cat_file_command) == 2
+        assert stream.read() == expected[0][3]
+
+        git.clear_cache()
+        assert len(git.cat_file_command) == 0
+
+    def test_get_object_headers(self):
+        git = Git(self.rorepo.working_dir)
+        shas = [item.hexsha for item in self.rorepo.head.commit.tree.traverse()]
+        expected = [git.get_object_header(sha) for sha in shas]
+        assert list(git.get_object_headers(iter(shas))) == expected
+        assert list(git.get_object_headers([])) == []
+
+        prev_window = Git.cat_file_batch_window
+        Git.cat_file_batch_window = 3
+        try:
+            assert list(git.get_object_headers(shas)) == expected
+
+            # abandoned pipelines don't corrupt the commands of the pool
+            headers = git.get_object_headers(shas)
+            assert next(headers) == expected[0]
+            del(headers)
+            assert list(git.get_object_headers(shas[1:])) == expected[1:]
+        finally:
+            Git.cat_file_batch_window = prev_window
+        # END reset configuration
+
+        headers = git.get_object_headers([shas[0], '0' * 40, shas[1]])
+        assert next(headers) == expected[0]
+        self.failUnlessRaises(ValueError, next, headers)
+        assert list(git.get_object_headers(shas[:2])) == expected[:2]
+
+    def test_iter_object_data(self):
+        git = Git(self.rorepo.working_dir)
+        shas = [item.hexsha for item in self.rorepo.head.commit.tree.traverse()]
+        expected = [git.get_object_data(sha) for sha in shas]
+
+        prev_window = Git.cat_file_batch_window
+        try:
+            for window in (prev_window, 3):
+                Git.cat_file_batch_window = window
+                for i, (hexsha, typename, size, stream) in enumerate(git.iter_object_data(shas)):
+                    assert (hexsha, typename, size, stream.read()) == expected[i]
+                # END for each object
+
+                # unread data is skipped
+                for i, (hexsha, typename, size, stream) in enumerate(git.iter_object_data(shas)):
+                    if i % 2:
+                        assert stream.read(2) == expected[i][3][:2]
+                    else:
+                        assert stream.read() == expected[i][3]
+                # END for each object
+            # END for each window
+
+            # abandoned pipelines don't corrupt the commands of the pool
+            stream_tuples = git.iter_object_data(shas)
+            assert next(stream_tuples)[3].read(1) == expected[0][3][:1]
+            del(stream_tuples)
+            assert git.get_object_data(shas[1]) == expected[1]
+        finally:
+            Git.cat_file_batch_window = prev_window
+        # END reset configuration
+
+        stream_tuples = git.iter_object_data([shas[0], '0' * 40])
+        assert next(stream_tuples)[:3] == expected[0][:3]
+        self.failUnlessRaises(ValueError, next, stream_tuples)
+        assert git.get_object_data(shas[1]) == expected[1]
+
+    def test_iter_records(self):
+        git = self.rorepo.git
+        assert list(git.iter_lines('ls_tree', 'HEAD', r=True)) == git.ls_tree('HEAD', r=True).splitlines()
+        records = list(git.iter_records('ls_tree', 'HEAD', r=True, z=True, sep=b'\0'))
+        assert records == git.ls_tree('HEAD', r=True, z=True, stdout_as_string=False).split(b'\0')[:-1]
+        assert list(git.iter_lines('log', 'HEAD', format='%H%n', max_count=1)) == [git.rev_parse('HEAD'), '']
+
+        # separators are found even if they are split among many chunks
+        expected = git.rev_list('HEAD', max_count=5).split()
+        prev_chunk_size = Git.max_chunk_size
+        Git.max_chunk_size = 1
+        try:
+            for sep in (b'\n', b'-+\n'):
+                records = git.iter_records('log', 'HEAD', format='%H' + sep[:-1].decode('ascii'), max_count=5,
+                                           sep=sep)
+                assert [record.decode('ascii') for record in records] == expected
+            # END for each separator
+        finally:
+            Git.max_chunk_size = prev_chunk_size
+        # END reset configuration
+
+        # abandoned iterators terminate their process
+        lines = git.iter_lines('ls_tree', 'HEAD', r=True)
+        assert next(lines)
+        lines.close()
+
+        lines = git.iter_lines('rev_parse', '--verify', 'this-ref-does-not-exist')
+        try:
+            list(lines)
+        except GitCommandError as err:
+            assert err.status != 0
+            assert b'fatal' in err.stderr
+        else:
+            raise AssertionError("Should have raised")
+        # END check error
+        assert list(git.iter_lines('rev_parse', '--verify', 'this-ref-does-not-exist', with_exceptions=False)) == []
+
+    @with_rw_directory
+    def test_call_cache(self, rw_dir):
+        rw_repo = Repo.init(os.path.join(rw_dir, 'repo'))
+        writer = rw_repo.config_writer()
+        writer.set_value('user', 'name', 'Tester')
+        writer.set_value('user', 'email', 'tester@example.com')
+        writer.release()
+        git = rw_repo.git
+        git.commit(m='first', allow_empty=True)
+        cache = CallCache(rw_repo.git_dir, max_entries=2)
+        assert git.set_call_cache(cache) is None
+        assert git.call_cache is cache
+
+        first = git.rev_parse('HEAD')
+        assert git.rev_parse('HEAD') == first
+        assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+        # different options, arguments or environment are different entries
+        assert git.rev_parse('HEAD', short=7) == first[:7]
+        with git.custom_environment(GIT_PYTHON_TEST='1'):
+            assert git.rev_parse('HEAD') == first
+        # END custom environment
+        assert (cache.hits, cache.misses, len(cache)) == (1, 3, 2)
+
+        # least recently used entries are evicted
+        assert git.rev_parse('HEAD') == first
+        assert cache.misses == 4
+
+        # changing references invalidates results
+        git.commit(m='second', allow_empty=True)
+        second = git.rev_parse('HEAD')
+        assert second != first
+        git.branch('other', first)
+        assert git.rev_parse('other') == first
+        git.branch('-f', 'other', second)
+        assert git.rev_parse('other') == second
+        git.update_ref('refs/nested/deeper/ref', first)
+        assert git.rev_parse('refs/nested/deeper/ref') == first
+        git.update_ref('refs/nested/deeper/ref', second)
+        assert git.rev_parse('refs/nested/deeper/ref') == second
+
+        # commands which are not read-only, or failed, aren't cached
+        hits, misses = cache.hits, cache.misses
+        git.log(n=1)
+        git.log(n=1)
+        git.cat_file('-s', second)
+        self.failUnlessRaises(GitCommandError, git.rev_parse, '--verify', 'doesnt-exist')
+        self.failUnlessRaises(GitCommandError, git.rev_parse, '--verify', 'doesnt-exist')
+        assert (cache.hits, cache.misses) == (hits, misses + 3)
+
+        cache.clear()
+        assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+        assert git.set_call_cache(None) is cache
+        git.rev_parse('HEAD')
+        assert cache.misses == 0
+
+    def test_instrumentation_hooks(self):
+        git = Git(self.rorepo.working_dir)
+        shas = [item.hexsha for item in self.rorepo.head.commit.tree.traverse()]
+        git.version_info
+        events = list()
+        hook = events.append
+        assert Git.add_instrumentation_hook(hook) is hook
+        try:
+            sha = git.rev_parse('HEAD')
+            self.failUnlessRaises(GitCommandError, git.rev_parse, '--verify', 'this-ref-does-not-exist')
+            with open(fixture_path("cat_file_blob"), 'rb') as stream:
+                git.hash_object(istream=stream, stdin=True)
+            # END hash from file
+            proc = git.log(n=1, as_process=True)
+            proc.communicate()
+            git.get_object_header(sha)
+            git.get_object_data(sha)
+            assert len(list(git.get_object_headers(shas))) == len(shas)
+            self.failUnlessRaises(ValueError, git.get_object_header, '0' * 40)
+            self.rorepo.commit(sha).message
+        finally:
+            Git.remove_instrumentation_hook(hook)
+        # END uninstall hook
+        self.failUnlessRaises(ValueError, Git.remove_instrumentation_hook, hook)
+
+        execute, failure, hashed, process = events[:4]
+        assert execute.kind == 'execute' and execute.name == 'rev-parse'
+        assert execute.status == 0 and execute.bytes_out == len(sha) + 1 and execute.bytes_err == 0
+        assert execute.bytes_in is None
+        assert 0 <= execute.time_to_first_byte <= execute.wall_time
+        assert execute.api == 'git.cmd.Git._call_process'
+        assert failure.status != 0 and failure.bytes_err > 0
+        assert hashed.bytes_in == os.path.getsize(fixture_path("cat_file_blob"))
+        assert process.kind == 'process' and process.name == 'log' and process.status is None
+
+        cat_file_events = [event for event in events if event.kind == 'cat-file']
+        # spawning cat-file processes is measured as well
+        assert [event.name for event in events if event.kind == 'process'].count('cat-file') >= 1
+        header, data, headers, missing = cat_file_events[:4]
+        assert header.status == 0 and header.requests == 1 and header.name == 'cat-file'
+        hexsha, typename, size = git.get_object_header(sha)
+        request_size = len(git._prepare_request(git._cat_file_pool(contents=False), sha, contents=False))
+        assert header.bytes_in == request_size
+        assert header.bytes_out == len(hexsha) + len(typename) + len(str(size)) + 3
+        assert data.bytes_out == header.bytes_out + size + 1
+        assert headers.requests == len(shas) and headers.status == 0
+        assert headers.bytes_in == request_size * len(shas)
+        assert missing.status == 1
+        # the outermost frame of the git package is reported, unless it is Git itself
+        assert events[-1].api == 'git.objects.commit.Commit._set_cache_'
+
+        # hooks don't break commands
+        def broken_hook(event):
+            raise RuntimeError("broken")
+        # end
+        Git.add_instrumentation_hook(broken_hook)
+        try:
+            assert git.rev_parse('HEAD') == sha
+        finally:
+            Git.remove_instrumentation_hook(broken_hook)
+        # END uninstall hook
+
+    def test_measure_commands(self):
+        git = Git(self.rorepo.working_dir)
+        with Git.measure_commands() as counters:
+            assert isinstance(counters, CommandCounters)
+            assert counters in Git.instrumentation_hooks
+            git.rev_parse('HEAD')
+            git.rev_parse('HEAD')
+            git.get_object_header('HEAD')
+            git.execute(['git', 'rev-parse', '--verify', 'this-ref-does-not-exist'], with_exceptions=False)
+        # END measure
+        assert counters not in Git.instrumentation_hooks
+        totals = counters.totals
+        assert totals.processes >= 3 and totals.requests == 1 and totals.failures == 1
+        assert totals.events == totals.processes + totals.requests
+        assert counters.by_command['rev-parse'].processes == 3
+        assert counters.by_command['cat-file'].requests == 1
+        # get_object_header() may spawn as many processes, the order of ties is undefined
+        most_common = counters.most_common()
+        assert [t.processes for _, t in most_common] == sorted((t.processes for _, t in most_common), reverse=True)
+        assert dict(most_common)['git.cmd.Git._call_process'].processes == 2
+        assert counters.most_common(1) == most_common[:1]
+        assert counters.most_common(by='command', key='failures')[0][0] == 'rev-parse'
+
+        git.rev_parse('HEAD')
+        assert counters.by_command['rev-parse'].processes == 3
+        counters.reset()
+        assert counters.totals.events == 0 and not counters.by_api
+
     def test_version(self):
         v = self.git.version_info
         assert isinstance(v, tuple)
@@ -167,6 +530,24 @@ class TestGit(TestBase):
         with mock.patch.dict('os.environ', {'GIT_EDITOR': editor}):
             assert self.git.var("GIT_EDITOR") == editor
 
+    def test_process_environment_cache(self):
+        git = Git(self.rorepo.working_dir)
+        env = git._process_environment()
+        assert env['LC_ALL'] == 'C'
+        assert git._process_environment() is env
+
+        with mock.patch.dict('os.environ', {'GIT_PYTHON_TEST_VAR': 'value'}):
+            assert git._process_environment()['GIT_PYTHON_TEST_VAR'] == 'value'
+            assert git.var('GIT_EDITOR', with_extended_output=True)[0] == 0
+        # END patch environment
+        assert 'GIT_PYTHON_TEST_VAR' not in git._process_environment()
+
+        with git.custom_environment(GIT_PYTHON_TEST_VAR='other'):
+            assert git._process_environment()['GIT_PYTHON_TEST_VAR'] == 'other'
+        # END custom environment
+        git.environment()['GIT_PYTHON_TEST_VAR'] = 'changed in place'
+        assert git._process_environment()['GIT_PYTHON_TEST_VAR'] == 'changed in place'
+
     @with_rw_directory
     def test_environment(self, rw_dir):
         # sanity check
@@ -236,3 +617,31 @@ class TestGit(TestBase):
 
         assert count[1] == line_count
         assert count[2] == line_count
+
+    def test_handle_process_output_records(self):
+        from git.cmd import handle_process_output
+
+        def collect(data, **kwargs):
+            records = ([], [])
+            code = "import sys, os; data = %r; os.write(1, data); os.write(2, data)" % (data,)
+            proc = subprocess.Popen([sys.executable, '-c', code],
+                                    stdin=None,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    shell=False)
+            handle_process_output(proc, records[0].append, records[1].append, lambda proc: proc.wait(), **kwargs)
+            assert records[0] == records[1]
+            return records[0]
+        # end
+
+        data = b'first\nsecond\r\nprogress 1%\rprogress 2%\r\n\nlast'
+        lines = ['first', 'second', 'progress 1%', 'progress 2%', 'last']
+        assert collect(data) == lines
+        # records spanning multiple chunks
+        assert collect(data, chunk_size=3) == lines
+        assert collect(data, chunk_size=1) == lines
+
+        assert collect(data, decode_streams=False) == [line.encode('ascii') for line in lines]
+        assert collect(data, separators=(b'\n',)) == ['first', 'second\r', 'progress 1%\rprogress 2%\r', 'last']
+        assert collect(b'a b\0c\nd\0', separators=(b'\0',), decode_streams=False) == [b'a b', b'c\nd']
+        assert collect(b'x' * 100000, chunk_size=1000) == ['x' * 100000]
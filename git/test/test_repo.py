@@ -34,11 +34,16 @@ from git import (
     GitCommandError
 )
 from git.repo.fun import touch
+from git.bitmap import _popcount
+from git.odict import OrderedDict
 from git.util import join_path_native
 from git.exc import (
     BadObject,
 )
-from gitdb.util import bin_to_hex
+from gitdb.util import (
+    bin_to_hex,
+    hex_to_bin
+)
 from git.compat import string_types
 from gitdb.test.lib import with_rw_directory
 
@@ -852,6 +857,187 @@ class TestRepo(TestBase):
         for i, j in itertools.permutations([c1, 'ffffff', ''], r=2):
             self.assertRaises(GitCommandError, repo.is_ancestor, i, j)
 
+    @with_rw_directory
+    def test_commit_dag(self, rw_dir):
+        repo = Repo.init(rw_dir)
+        git = repo.git
+        tree = git.write_tree()
+
+        def commit(date, *parents):
+            git.update_environment(GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@example.com',
+                                   GIT_COMMITTER_NAME='c', GIT_COMMITTER_EMAIL='c@example.com',
+                                   GIT_AUTHOR_DATE='%i +0000' % (1500000000 + date),
+                                   GIT_COMMITTER_DATE='%i +0000' % (1500000000 + date))
+            args = [tree]
+            for parent in parents:
+                args.extend(('-p', parent))
+            # END for each parent
+            return git.commit_tree(*args, m='commit at %i' % date)
+
+        # a criss-cross merge with two best merge bases, an octopus merge and an unrelated history
+        root = commit(1000)
+        a, b = commit(2000, root), commit(2500, root)
+        c, d = commit(3000, a, b), commit(3500, b, a)
+        e, f = commit(4000, c), commit(4500, d, root)
+        octopus = commit(5000, e, f, b)
+        other = commit(1500)
+        git.update_ref('refs/heads/master', octopus)
+        git.update_ref('refs/heads/other', other)
+        shas = [root, a, b, c, d, e, f, octopus, other]
+
+        def merge_bases(*args):
+            return git.merge_base(*args, all=True, with_exceptions=False).split()
+
+        dag = repo.commit_dag(all=True)
+        assert len(dag) == len(shas)
+        assert [item.hexsha for item in dag.topo_order()] == git.rev_list(all=True, topo_order=True).split()
+        assert [item.hexsha for item in dag.date_order()] == git.rev_list(all=True, date_order=True).split()
+        for x, y in itertools.product(shas, shas):
+            assert dag.is_ancestor(x, y) == (git.merge_base(x, y, is_ancestor=True, with_exceptions=False,
+                                                            with_extended_output=True)[0] == 0)
+            assert sorted(item.hexsha for item in dag.merge_base(x, y, all=True)) == sorted(merge_bases(x, y))
+            assert len(dag.merge_base(repo.commit(x), y)) == len(merge_bases(x, y)[:1])
+            behind, ahead = git.rev_list('--left-right', '--count', '%s...%s' % (x, y)).split()
+            assert dag.ahead_behind(x, y) == (int(ahead), int(behind))
+        # END for each pair of commits
+        assert sorted(item.hexsha for item in dag.merge_base(e, f, c, all=True)) == sorted(merge_bases(e, f, c))
+        for x in shas:
+            assert dag.ahead_behind_many(x, shas) == [dag.ahead_behind(x, y) for y in shas]
+            assert dag.containing(x, shas) == [y for y in shas if dag.is_ancestor(x, y)]
+        # END for each commit
+        assert len(merge_bases(c, d)) == 2
+        self.failUnlessRaises(ValueError, dag.merge_base, a)
+
+        # ids are topological, and parents are kept in arrays
+        i = dag.id(octopus)
+        assert i == 0 and dag.id(repo.commit(octopus)) == dag.id(hex_to_bin(octopus)) == i
+        assert [dag.sha(p) for p in dag.parent_ids(i)] == [hex_to_bin(sha) for sha in (e, f, b)]
+        assert dag.commit(i) == repo.commit(octopus)
+        assert dag.commit_time(i) == 1500005000
+        assert dag.generation(i) == 5 and dag.generation(dag.id(root)) == 1
+
+        # excluded commits are not part of the graph, and the queries need no git process
+        dag = repo.commit_dag('%s..%s' % (a, octopus))
+        assert len(dag) == int(git.rev_list('%s..%s' % (a, octopus), count=True))
+        assert a not in dag and root not in dag and octopus in dag and other not in dag
+        self.failUnlessRaises(KeyError, dag.is_ancestor, a, octopus)
+        with Git.measure_commands() as counters:
+            assert dag.is_ancestor(b, octopus) and not dag.is_ancestor(octopus, b)
+            assert [item.hexsha for item in dag.merge_base(e, f)] == [b]
+            assert dag.ahead_behind(c, octopus) == (4, 0)
+        # END measure
+        assert counters.totals.processes == 0
+        assert len(repo.commit_dag()) == int(git.rev_list('HEAD', count=True))
+
+    @with_rw_directory
+    def test_compare_refs(self, rw_dir):
+        repo = Repo.init(rw_dir)
+        git = repo.git
+        tree = git.write_tree()
+
+        def commit(date, *parents):
+            git.update_environment(GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@example.com',
+                                   GIT_COMMITTER_NAME='c', GIT_COMMITTER_EMAIL='c@example.com',
+                                   GIT_AUTHOR_DATE='%i +0000' % (1500000000 + date),
+                                   GIT_COMMITTER_DATE='%i +0000' % (1500000000 + date))
+            args = [tree]
+            for parent in parents:
+                args.extend(('-p', parent))
+            # END for each parent
+            return git.commit_tree(*args, m='commit at %i' % date)
+
+        root = commit(1000)
+        a, b = commit(2000, root), commit(2500, root)
+        c, d = commit(3000, a, b), commit(3500, b)
+        e = commit(4000, c, d)
+        other = commit(1500)
+        for name, sha in (('master', e), ('feature', c), ('fix', d), ('old', a), ('same', e), ('other', other)):
+            git.update_ref('refs/heads/' + name, sha)
+        # END for each branch
+        git.symbolic_ref('HEAD', 'refs/heads/master')
+        shas = [root, a, b, c, d, e, other]
+
+        for base in shas + ['master']:
+            with Git.measure_commands() as counters:
+                counts = repo.compare_refs(base)
+            # END measure
+            assert counters.totals.processes == 3 and counters.by_command['merge-base'].processes == 1
+            assert list(counts) == repo.heads
+            for head, (ahead, behind) in counts.items():
+                expected = git.rev_list('--left-right', '--count', '%s...%s' % (base, head)).split()
+                assert (behind, ahead) == tuple(int(n) for n in expected)
+            # END for each head
+        # END for each base
+        assert repo.compare_refs('fix', ['feature', e, 'fix']) == \
+            OrderedDict([('feature', (2, 1)), (e, (3, 0)), ('fix', (0, 0))])
+        assert repo.compare_refs('master', []) == OrderedDict()
+
+        for sha in shas:
+            with Git.measure_commands() as counters:
+                containing = repo.refs_containing(sha)
+            # END measure
+            assert counters.totals.processes == 2
+            expected = git.branch(contains=sha, format='%(refname:short)').split()
+            assert sorted(head.name for head in containing) == sorted(expected)
+        # END for each commit
+        assert repo.refs_containing(b, ['fix', a, 'master~1', e]) == ['fix', 'master~1', e]
+        assert repo.refs_containing(root, []) == []
+
+        # annotated tags are peeled
+        git.tag('v1.0', d, m='annotated')
+        tag = repo.tags['v1.0']
+        tag_sha = tag.tag.hexsha
+        assert tag_sha != d
+        assert repo.compare_refs(tag, [tag.tag, tag_sha, 'master', 'fix']) == \
+            OrderedDict([(tag.tag, (0, 0)), (tag_sha, (0, 0)), ('master', (3, 0)), ('fix', (0, 0))])
+        assert repo.compare_refs(tag_sha, [tag])[tag] == (0, 0)
+        assert repo.refs_containing(tag.tag, ['feature', tag_sha, 'master']) == [tag_sha, 'master']
+        self.failUnlessRaises(ValueError, repo.compare_refs, 'master', ['%s..%s' % (a, e)])
+        self.failUnlessRaises(GitCommandError, repo.refs_containing, 'does-not-exist')
+
+    @with_rw_directory
+    def test_name_revs(self, rw_dir):
+        repo = Repo.init(rw_dir)
+        git = repo.git
+        with repo.config_writer() as writer:
+            writer.set_value('user', 'name', 'Tagger')
+            writer.set_value('user', 'email', 'tagger@example.com')
+        # END configure tagger
+        commits = [repo.index.commit('commit %i' % i) for i in range(7)]
+        git.tag('v1.0', commits[2], m='annotated')
+        git.tag('light', commits[4])
+        git.checkout('HEAD~1', b='side')
+        commits.append(repo.index.commit('side commit'))
+        git.checkout('master')
+        unnamed = Commit(repo, hex_to_bin(git.commit_tree(repo.head.commit.tree, m='unnamed')))
+        commits.append(unnamed)
+        git.version_info
+
+        revs = commits + ['master', 'side~1']
+        with Git.measure_commands() as counters:
+            names = repo.name_revs(revs)
+        # END measure
+        assert counters.totals.processes == 2 and counters.by_command['name-rev'].processes == 1
+        assert list(names) == revs
+        for rev, name in names.items():
+            expected = git.name_rev(rev, name_only=True)
+            assert name == (expected != 'undefined' and expected or None)
+        # END for each revision
+        assert names[unnamed] is None and names[commits[2]] == 'tags/v1.0^0'
+        assert repo.name_revs(commits, tags=True)[commits[3]] == git.name_rev(commits[3], tags=True, name_only=True)
+        assert repo.name_revs([]) == OrderedDict()
+
+        repo.describe_batch_length = 3 * 41
+        for kwargs in (dict(), dict(tags=True), dict(always=True, tags=True)):
+            described = commits[3:] if 'always' in kwargs else commits[3:-1]
+            with Git.measure_commands() as counters:
+                descriptions = repo.describe_many(described, **kwargs)
+            # END measure
+            assert counters.totals.processes == (len(described) + 2) // 3
+            assert list(descriptions.values()) == [git.describe(c, **kwargs) for c in described]
+        # END for each set of arguments
+        self.failUnlessRaises(GitCommandError, repo.describe_many, commits)
+
     @with_rw_directory
     def test_work_tree_unsupported(self, rw_dir):
         git = Git(rw_dir)
@@ -864,3 +1050,75 @@ class TestRepo(TestBase):
         rw_master.git.worktree('add', worktree_path, 'master')
 
         self.failUnlessRaises(InvalidGitRepositoryError, Repo, worktree_path)
+
+    @with_rw_directory
+    def test_reachability_bitmap(self, rw_dir):
+        repo = Repo.clone_from(self.rorepo.git_dir, os.path.join(rw_dir, 'repo'), no_local=True)
+        git = repo.git
+        with repo.config_writer() as writer:
+            writer.set_value('user', 'name', 'Tagger')
+            writer.set_value('user', 'email', 'tagger@example.com')
+        # END configure tagger
+        assert repo.reachability_bitmap is None
+        assert repo.count_commits() == len(git.rev_list('HEAD').split())
+        for bitmap in (0, 1, 0x1ff, 1 << 100 | 5, (1 << 1001) - 1):
+            assert _popcount(bitmap) == bin(bitmap).count('1')
+        # END for each bitmap
+
+        # a long history, of which only some commits get a stored bitmap
+        stream_path = os.path.join(rw_dir, 'stream')
+        with open(stream_path, 'wb') as fp:
+            fp.write(b'reset refs/heads/master\nfrom HEAD\n')
+            for i in range(300):
+                content = ('line %i\n' % i).encode('ascii')
+                fp.write(b'commit refs/heads/master\ncommitter C <c@example.com> %i +0000\ndata 3\nmsg\n'
+                         % (1500000000 + i))
+                fp.write(b'M 100644 inline file%i\ndata %i\n%s\n' % (i % 7, len(content), content))
+            # END for each commit
+        # END write stream
+        with open(stream_path, 'rb') as fp:
+            git.fast_import(istream=fp)
+        # END import commits
+        git.reset('--hard')
+
+        # a side branch, and a tag, which are bitmapped as tips of refs
+        git.checkout('HEAD~3', b='side')
+        with open(os.path.join(repo.working_dir, 'new_file'), 'w') as fp:
+            fp.write('new')
+        # END write file
+        repo.index.add(['new_file'])
+        repo.index.commit('side commit')
+        git.tag('side-tag', 'side', m='annotated')
+        git.checkout('master')
+        git.repack(a=True, d=True, write_bitmap_index=True)
+
+        repo = Repo(repo.working_dir)
+        pack_bitmap = repo.reachability_bitmap
+        assert pack_bitmap is not None and len(pack_bitmap)
+        commits = [Commit(repo, hex_to_bin(hexsha)) for hexsha in git.rev_list('--all').split()]
+        assert any(c.binsha not in pack_bitmap for c in commits), "expected commits without stored bitmap"
+
+        def expected_objects(*args):
+            return set(line[:40] for line in git.rev_list(*args, objects=True).splitlines())
+
+        revs = [c.hexsha for c in commits] + ['side-tag']
+        for rev in revs:
+            assert repo.count_commits(rev) == int(git.rev_list(rev, count=True))
+            assert set(obj.hexsha for obj in repo.iter_objects(rev)) == expected_objects(rev)
+        # END for each revision
+        for rev, exclude in (('master', ['side']), ('side', ['master']), ('side-tag', ['HEAD~1', 'HEAD~5'])):
+            assert repo.count_commits(rev, exclude) == int(git.rev_list(rev, '--not', *exclude, count=True))
+            objects = list(repo.iter_objects(rev, exclude))
+            assert set(obj.hexsha for obj in objects) == expected_objects(rev, '--not', *exclude)
+            assert all(isinstance(obj, Commit) for obj in objects if obj.type == 'commit')
+        # END for each range
+        assert repo.head.commit.count() == repo.count_commits()
+        assert pack_bitmap.count(pack_bitmap.bitmap(repo.head.commit.binsha)) == len(expected_objects('HEAD'))
+
+        # objects which are not in the pack are handled by git
+        new_commit = repo.index.commit('not packed')
+        assert pack_bitmap.bit(new_commit.binsha) is None
+        assert new_commit.count() == repo.count_commits(new_commit) == int(git.rev_list(new_commit, count=True))
+        assert set(obj.hexsha for obj in repo.iter_objects(new_commit, ['HEAD~1'])) == \
+            expected_objects(new_commit.hexsha, '--not', 'HEAD~1')
+        self.failUnlessRaises(GitCommandError, repo.count_commits, 'does-not-exist')
@@ -20,9 +20,22 @@ v.close()
 with open('requirements.txt') as reqs_file:
     requirements = reqs_file.read().splitlines()
 
+# modules which require python 3.7, older interpreters can't byte-compile them
+if sys.version_info[:2] < (3, 7):
+    excluded_modules = ('aio', )
+else:
+    excluded_modules = ()
+# end
+
 
 class build_py(_build_py):
 
+    def find_package_modules(self, package, package_dir):
+        modules = _build_py.find_package_modules(self, package, package_dir)
+        if package == 'git':
+            modules = [module for module in modules if module[1] not in excluded_modules]
+        return modules
+
     def run(self):
         init = path.join(self.build_lib, 'git', '__init__.py')
         if path.exists(init):
@@ -81,7 +94,7 @@ setup(
     author_email="byronimo@gmail.com, mtrier@gmail.com",
     url="https://github.com/gitpython-developers/GitPython",
     packages=find_packages('.'),
-    py_modules=['git.' + f[:-3] for f in os.listdir('./git') if f.endswith('.py')],
+    py_modules=['git.' + f[:-3] for f in os.listdir('./git') if f.endswith('.py') and f[:-3] not in excluded_modules],
     package_data={'git.test': ['fixtures/*']},
     package_dir={'git': 'git'},
     license="BSD License",